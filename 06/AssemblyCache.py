@@ -0,0 +1,118 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import os
+import typing
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+ENTRY_SUFFIX = ".out"
+TEMP_SUFFIX = ".tmp"
+
+
+class AssemblyCache:
+    """A size-bounded on-disk store of assembler outputs, keyed by a hash of
+    the assembler input.
+
+    Every entry is a file in the cache directory. Reading an entry refreshes
+    its modification time, and when the store grows beyond its size bound
+    the entries that were least recently used are deleted first. Entries are
+    written atomically, so several processes may share a cache directory.
+    """
+
+    def __init__(self, directory: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """Opens the cache stored in the given directory, creating it if
+        needed.
+
+        Args:
+            directory (str): the directory holding the cache entries.
+            max_bytes (int): the total size the entries may take.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(source: bytes, *salt: str) -> str:
+        """
+        Args:
+            source (bytes): the contents of the assembler input.
+            salt (str): anything else the output depends on, such as the
+                assembler version and the output format.
+
+        Returns:
+            str: the cache key of the given input.
+        """
+        digest = hashlib.sha256()
+        for part in salt:
+            digest.update(part.encode() + b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> typing.Optional[bytes]:
+        """
+        Args:
+            key (str): a key returned by key().
+
+        Returns:
+            typing.Optional[bytes]: the output stored under the key, or None
+            if there is no such entry.
+        """
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as entry:
+                output = entry.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Never stored, or evicted by another process meanwhile.
+            return None
+        return output
+
+    def put(self, key: str, output: bytes) -> None:
+        """Stores an output under the given key, then evicts the least
+        recently used entries if the cache grew too large.
+
+        Args:
+            key (str): a key returned by key().
+            output (bytes): the output to store.
+        """
+        path = self.__path(key)
+        temp_path = f"{path}.{os.getpid()}{TEMP_SUFFIX}"
+        with open(temp_path, 'wb') as entry:
+            entry.write(output)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Deletes least recently used entries until the cache fits in its
+        size bound.
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for dir_entry in it:
+                if not dir_entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
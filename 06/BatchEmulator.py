@@ -0,0 +1,258 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Requires numpy ('pip install numpy').
+"""
+import argparse
+import os
+import time
+import typing
+
+import numpy as np
+
+from CPUEmulator import CPUEmulator, decode, load_program, parse_register, \
+    wrap, RAM_SIZE, ROM_SIZE, ADDRESS_MASK, DEFAULT_MAX_CYCLES
+
+
+class BatchEmulator:
+    """Runs one program on many Hack computers at once, e.g. on many initial
+    RAM states for fuzzing or grading.
+
+    The registers of all the instances are NumPy arrays and their RAMs are
+    the rows of one 2D array, so every instruction is executed for all the
+    instances at the same PC with a handful of vectorized operations. When
+    the instances diverge, each step executes one instruction for the
+    instances masked to its PC. Instances that halt, or run off the end of
+    the ROM, are masked out of further steps. Instances that used up the
+    cycle budget of a run() are masked out until the next run().
+    """
+
+    def __init__(self, rom: typing.Sequence[int], instances: int) -> None:
+        """Loads a program into the ROM of every instance and resets them.
+
+        Args:
+            rom (typing.Sequence[int]): the machine words of the program.
+            instances (int): the number of computers to emulate.
+        """
+        if len(rom) > ROM_SIZE:
+            raise ValueError(
+                f"Program of {len(rom)} words does not fit in the ROM")
+        self.rom = list(rom)
+        self.program = [decode(word) for word in self.rom]
+        self.halts = CPUEmulator(self.rom).halts
+        self.halt_addresses = np.array(sorted(self.halts), dtype=np.int32)
+        self.instances = instances
+        self.ram = np.zeros((instances, RAM_SIZE), dtype=np.int16)
+        self.a = np.zeros(instances, dtype=np.int32)
+        self.d = np.zeros(instances, dtype=np.int32)
+        self.pc = np.zeros(instances, dtype=np.int32)
+        self.cycles = np.zeros(instances, dtype=np.int64)
+        self.halted = np.zeros(instances, dtype=bool)
+        self.exhausted = np.zeros(instances, dtype=bool)
+        self.__stopped = False
+
+    def __getitem__(self, register: str) -> np.ndarray:
+        """
+        Args:
+            register (str): "A", "D", "PC" or "RAM[i]".
+
+        Returns:
+            np.ndarray: the value of the register in every instance.
+        """
+        name, index = parse_register(register)
+        if name == "RAM":
+            return self.ram[:, index]
+        return getattr(self, name.lower())
+
+    def __setitem__(self, register: str,
+                    values: typing.Union[int, typing.Sequence[int]]) -> None:
+        """
+        Args:
+            register (str): "A", "D", "PC" or "RAM[i]".
+            values (typing.Union[int, typing.Sequence[int]]): one value for
+                all the instances, or a value per instance.
+        """
+        name, index = parse_register(register)
+        values = np.asarray(values, dtype=np.int64)
+        if name == "PC":
+            self.pc[:] = values & ADDRESS_MASK
+        elif name == "RAM":
+            self.ram[:, index] = wrap(values)
+        else:
+            getattr(self, name.lower())[:] = wrap(values)
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES) -> int:
+        """Runs every instance until it halts or runs off the end of the ROM,
+        or executed max_cycles instructions in this call. Like
+        CPUEmulator.run, calling it again resumes the instances that were
+        stopped by the cycle budget.
+
+        Divergent instances are reconverged by always stepping the instances
+        at the lowest PC, while the instances ahead of them wait. Every
+        instance still executes exactly its own instruction stream, and
+        self.cycles counts the instructions each of them executed over all
+        calls.
+
+        Args:
+            max_cycles (int): the maximal number of instructions any
+                instance executes in this call.
+
+        Returns:
+            int: the number of vectorized steps taken. Afterwards
+            self.halted marks the instances that halted or ran off the end
+            of the ROM, and self.exhausted the ones that were stopped by
+            max_cycles instead.
+        """
+        everyone = np.arange(self.instances)
+        self.halted |= self.pc >= len(self.program)
+        self.exhausted[:] = max_cycles <= 0
+        executed = np.zeros(self.instances, dtype=np.int64)
+        steps = 0
+        self.__stopped = True
+        while True:
+            if self.__stopped:
+                # Some instances stopped during the last step.
+                self.__stopped = False
+                running = np.flatnonzero(~(self.halted | self.exhausted))
+                if running.size == 0:
+                    break
+                if running.size == self.instances:
+                    running = everyone
+            pcs = self.pc if running is everyone else self.pc[running]
+            first = pcs.min()
+            if running is everyone and pcs[0] == first and \
+                    (pcs == first).all():
+                selected, rows = slice(None), everyone
+            else:
+                selected = rows = running[pcs == first]
+            self.__execute(int(first), selected, rows)
+            self.cycles[selected] += 1
+            executed[selected] += 1
+            steps += 1
+            out_of_cycles = executed[selected] >= max_cycles
+            if out_of_cycles.any():
+                self.exhausted[rows[out_of_cycles]] = True
+                self.__stopped = True
+        return steps
+
+    def __execute(self, pc: int, selected: typing.Union[slice, np.ndarray],
+                  rows: np.ndarray) -> None:
+        """Executes the instruction at pc on some of the instances.
+
+        Args:
+            pc (int): the address of the instruction.
+            selected (typing.Union[slice, np.ndarray]): selects the instances
+                from the register arrays.
+            rows (np.ndarray): the indices of the same instances.
+        """
+        compute, operand, *rest = self.program[pc]
+        if compute is None:
+            self.a[selected] = operand
+            self.pc[selected] = pc + 1
+            if pc + 1 >= len(self.program):
+                self.halted[rows] = True
+                self.__stopped = True
+            return
+        writes_a, writes_d, writes_m, jump = rest
+        address = self.a[selected] & ADDRESS_MASK
+        y = self.ram[rows, address].astype(np.int32) if operand \
+            else self.a[selected]
+        out = compute(self.d[selected], y)
+        if np.ndim(out) == 0:
+            out = np.full(rows.shape, out, dtype=np.int32)
+        if writes_m:
+            self.ram[rows, address] = out
+        if writes_d:
+            self.d[selected] = out
+        if writes_a:
+            self.a[selected] = out
+        if not jump:
+            self.pc[selected] = pc + 1
+            if pc + 1 >= len(self.program):
+                self.halted[rows] = True
+                self.__stopped = True
+            return
+        taken = np.zeros(out.shape, dtype=bool)
+        if jump & 0b001:
+            taken |= out > 0
+        if jump & 0b010:
+            taken |= out == 0
+        if jump & 0b100:
+            taken |= out < 0
+        next_pc = np.where(taken, address, pc + 1)
+        self.pc[selected] = next_pc
+        stopped = next_pc >= len(self.program)
+        if self.halts:
+            stopped |= taken & np.isin(address, self.halt_addresses)
+        if stopped.any():
+            self.halted[rows[stopped]] = True
+            self.__stopped = True
+
+
+if "__main__" == __name__:
+    # Runs a program on many instances with random initial registers and
+    # prints the aggregate throughput, optionally against running the same
+    # instances one after the other on CPUEmulator.
+    arg_parser = argparse.ArgumentParser(prog="BatchEmulator")
+    arg_parser.add_argument(
+        "program", help="a .hack, .bin, .binbe or .asm file")
+    arg_parser.add_argument(
+        "--instances", type=int, default=1000,
+        help="the number of computers to run the program on")
+    arg_parser.add_argument(
+        "--cycles", type=int, default=DEFAULT_MAX_CYCLES,
+        help="stop an instance after this many instructions")
+    arg_parser.add_argument(
+        "--random", action="append", default=[],
+        metavar="REGISTER=LOW:HIGH",
+        help="set a register of every instance to a random value in "
+             "[LOW, HIGH), e.g. RAM[0]=0:100")
+    arg_parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the random values")
+    arg_parser.add_argument(
+        "--compare", action="store_true",
+        help="also run every instance on CPUEmulator, check that the results "
+             "are identical and report the speedup")
+    args = arg_parser.parse_args()
+    rom = load_program(os.path.abspath(args.program))
+    emulator = BatchEmulator(rom, args.instances)
+    rng = np.random.default_rng(args.seed)
+    initial = {}
+    for assignment in args.random:
+        register, _, bounds = assignment.partition("=")
+        low, _, high = bounds.partition(":")
+        initial[register.strip()] = rng.integers(
+            int(low), int(high), args.instances)
+        emulator[register.strip()] = initial[register.strip()]
+
+    start = time.perf_counter()
+    steps = emulator.run(args.cycles)
+    batch_time = time.perf_counter() - start
+    executed = int(emulator.cycles.sum())
+    print(f"{args.instances} instances: {executed} instructions in "
+          f"{steps} steps, {batch_time:.3f}s "
+          f"({executed / max(batch_time, 1e-9):.0f} instructions/sec), "
+          f"{int(emulator.halted.sum())} halted, "
+          f"{int(emulator.exhausted.sum())} out of cycles")
+    if args.compare:
+        sequential_time = 0.0
+        for instance in range(args.instances):
+            sequential = CPUEmulator(rom)
+            for register, values in initial.items():
+                sequential[register] = int(values[instance])
+            start = time.perf_counter()
+            sequential.run(args.cycles)
+            sequential_time += time.perf_counter() - start
+            if sequential.pc != emulator.pc[instance] or \
+                    sequential.cycles != emulator.cycles[instance] or \
+                    sequential.ram.tolist() != \
+                    emulator.ram[instance].tolist():
+                raise SystemExit(f"Instance {instance} differs from "
+                                 "CPUEmulator")
+        print(f"Sequential: {sequential_time:.3f}s "
+              f"({executed / max(sequential_time, 1e-9):.0f} "
+              f"instructions/sec), speedup "
+              f"{sequential_time / max(batch_time, 1e-9):.1f}x")
@@ -0,0 +1,234 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import os
+import re
+import sys
+import time
+import timeit
+import typing
+
+from SymbolTable import SymbolTable
+from Parser import Parser, L_COMMAND, A_COMMAND, C_COMMAND
+from Parser import parse
+from Code import Code, JUMP_DICT, COMP_DICT, DEST_DICT
+from Main import assemble_file, int2bin
+
+DEFAULT_PROGRAM = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "pong", "Pong.asm")
+DEFAULT_REPEAT = 5
+
+
+def legacy_dest(mnemonic: str) -> str:
+    """The original list-building dest encoder, kept as a baseline."""
+    dst = ['0','0','0']
+    if 'A' in mnemonic:
+        dst[0] = '1'
+    if 'D' in mnemonic:
+        dst[1] = '1'
+    if 'M' in mnemonic:
+        dst[2] = '1'
+    return ''.join(dst)
+
+
+def legacy_comp(mnemonic: str) -> str:
+    """The original regex chain comp encoder, kept as a baseline."""
+    a_bit = "1" if "M" in mnemonic else "0"
+    comp = ""
+
+    if mnemonic == "0": comp = "101010"
+    elif mnemonic == "1": comp = "111111"
+    elif mnemonic == "-1": comp = "111010"
+    elif mnemonic == "D": comp = "001100"
+    elif re.match(r"^[AM]$", mnemonic): comp = "110000"
+    elif mnemonic == "!D": comp = "001101"
+    elif re.match(r"^![AM]$", mnemonic): comp = "110001"
+    elif mnemonic == "-D": comp = "001111"
+    elif re.match(r"^-[AM]$", mnemonic): comp = "110011"
+    elif mnemonic == "D+1": comp = "011111"
+    elif re.match(r"^[AM]\+1$", mnemonic): comp = "110111"
+    elif mnemonic == "D-1": comp = "001110"
+    elif re.match(r"^[AM]-1$", mnemonic): comp = "110010"
+    elif re.match(r"^([AM]\+D|D\+[AM])$", mnemonic): comp = "000010"
+    elif re.match(r"^D-[AM]$", mnemonic): comp = "010011"
+    elif re.match(r"^[AM]-D$", mnemonic): comp = "000111"
+    elif re.match(r"^([AM]&D|D&[AM])$", mnemonic): comp = "000000"
+    elif re.match(r"^([AM]\|D|D\|[AM])$", mnemonic): comp = "010101"
+    elif re.match(r"^[AM]<<$", mnemonic): comp = "100000"
+    elif mnemonic == "D<<": comp = "110000"
+    elif re.match(r"^[AM]>>$", mnemonic): comp = "000000"
+    elif mnemonic == "D>>": comp = "010000"
+
+    return a_bit + comp
+
+
+def legacy_c_command(dest: str, comp: str, jump: str) -> int:
+    """The original string concatenating C-command encoder, as a baseline."""
+    prefix = "111"
+    if ">>" in comp or "<<" in comp: prefix = "101"
+    return int(prefix + legacy_comp(comp) + legacy_dest(dest) +
+               JUMP_DICT[jump], 2)
+
+
+def assemble_file_two_pass(
+        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+    """The original two-pass assembler, kept as the benchmark baseline.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.TextIO): writes all output to this file.
+    """
+    sym_table = SymbolTable()
+
+    # First pass
+    p = Parser(input_file)
+    command_num = 0
+    while True:
+        if p.command_type() == L_COMMAND:
+            sym_table.add_entry(p.symbol(), command_num)
+        else:
+            command_num += 1
+        if not p.has_more_commands(): break
+        p.advance()
+
+    # Second pass
+    input_file.seek(0, 0)
+    p = Parser(input_file)
+    next_available_memory = 16
+    while True:
+        command_type = p.command_type()
+        if command_type == A_COMMAND:
+            sym = p.symbol()
+            addr = 0
+            if not sym.isdigit():
+                if not sym_table.contains(sym):
+                    sym_table.add_entry(sym, next_available_memory)
+                    next_available_memory += 1
+                addr = sym_table.get_address(sym)
+            else:
+                addr = int(sym)
+            output_file.write(int2bin(addr) + "\n")
+
+        elif command_type == C_COMMAND:
+            dest = legacy_dest(p.dest())
+            comp = legacy_comp(p.comp())
+            jump = JUMP_DICT[p.jump()]
+            prefix = "111"
+            if ">>" in p.comp() or "<<" in p.comp(): prefix = "101"
+            output_file.write(prefix + comp + dest + jump + "\n")
+        if not p.has_more_commands(): break
+        p.advance()
+
+
+def time_assembler(
+        assembler: typing.Callable[[typing.TextIO, typing.TextIO], None],
+        source: str, repeat: int) -> typing.Tuple[float, str]:
+    """Runs an assembler on in-memory streams and keeps the best time.
+
+    Args:
+        assembler (typing.Callable): an assemble_file-like function.
+        source (str): the assembly program.
+        repeat (int): how many times to run the assembler.
+
+    Returns:
+        typing.Tuple[float, str]: the best run time in seconds, and the
+        produced output.
+    """
+    best = float("inf")
+    output = ""
+    for _ in range(repeat):
+        input_file, output_file = io.StringIO(source), io.StringIO()
+        start = time.perf_counter()
+        assembler(input_file, output_file)
+        best = min(best, time.perf_counter() - start)
+        output = output_file.getvalue()
+    return best, output
+
+
+def benchmark_assemblers(path: str, repeat: int) -> None:
+    """Compares the single-pass assembler with the two-pass baseline.
+
+    Args:
+        path (str): the assembly program to benchmark on.
+        repeat (int): how many times to run each assembler.
+    """
+    with open(path, 'r') as input_file:
+        source = input_file.read()
+    baseline_time, baseline = time_assembler(
+        assemble_file_two_pass, source, repeat)
+    current_time, current = time_assembler(assemble_file, source, repeat)
+    if baseline != current:
+        sys.exit(f"Output mismatch between assemblers on {path}")
+    instructions = current.count("\n")
+    print(f"{os.path.basename(path)}: {instructions} instructions, "
+          f"best of {repeat}")
+    for name, seconds in (("two-pass", baseline_time),
+                          ("single-pass", current_time)):
+        print(f"  {name:<12} {seconds * 1000:9.2f} ms "
+              f"{instructions / seconds:12.0f} instructions/sec")
+    print(f"  speedup      {baseline_time / current_time:9.2f}x")
+
+
+def c_commands(source: str) -> typing.List[typing.Tuple[str, str, str]]:
+    """Splits every C-command of a program into its dest, comp and jump.
+
+    Args:
+        source (str): the assembly program.
+
+    Returns:
+        typing.List[typing.Tuple[str, str, str]]: the C-commands, in order.
+    """
+    return [(instruction.dest, instruction.comp, instruction.jump)
+            for instruction in parse(source.splitlines())
+            if instruction.kind == C_COMMAND]
+
+
+def benchmark_c_encoding(path: str, repeat: int) -> None:
+    """Micro-benchmarks the C-command encoders on the commands of a program.
+
+    Every table entry is first checked against the original encoders, then
+    each encoder is timed over all the C-commands of the program.
+
+    Args:
+        path (str): the assembly program whose C-commands are encoded.
+        repeat (int): how many times to run each encoder.
+    """
+    for mnemonic in COMP_DICT:
+        assert Code.comp(mnemonic) == legacy_comp(mnemonic), mnemonic
+    for mnemonic in DEST_DICT:
+        assert Code.dest(mnemonic) == legacy_dest(mnemonic), mnemonic
+
+    with open(path, 'r') as input_file:
+        commands = c_commands(input_file.read())
+    cases = (
+        ("dest", lambda: [legacy_dest(d) for d, c, j in commands],
+            lambda: [Code.dest(d) for d, c, j in commands]),
+        ("comp", lambda: [legacy_comp(c) for d, c, j in commands],
+            lambda: [Code.comp(c) for d, c, j in commands]),
+        ("c_command", lambda: [legacy_c_command(*c) for c in commands],
+            lambda: [Code.c_command(*c) for c in commands]),
+    )
+    print(f"C-command encoding: {len(commands)} commands, best of {repeat}")
+    for name, legacy, table in cases:
+        assert legacy() == table(), name
+        legacy_time = min(timeit.repeat(legacy, number=1, repeat=repeat))
+        table_time = min(timeit.repeat(table, number=1, repeat=repeat))
+        print(f"  {name:<10} legacy {legacy_time / len(commands) * 1e9:7.0f} "
+              f"ns/op  table {table_time / len(commands) * 1e9:7.0f} ns/op  "
+              f"speedup {legacy_time / table_time:6.2f}x")
+
+
+if "__main__" == __name__:
+    # Usage: Benchmark.py [input path] [repeat]
+    if len(sys.argv) > 3:
+        sys.exit("Invalid usage, please use: Benchmark.py [<input path>] "
+                 "[<repeat>]")
+    path = os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 \
+        else DEFAULT_PROGRAM
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_REPEAT
+    benchmark_assemblers(path, repeat)
+    benchmark_c_encoding(path, repeat)
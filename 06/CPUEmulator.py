@@ -0,0 +1,303 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import os
+import re
+import time
+import typing
+
+from Code import ALU_COMP, SHIFT_COMP, C_PREFIX, SHIFT_PREFIX
+from HackBinary import load_words, BINARY_EXTENSIONS, \
+    EXTENSION_BYTE_ORDERS
+from Main import assemble
+
+RAM_SIZE = 32768
+ROM_SIZE = 32768
+SCREEN = 16384
+KBD = 24576
+ADDRESS_MASK = 0x7FFF
+A_BIT = 0x1000
+# An unconditional jump that writes nothing: the prefix, dest and jump bits
+# of a C-command, and their values in such a jump.
+HALT_MASK = 0xE03F
+HALT_JUMP = 0xE007
+DEFAULT_MAX_CYCLES = 10 ** 7
+REGISTER_PATTERN = re.compile(r"^(RAM\[(\d+)\]|A|D|PC)$")
+
+
+def wrap(value: int) -> int:
+    """Wraps an integer into the signed 16-bit range."""
+    return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+
+# The computations of the ALU, as functions of x (D) and y (A or M), keyed by
+# their C-command prefix and comp bits.
+COMP_FUNCTIONS = {
+    "0": lambda x, y: 0,
+    "1": lambda x, y: 1,
+    "-1": lambda x, y: -1,
+    "D": lambda x, y: x,
+    "A": lambda x, y: y,
+    "!D": lambda x, y: ~x,
+    "!A": lambda x, y: ~y,
+    "-D": lambda x, y: wrap(-x),
+    "-A": lambda x, y: wrap(-y),
+    "D+1": lambda x, y: wrap(x + 1),
+    "A+1": lambda x, y: wrap(y + 1),
+    "D-1": lambda x, y: wrap(x - 1),
+    "A-1": lambda x, y: wrap(y - 1),
+    "D+A": lambda x, y: wrap(x + y),
+    "D-A": lambda x, y: wrap(x - y),
+    "A-D": lambda x, y: wrap(y - x),
+    "D&A": lambda x, y: x & y,
+    "D|A": lambda x, y: x | y,
+    "A<<": lambda x, y: wrap(y << 1),
+    "D<<": lambda x, y: wrap(x << 1),
+    "A>>": lambda x, y: y >> 1,
+    "D>>": lambda x, y: x >> 1,
+}
+ALU_FUNCTIONS = {}
+for _prefix, _table in ((C_PREFIX, ALU_COMP), (SHIFT_PREFIX, SHIFT_COMP)):
+    for _mnemonic, _bits in _table.items():
+        ALU_FUNCTIONS[(int(_prefix, 2), int(_bits, 2))] = \
+            COMP_FUNCTIONS[_mnemonic]
+
+
+def alu(prefix: int, comp: int) -> typing.Callable[[int, int], int]:
+    """Returns the ALU computation selected by a C-command, including the
+    combinations of control bits that have no mnemonic.
+
+    Args:
+        prefix (int): the 3 most significant bits of the C-command.
+        comp (int): the 6 comp bits of the C-command (without the a-bit).
+
+    Returns:
+        typing.Callable[[int, int], int]: the output of the ALU as a function
+        of x (the D register) and y (the A register or M).
+    """
+    function = ALU_FUNCTIONS.get((prefix, comp))
+    if function is not None:
+        return function
+    if prefix != int(C_PREFIX, 2):
+        # An extended ALU shift, see 05/ExtendAlu.hdl.
+        left, shift_x = comp & 0b100000, comp & 0b010000
+        def shift(x: int, y: int) -> int:
+            operand = x if shift_x else y
+            return wrap(operand << 1) if left else operand >> 1
+        return shift
+    zx, nx, zy, ny, f, no = ((comp >> bit) & 1 for bit in range(5, -1, -1))
+    def compute(x: int, y: int) -> int:
+        if zx: x = 0
+        if nx: x = ~x
+        if zy: y = 0
+        if ny: y = ~y
+        out = wrap(x + y) if f else x & y
+        return ~out if no else out
+    return compute
+
+
+def decode(word: int) -> tuple:
+    """Decodes a machine word for the interpreter loop.
+
+    Args:
+        word (int): an unsigned 16-bit machine word.
+
+    Returns:
+        tuple: (None, value) for an A-command, and (computation, uses M,
+        writes A, writes D, writes M, jump bits) for a C-command.
+    """
+    if word < 0x8000:
+        return None, word
+    return (alu(word >> 13, (word >> 6) & 0b111111), bool(word & A_BIT),
+            bool(word & 0b100000), bool(word & 0b10000),
+            bool(word & 0b1000), word & 0b111)
+
+
+def load_program(path: str) -> typing.List[int]:
+    """Loads a program into a list of machine words. Text .hack files,
+    .asm sources and ROM images in either byte order (.bin for little-endian,
+    .binbe for big-endian) are supported.
+
+    Args:
+        path (str): the program to load.
+
+    Returns:
+        typing.List[int]: the unsigned 16-bit machine words of the program.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    byteorder = EXTENSION_BYTE_ORDERS.get(extension)
+    if byteorder is not None:
+        return list(load_words(path, byteorder))
+    with open(path, 'r') as input_file:
+        if extension == ".asm":
+            return assemble(input_file)
+        return [int(line, 2) for line in input_file if line.strip()]
+
+
+class CPUEmulator:
+    """Emulates the Hack computer: the CPU, a 32K RAM including the memory
+    maps of the screen and the keyboard, and a ROM holding a program.
+
+    Instructions are decoded once when the program is loaded, and run() is a
+    tight loop over the decoded instructions. The registers and the RAM hold
+    signed 16-bit values.
+    """
+
+    def __init__(self, rom: typing.Sequence[int]) -> None:
+        """Loads a program into the ROM and resets the computer.
+
+        Args:
+            rom (typing.Sequence[int]): the machine words of the program.
+        """
+        if len(rom) > ROM_SIZE:
+            raise ValueError(
+                f"Program of {len(rom)} words does not fit in the ROM")
+        self.rom = list(rom)
+        self.program = [decode(word) for word in self.rom]
+        self.halts = frozenset(
+            address for address in range(len(self.rom) - 1)
+            if self.rom[address] == address and
+            self.rom[address + 1] & HALT_MASK == HALT_JUMP)
+        self.ram = array.array('h', bytes(2 * RAM_SIZE))
+        self.a = self.d = self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    def reset(self) -> None:
+        """Sets the PC to 0, like the reset input of the CPU. The registers
+        and the RAM are left as they are.
+        """
+        self.pc = 0
+        self.halted = False
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES) -> int:
+        """Runs the program until it halts, runs off the end of the ROM or
+        max_cycles instructions were executed. The program halts when it
+        jumps to an infinite loop of the form (END) @END 0;JMP. A loop that
+        writes a register or the RAM on every pass does not count.
+
+        Args:
+            max_cycles (int): the maximal number of instructions to execute.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        program, ram, halts = self.program, self.ram, self.halts
+        size = len(program)
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        halted = False
+        while executed < max_cycles and pc < size:
+            executed += 1
+            compute, operand, *rest = program[pc]
+            if compute is None:
+                a = operand
+                pc += 1
+                continue
+            writes_a, writes_d, writes_m, jump = rest
+            address = a & ADDRESS_MASK
+            out = compute(d, ram[address] if operand else a)
+            if writes_m:
+                ram[address] = out
+            if writes_d:
+                d = out
+            if jump and (jump >> (0 if out > 0 else 1 if out == 0 else 2)) & 1:
+                pc = address
+                if pc in halts:
+                    halted = True
+                    break
+            else:
+                pc += 1
+            if writes_a:
+                a = out
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        self.halted = halted
+        return executed
+
+    def step(self) -> None:
+        """Executes a single instruction."""
+        self.run(1)
+
+    def __getitem__(self, register: str) -> int:
+        """
+        Args:
+            register (str): "A", "D", "PC" or "RAM[i]".
+
+        Returns:
+            int: the value of the register.
+        """
+        name, index = parse_register(register)
+        if name == "RAM":
+            return self.ram[index]
+        return getattr(self, name.lower())
+
+    def __setitem__(self, register: str, value: int) -> None:
+        """
+        Args:
+            register (str): "A", "D", "PC" or "RAM[i]".
+            value (int): the value to set, wrapped into 16 bits.
+        """
+        name, index = parse_register(register)
+        if name == "PC":
+            self.pc = value & ADDRESS_MASK
+        elif name == "RAM":
+            self.ram[index] = wrap(value)
+        else:
+            setattr(self, name.lower(), wrap(value))
+
+
+def parse_register(register: str) -> typing.Tuple[str, int]:
+    """Parses "A", "D", "PC" or "RAM[i]" into a name and a RAM index."""
+    match = REGISTER_PATTERN.match(register)
+    if match is None:
+        raise ValueError(f"Unknown register {register}")
+    if match.group(2) is not None:
+        index = int(match.group(2))
+        if index >= RAM_SIZE:
+            raise ValueError(f"RAM address {index} out of range")
+        return "RAM", index
+    return match.group(1), 0
+
+
+if "__main__" == __name__:
+    # Runs a program headless and prints the requested registers together
+    # with the number of instructions executed per second.
+    arg_parser = argparse.ArgumentParser(prog="CPUEmulator")
+    arg_parser.add_argument(
+        "program", help=f"a .hack, {', '.join(BINARY_EXTENSIONS.values())} "
+                        "or .asm file")
+    arg_parser.add_argument(
+        "--cycles", type=int, default=DEFAULT_MAX_CYCLES,
+        help="stop after this many instructions if the program did not halt")
+    arg_parser.add_argument(
+        "--set", action="append", default=[], metavar="REGISTER=VALUE",
+        help="set a register before running, e.g. RAM[0]=3")
+    arg_parser.add_argument(
+        "--print", action="append", default=[], metavar="REGISTER",
+        dest="registers", help="print a register after running, e.g. RAM[2]")
+    arg_parser.add_argument(
+        "--jit", action="store_true",
+        help="compile the basic blocks of the program to Python functions")
+    args = arg_parser.parse_args()
+    emulator_class = CPUEmulator
+    if args.jit:
+        from JITEmulator import JITEmulator
+        emulator_class = JITEmulator
+    emulator = emulator_class(load_program(os.path.abspath(args.program)))
+    for assignment in args.set:
+        register, _, value = assignment.partition("=")
+        emulator[register.strip()] = int(value)
+    start = time.perf_counter()
+    executed = emulator.run(args.cycles)
+    elapsed = time.perf_counter() - start
+    for register in args.registers:
+        print(f"{register} = {emulator[register]}")
+    print(f"{'Halted' if emulator.halted else 'Stopped'} at PC={emulator.pc} "
+          f"after {executed} instructions in {elapsed:.3f}s "
+          f"({executed / max(elapsed, 1e-9):.0f} instructions/sec)")
@@ -0,0 +1,292 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Requires numpy ('pip install numpy').
+"""
+import argparse
+import os
+import sys
+import time
+import typing
+
+import numpy as np
+
+from HardwareSimulator import Netlist, load_netlist, TRUE_NET
+from HDLParser import HDL_EXTENSION
+from Main import describe_error
+
+# Chips with at most this many input bits are verified on every input.
+DEFAULT_MAX_EXHAUSTIVE_BITS = 20
+# Beyond this, the input vectors alone would not fit in memory.
+EXHAUSTIVE_BITS_LIMIT = 26
+DEFAULT_SAMPLES = 1 << 16
+WORD = 0xFFFF
+# Values of 16-bit inputs that random sampling tries more often than others.
+CORNER_VALUES = np.array([0, 1, 2, 0x7FFF, 0x8000, 0x8001, 0xFFFE, 0xFFFF])
+
+Pins = typing.Dict[str, np.ndarray]
+
+
+def choose(sel: np.ndarray, *inputs: np.ndarray) -> np.ndarray:
+    """Selects inputs[sel] for every vector."""
+    return np.choose(sel, inputs)
+
+
+def demux(pins: Pins, outputs: str) -> Pins:
+    """Routes the input to the output selected by sel, the others are 0."""
+    return {output: np.where(pins["sel"] == index, pins["in"], 0)
+            for index, output in enumerate(outputs)}
+
+
+def alu(pins: Pins) -> Pins:
+    """The Hack ALU, see 02/ALU.hdl."""
+    x = np.where(pins["zx"], 0, pins["x"])
+    x = np.where(pins["nx"], ~x & WORD, x)
+    y = np.where(pins["zy"], 0, pins["y"])
+    y = np.where(pins["ny"], ~y & WORD, y)
+    out = np.where(pins["f"], (x + y) & WORD, x & y)
+    out = np.where(pins["no"], ~out & WORD, out)
+    return {"out": out, "zr": (out == 0).astype(np.int64), "ng": out >> 15}
+
+
+def extend_alu(pins: Pins) -> Pins:
+    """The extended ALU of 05/ExtendAlu.hdl: the regular ALU when
+    instruction[7..8] are both set, and a shift otherwise.
+    """
+    instruction = pins["instruction"]
+    regular = alu({
+        "x": pins["x"], "y": pins["y"],
+        **{flag: instruction >> bit & 1 for bit, flag in
+           zip(range(5, -1, -1), ("zx", "nx", "zy", "ny", "f", "no"))}})
+    operand = np.where(instruction >> 4 & 1, pins["x"], pins["y"])
+    shifted = np.where(instruction >> 5 & 1, operand << 1 & WORD,
+                       operand >> 1 | operand & 0x8000)
+    out = np.where((instruction >> 7 & 3) == 3, regular["out"], shifted)
+    return {"out": out, "zr": (out == 0).astype(np.int64), "ng": out >> 15}
+
+
+# Reference models of the combinational chips, as functions of arrays of
+# unsigned input values to arrays of unsigned output values.
+REFERENCE_MODELS = {
+    "Not": lambda pins: {"out": pins["in"] ^ 1},
+    "And": lambda pins: {"out": pins["a"] & pins["b"]},
+    "Or": lambda pins: {"out": pins["a"] | pins["b"]},
+    "Xor": lambda pins: {"out": pins["a"] ^ pins["b"]},
+    "Mux": lambda pins: {"out": choose(pins["sel"], pins["a"], pins["b"])},
+    "DMux": lambda pins: demux(pins, "ab"),
+    "Not16": lambda pins: {"out": ~pins["in"] & WORD},
+    "And16": lambda pins: {"out": pins["a"] & pins["b"]},
+    "Or16": lambda pins: {"out": pins["a"] | pins["b"]},
+    "Mux16": lambda pins: {"out": choose(pins["sel"], pins["a"], pins["b"])},
+    "Or8Way": lambda pins: {"out": (pins["in"] != 0).astype(np.int64)},
+    "Mux4Way16": lambda pins: {"out": choose(
+        pins["sel"], *(pins[name] for name in "abcd"))},
+    "Mux8Way16": lambda pins: {"out": choose(
+        pins["sel"], *(pins[name] for name in "abcdefgh"))},
+    "DMux4Way": lambda pins: demux(pins, "abcd"),
+    "DMux8Way": lambda pins: demux(pins, "abcdefgh"),
+    "HalfAdder": lambda pins: {
+        "sum": pins["a"] ^ pins["b"], "carry": pins["a"] & pins["b"]},
+    "FullAdder": lambda pins: {
+        "sum": pins["a"] ^ pins["b"] ^ pins["c"],
+        "carry": (pins["a"] + pins["b"] + pins["c"]) >> 1},
+    "Add16": lambda pins: {"out": (pins["a"] + pins["b"]) & WORD},
+    "Inc16": lambda pins: {"out": (pins["in"] + 1) & WORD},
+    "ALU": alu,
+    "ShiftLeft": lambda pins: {"out": pins["in"] << 1 & WORD},
+    "ShiftRight": lambda pins: {
+        "out": pins["in"] >> 1 | pins["in"] & 0x8000},
+    "ExtendAlu": extend_alu,
+}
+
+
+def pack_lanes(values: np.ndarray, width: int) -> typing.List[int]:
+    """Transposes an array of values into one int per bit, whose lane (bit)
+    i is that bit of values[i].
+    """
+    return [int.from_bytes(np.packbits(
+        (values >> bit & 1).astype(np.uint8), bitorder="little").tobytes(),
+        "little") for bit in range(width)]
+
+
+def unpack_lanes(lanes: typing.List[int], count: int) -> np.ndarray:
+    """The inverse of pack_lanes, for count values."""
+    values = np.zeros(count, dtype=np.int64)
+    size = (count + 7) // 8
+    for bit, lane in enumerate(lanes):
+        bits = np.unpackbits(np.frombuffer(
+            lane.to_bytes(size, "little"), dtype=np.uint8),
+            count=count, bitorder="little")
+        values |= bits.astype(np.int64) << bit
+    return values
+
+
+def exhaustive_inputs(widths: typing.Dict[str, int]) -> Pins:
+    """Every combination of the input pins: vector i holds the bits of i."""
+    bits = sum(widths.values())
+    index = np.arange(1 << bits, dtype=np.int64)
+    pins = {}
+    for pin, width in widths.items():
+        pins[pin] = index & ((1 << width) - 1)
+        index = index >> width
+    return pins
+
+
+def random_inputs(widths: typing.Dict[str, int], samples: int,
+                  rng: np.random.Generator) -> Pins:
+    """Random values of the input pins, with corner values of 16-bit pins
+    in about one vector out of four.
+    """
+    pins = {}
+    for pin, width in widths.items():
+        values = rng.integers(0, 1 << width, samples, dtype=np.int64)
+        if width == 16:
+            corners = rng.random(samples) < 0.25
+            values[corners] = rng.choice(CORNER_VALUES, corners.sum())
+        pins[pin] = values
+    return pins
+
+
+def evaluate(netlist: Netlist, inputs: Pins, count: int,
+             evaluator: typing.Optional[typing.Callable] = None) -> Pins:
+    """Evaluates a combinational netlist on count input vectors at once,
+    one vector per bit lane.
+    """
+    evaluator = evaluator or netlist.compile()
+    mask = (1 << count) - 1
+    values = [0] * netlist.size
+    values[TRUE_NET] = mask
+    for pin, width in netlist.definition.inputs.items():
+        for net, lane in zip(netlist.pins[pin],
+                             pack_lanes(inputs[pin], width)):
+            values[net] = lane
+    values = evaluator(values, mask)
+    return {pin: unpack_lanes([values[net] for net in netlist.pins[pin]],
+                              count)
+            for pin in netlist.definition.outputs}
+
+
+class Verdict:
+    """The outcome of verifying a chip against its reference model."""
+
+    __slots__ = ("chip", "input_bits", "vectors", "exhaustive",
+                 "counterexample", "seconds")
+
+    def __init__(self, chip: str, input_bits: int, vectors: int,
+                 exhaustive: bool,
+                 counterexample: typing.Optional[typing.Dict[str, tuple]],
+                 seconds: float) -> None:
+        self.chip = chip
+        self.input_bits = input_bits
+        self.vectors = vectors
+        self.exhaustive = exhaustive
+        self.counterexample = counterexample
+        self.seconds = seconds
+
+    def __str__(self) -> str:
+        method = f"all 2^{self.input_bits} inputs" if self.exhaustive \
+            else f"{self.vectors} random vectors of {self.input_bits} bits"
+        if self.counterexample is None:
+            claim = "equivalent on" if self.exhaustive \
+                else "no difference in"
+            return (f"{self.chip}: {claim} {method} "
+                    f"({self.seconds * 1000:.1f}ms)")
+        pins = ", ".join(
+            f"{pin}={values[0]}" if len(values) == 1 else
+            f"{pin}={values[0]} (expected {values[1]})"
+            for pin, values in self.counterexample.items())
+        return f"{self.chip}: DIFFERS from the model on {method}: {pins}"
+
+
+def verify_chip(path: str, samples: int = DEFAULT_SAMPLES,
+                max_exhaustive_bits: int = DEFAULT_MAX_EXHAUSTIVE_BITS,
+                seed: int = 0) -> Verdict:
+    """Compares a combinational chip with its reference model, on every
+    input if it has few enough input bits and on random inputs otherwise.
+
+    Args:
+        path (str): the .hdl file of a chip in REFERENCE_MODELS.
+        samples (int): the number of random vectors for wide chips.
+        max_exhaustive_bits (int): the widest input to verify exhaustively.
+        seed (int): the seed of the random vectors.
+
+    Returns:
+        Verdict: the result, with the first differing vector if any.
+    """
+    start = time.perf_counter()
+    netlist = load_netlist(path)
+    definition = netlist.definition
+    model = REFERENCE_MODELS.get(definition.name)
+    if model is None:
+        raise ValueError(f"There is no reference model of {definition.name}")
+    if netlist.dffs or netlist.memories:
+        raise ValueError(f"{definition.name} is not combinational")
+    input_bits = sum(definition.inputs.values())
+    exhaustive = input_bits <= max_exhaustive_bits
+    if exhaustive:
+        inputs = exhaustive_inputs(definition.inputs)
+    else:
+        inputs = random_inputs(definition.inputs, samples,
+                               np.random.default_rng(seed))
+    count = len(next(iter(inputs.values())))
+    outputs = evaluate(netlist, inputs, count)
+    expected = model(inputs)
+    differs = np.zeros(count, dtype=bool)
+    for pin, width in definition.outputs.items():
+        differs |= outputs[pin] != expected[pin] & ((1 << width) - 1)
+    counterexample = None
+    if differs.any():
+        vector = int(np.argmax(differs))
+        counterexample = {pin: (int(values[vector]),)
+                          for pin, values in inputs.items()}
+        counterexample.update(
+            (pin, (int(outputs[pin][vector]), int(expected[pin][vector])))
+            for pin in definition.outputs)
+    return Verdict(definition.name, input_bits, count, exhaustive,
+                   counterexample, time.perf_counter() - start)
+
+
+if "__main__" == __name__:
+    # Verifies the chips with reference models among the given .hdl files and
+    # directories, and exits with an error if any of them differs.
+    arg_parser = argparse.ArgumentParser(prog="ChipVerifier")
+    arg_parser.add_argument(
+        "paths", nargs="+",
+        help=f"{HDL_EXTENSION} files, or directories containing them")
+    arg_parser.add_argument(
+        "--samples", type=int, default=DEFAULT_SAMPLES,
+        help="the number of random vectors for chips with wide inputs")
+    arg_parser.add_argument(
+        "--max-exhaustive-bits", type=int, default=DEFAULT_MAX_EXHAUSTIVE_BITS,
+        help="verify chips with at most this many input bits on all inputs")
+    arg_parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the random vectors")
+    args = arg_parser.parse_args()
+    if args.max_exhaustive_bits > EXHAUSTIVE_BITS_LIMIT:
+        arg_parser.error(f"--max-exhaustive-bits must be at most "
+                         f"{EXHAUSTIVE_BITS_LIMIT}")
+    chips = []
+    for path in map(os.path.abspath, args.paths):
+        if os.path.isdir(path):
+            chips.extend(sorted(
+                os.path.join(path, filename) for filename in os.listdir(path)
+                if filename.endswith(HDL_EXTENSION) and
+                filename[:-len(HDL_EXTENSION)] in REFERENCE_MODELS))
+        else:
+            chips.append(path)
+    failed = False
+    for chip in chips:
+        try:
+            verdict = verify_chip(chip, args.samples, args.max_exhaustive_bits,
+                                  args.seed)
+        except Exception as error:
+            print(f"{chip}: {describe_error(error)}")
+            failed = True
+            continue
+        print(verdict)
+        failed = failed or verdict.counterexample is not None
+    if failed:
+        sys.exit(1)
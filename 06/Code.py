@@ -4,7 +4,10 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
-import re
+import itertools
+
+C_PREFIX = "111"
+SHIFT_PREFIX = "101"
 
 JUMP_DICT = {
     "": "000",
@@ -17,6 +20,75 @@ JUMP_DICT = {
     "JMP": "111"
 }
 
+# comp bits of every computation, written with A as the y operand.
+ALU_COMP = {
+    "0": "101010",
+    "1": "111111",
+    "-1": "111010",
+    "D": "001100",
+    "A": "110000",
+    "!D": "001101",
+    "!A": "110001",
+    "-D": "001111",
+    "-A": "110011",
+    "D+1": "011111",
+    "A+1": "110111",
+    "D-1": "001110",
+    "A-1": "110010",
+    "D+A": "000010",
+    "D-A": "010011",
+    "A-D": "000111",
+    "D&A": "000000",
+    "D|A": "010101"
+}
+
+# comp bits of the extended ALU shift operations.
+SHIFT_COMP = {
+    "A<<": "100000",
+    "D<<": "110000",
+    "A>>": "000000",
+    "D>>": "010000"
+}
+
+COMMUTATIVE_OPERATORS = ("+", "&", "|")
+
+
+def _build_comp_dict() -> dict:
+    """Maps every legal comp mnemonic to its prefix, a-bit and comp bits."""
+    comp_dict = {}
+    for prefix, table in ((C_PREFIX, ALU_COMP), (SHIFT_PREFIX, SHIFT_COMP)):
+        for mnemonic, comp in table.items():
+            variants = [mnemonic]
+            if mnemonic[1:2] in COMMUTATIVE_OPERATORS and \
+                    mnemonic[::2] == "DA":
+                variants.append(mnemonic[::-1])
+            for variant in variants:
+                comp_dict[variant] = prefix + "0" + comp
+                if "A" in variant:
+                    comp_dict[variant.replace("A", "M")] = prefix + "1" + comp
+    return comp_dict
+
+
+def _build_dest_dict() -> dict:
+    """Maps every ordering of every subset of A, D, M to its dest bits."""
+    dest_dict = {}
+    for length in range(4):
+        for registers in itertools.permutations("ADM", length):
+            dest_dict["".join(registers)] = "".join(
+                "1" if register in registers else "0" for register in "ADM")
+    return dest_dict
+
+
+COMP_DICT = _build_comp_dict()
+DEST_DICT = _build_dest_dict()
+
+# The same tables, as integers already shifted into place in a C-command.
+COMP_BITS = {
+    mnemonic: int(bits, 2) << 6 for mnemonic, bits in COMP_DICT.items()}
+DEST_BITS = {
+    mnemonic: int(bits, 2) << 3 for mnemonic, bits in DEST_DICT.items()}
+JUMP_BITS = {mnemonic: int(bits, 2) for mnemonic, bits in JUMP_DICT.items()}
+
 
 class Code:
     """Translates Hack assembly language mnemonics into binary codes."""
@@ -30,14 +102,7 @@ class Code:
         Returns:
             str: 3-bit long binary code of the given mnemonic.
         """
-        dst = ['0','0','0']
-        if 'A' in mnemonic:
-            dst[0] = '1'
-        if 'D' in mnemonic:
-            dst[1] = '1'
-        if 'M' in mnemonic:
-            dst[2] = '1'
-        return ''.join(dst)
+        return DEST_DICT[mnemonic]
 
     @staticmethod
     def comp(mnemonic: str) -> str:
@@ -48,34 +113,19 @@ class Code:
         Returns:
             str: the binary code of the given mnemonic.
         """
-        a_bit = "1" if "M" in mnemonic else "0"
-        comp = ""
-
-        if mnemonic == "0": comp = "101010"
-        elif mnemonic == "1": comp = "111111"
-        elif mnemonic == "-1": comp = "111010"
-        elif mnemonic == "D": comp = "001100"
-        elif re.match(r"^[AM]$", mnemonic): comp = "110000"
-        elif mnemonic == "!D": return "001101"
-        elif re.match(r"^![AM]$", mnemonic): comp = "110001"
-        elif mnemonic == "-D": comp = "001111"
-        elif re.match(r"^-[AM]$", mnemonic): comp = "110011"
-        elif mnemonic == "D+1": comp = "011111"
-        elif re.match(r"^[AM]\+1$", mnemonic): comp = "110111"
-        elif mnemonic == "D-1": comp = "001110"
-        elif re.match(r"^[AM]-1$", mnemonic): comp = "110010"
-        elif re.match(r"^([AM]\+D|D\+[AM])$", mnemonic): comp = "000010"
-        elif re.match(r"^D-[AM]$", mnemonic): comp = "010011"
-        elif re.match(r"^[AM]-D$", mnemonic): comp = "000111"
-        elif re.match(r"^([AM]&D|D&[AM])$", mnemonic): comp = "000000"
-        elif re.match(r"^([AM]\|D|D\|[AM])$", mnemonic): comp = "010101"
-        elif re.match(r"^[AM]<<$", mnemonic): comp = "100000"
-        elif mnemonic == "D<<": comp = "110000"
-        elif re.match(r"^[AM]>>$", mnemonic): comp = "000000"
-        elif mnemonic == "D>>": comp = "010000"
-
-        return a_bit + comp
+        return COMP_DICT[mnemonic][len(C_PREFIX):]
 
+    @staticmethod
+    def prefix(mnemonic: str) -> str:
+        """
+        Args:
+            mnemonic (str): a comp mnemonic string.
+
+        Returns:
+            str: the 3-bit prefix of a C-command computing the given mnemonic,
+            "101" for the extended shift operations and "111" otherwise.
+        """
+        return COMP_DICT[mnemonic][:len(C_PREFIX)]
 
     @staticmethod
     def jump(mnemonic: str) -> str:
@@ -87,3 +137,16 @@ class Code:
             str: 3-bit long binary code of the given mnemonic.
         """
         return JUMP_DICT[mnemonic]
+
+    @staticmethod
+    def c_command(dest: str, comp: str, jump: str) -> int:
+        """
+        Args:
+            dest (str): a dest mnemonic string.
+            comp (str): a comp mnemonic string.
+            jump (str): a jump mnemonic string.
+
+        Returns:
+            int: the 16-bit machine word of the C-command dest=comp;jump.
+        """
+        return COMP_BITS[comp] | DEST_BITS[dest] | JUMP_BITS[jump]
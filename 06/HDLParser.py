@@ -0,0 +1,238 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import re
+import typing
+
+HDL_EXTENSION = ".hdl"
+COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+TOKEN = re.compile(r"\.\.|[A-Za-z_]\w*|\d+|\S")
+IDENTIFIER = re.compile(r"^[A-Za-z_]\w*$")
+TRUE = "true"
+FALSE = "false"
+CONSTANTS = (TRUE, FALSE)
+
+
+class HDLError(Exception):
+    """A chip definition is malformed, or a chip cannot be built from it."""
+
+
+class Connection:
+    """A single pin=wire connection of a part.
+
+    Attributes:
+        pin (str): the name of the pin of the part.
+        pin_range (typing.Optional[typing.Tuple[int, int]]): the first and
+            last bit of pin[i..j] or pin[i], None for the whole pin.
+        wire (str): the name of the pin or internal wire of the enclosing
+            chip, or true/false.
+        wire_range (typing.Optional[typing.Tuple[int, int]]): like
+            pin_range, for the wire.
+    """
+
+    __slots__ = ("pin", "pin_range", "wire", "wire_range")
+
+    def __init__(self, pin: str,
+                 pin_range: typing.Optional[typing.Tuple[int, int]],
+                 wire: str,
+                 wire_range: typing.Optional[typing.Tuple[int, int]]) -> None:
+        self.pin = pin
+        self.pin_range = pin_range
+        self.wire = wire
+        self.wire_range = wire_range
+
+
+class Part:
+    """A part of a chip: the name of the chip it is an instance of, and how
+    its pins are connected.
+    """
+
+    __slots__ = ("chip", "connections", "line_number")
+
+    def __init__(self, chip: str, connections: typing.List[Connection],
+                 line_number: int) -> None:
+        self.chip = chip
+        self.connections = connections
+        self.line_number = line_number
+
+
+class ChipDefinition:
+    """The interface and the parts of a chip.
+
+    Attributes:
+        name (str): the name of the chip.
+        inputs (typing.Dict[str, int]): the width of every input pin, in the
+            order of declaration.
+        outputs (typing.Dict[str, int]): the same, for the output pins.
+        parts (typing.List[Part]): the parts of the chip, empty for the
+            built-in chips of the simulator.
+        builtin (bool): whether the chip is built into the simulator.
+    """
+
+    __slots__ = ("name", "inputs", "outputs", "parts", "builtin")
+
+    def __init__(self, name: str, inputs: typing.Dict[str, int],
+                 outputs: typing.Dict[str, int], parts: typing.List[Part],
+                 builtin: bool = False) -> None:
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.parts = parts
+        self.builtin = builtin
+
+    def width(self, pin: str) -> int:
+        """Returns the width of an input or output pin of the chip."""
+        if pin in self.inputs:
+            return self.inputs[pin]
+        if pin in self.outputs:
+            return self.outputs[pin]
+        raise HDLError(f"Chip {self.name} has no pin {pin}")
+
+
+class Tokens:
+    """The tokens of an HDL file, consumed from the front."""
+
+    def __init__(self, text: str, path: str) -> None:
+        self.path = path
+        self.tokens = []
+        text = COMMENT.sub(lambda match: "\n" * match.group().count("\n"),
+                           text)
+        for line_number, line in enumerate(text.splitlines(), 1):
+            self.tokens.extend(
+                (token, line_number) for token in TOKEN.findall(line))
+        self.position = 0
+
+    def peek(self) -> str:
+        if self.position >= len(self.tokens):
+            return ""
+        return self.tokens[self.position][0]
+
+    def next(self) -> str:
+        token = self.peek()
+        if not token:
+            raise self.error("Unexpected end of file")
+        self.position += 1
+        return token
+
+    def expect(self, expected: str) -> None:
+        token = self.next()
+        if token != expected:
+            self.position -= 1
+            raise self.error(f"Expected {expected!r} but found {token!r}")
+
+    def identifier(self) -> str:
+        token = self.next()
+        if not IDENTIFIER.match(token):
+            self.position -= 1
+            raise self.error(f"Expected a name but found {token!r}")
+        return token
+
+    def number(self) -> int:
+        token = self.next()
+        if not token.isdigit():
+            self.position -= 1
+            raise self.error(f"Expected a number but found {token!r}")
+        return int(token)
+
+    @property
+    def line_number(self) -> int:
+        index = min(self.position, len(self.tokens) - 1)
+        return self.tokens[index][1] if self.tokens else 0
+
+    def error(self, message: str) -> HDLError:
+        return HDLError(f"{self.path}:{self.line_number}: {message}")
+
+
+def parse_hdl(text: str, path: str = "<hdl>") -> ChipDefinition:
+    """Parses the definition of a chip.
+
+    Args:
+        text (str): the contents of an .hdl file.
+        path (str): the name of the file, for error messages.
+
+    Returns:
+        ChipDefinition: the chip defined in the file.
+    """
+    tokens = Tokens(text, path)
+    tokens.expect("CHIP")
+    name = tokens.identifier()
+    tokens.expect("{")
+    inputs, outputs = {}, {}
+    while tokens.peek() in ("IN", "OUT"):
+        pins = inputs if tokens.next() == "IN" else outputs
+        parse_pins(tokens, pins)
+    if tokens.peek() == "BUILTIN":
+        raise tokens.error("BUILTIN chips are not supported, the simulator "
+                           "only builds chips from their parts")
+    tokens.expect("PARTS")
+    tokens.expect(":")
+    parts = []
+    while tokens.peek() != "}":
+        parts.append(parse_part(tokens))
+    tokens.expect("}")
+    return ChipDefinition(name, inputs, outputs, parts)
+
+
+def parse_pins(tokens: Tokens, pins: typing.Dict[str, int]) -> None:
+    """Parses the pins of an IN or OUT declaration, e.g. a[16], b;"""
+    while True:
+        pin = tokens.identifier()
+        width = 1
+        if tokens.peek() == "[":
+            tokens.next()
+            width = tokens.number()
+            tokens.expect("]")
+        if pin in pins or width < 1:
+            raise tokens.error(f"Invalid declaration of pin {pin}")
+        pins[pin] = width
+        if tokens.next() == ";":
+            return
+        tokens.position -= 1
+        tokens.expect(",")
+
+
+def parse_part(tokens: Tokens) -> Part:
+    """Parses a part, e.g. Mux16(a=x, b[0..14]=in[1..15], out=out);"""
+    line_number = tokens.line_number
+    chip = tokens.identifier()
+    tokens.expect("(")
+    connections = []
+    while True:
+        pin = tokens.identifier()
+        pin_range = parse_range(tokens)
+        tokens.expect("=")
+        wire = tokens.identifier()
+        wire_range = parse_range(tokens)
+        if wire in CONSTANTS and wire_range is not None:
+            raise tokens.error(f"{wire} cannot be sub-bused")
+        connections.append(Connection(pin, pin_range, wire, wire_range))
+        if tokens.next() == ")":
+            break
+        tokens.position -= 1
+        tokens.expect(",")
+    tokens.expect(";")
+    return Part(chip, connections, line_number)
+
+
+def parse_range(tokens: Tokens) -> typing.Optional[typing.Tuple[int, int]]:
+    """Parses an optional [i] or [i..j] sub-bus."""
+    if tokens.peek() != "[":
+        return None
+    tokens.next()
+    first = last = tokens.number()
+    if tokens.peek() == "..":
+        tokens.next()
+        last = tokens.number()
+    tokens.expect("]")
+    if first > last:
+        raise tokens.error(f"Invalid sub-bus [{first}..{last}]")
+    return first, last
+
+
+def read_hdl(path: str) -> ChipDefinition:
+    """Reads and parses an .hdl file."""
+    with open(path, 'r') as hdl_file:
+        return parse_hdl(hdl_file.read(), path)
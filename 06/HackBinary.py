@@ -0,0 +1,65 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import mmap
+import sys
+import typing
+
+LITTLE_ENDIAN = "little"
+BIG_ENDIAN = "big"
+BYTE_ORDERS = (LITTLE_ENDIAN, BIG_ENDIAN)
+# The byte order of a ROM image is recorded in its extension, since the
+# image itself is nothing but the packed words.
+BINARY_EXTENSIONS = {LITTLE_ENDIAN: ".bin", BIG_ENDIAN: ".binbe"}
+EXTENSION_BYTE_ORDERS = {
+    extension: byteorder for byteorder, extension in BINARY_EXTENSIONS.items()}
+WORD_TYPE = 'H'
+
+
+def write_words(words: typing.Iterable[int], output_file: typing.BinaryIO,
+                byteorder: str = LITTLE_ENDIAN) -> None:
+    """Writes machine words as a ROM image of packed unsigned 16-bit words.
+
+    Args:
+        words (typing.Iterable[int]): the machine words, one per ROM address.
+        output_file (typing.BinaryIO): a file opened in binary mode.
+        byteorder (str): "little" or "big".
+    """
+    image = array.array(WORD_TYPE, words)
+    if byteorder != sys.byteorder:
+        image.byteswap()
+    output_file.write(image.tobytes())
+
+
+def load_words(path: str, byteorder: str = LITTLE_ENDIAN) \
+        -> typing.Sequence[int]:
+    """Loads a ROM image written by write_words.
+
+    When the image is in the native byte order, the file is memory-mapped and
+    the words are read straight from the mapping without copying. Otherwise
+    the words are copied once and byte-swapped.
+
+    Args:
+        path (str): the ROM image to load.
+        byteorder (str): "little" or "big", as given to write_words.
+
+    Returns:
+        typing.Sequence[int]: the machine words, indexed by ROM address.
+    """
+    with open(path, 'rb') as input_file:
+        try:
+            mapping = mmap.mmap(
+                input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            return array.array(WORD_TYPE)
+    words = memoryview(mapping).cast(WORD_TYPE)
+    if byteorder == sys.byteorder:
+        return words
+    image = array.array(WORD_TYPE, words)
+    image.byteswap()
+    return image
@@ -0,0 +1,628 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import os
+import re
+import time
+import typing
+
+from CPUEmulator import load_program, wrap
+from HDLParser import ChipDefinition, HDLError, read_hdl, CONSTANTS, TRUE, \
+    HDL_EXTENSION
+
+# The projects whose chips can be used as parts of chips in other projects.
+PROJECTS_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIBRARY_DIRECTORIES = tuple(
+    os.path.join(PROJECTS_ROOT, *directory.split("/"))
+    for directory in ("01", "02", "03/a", "03/b", "05"))
+
+FALSE_NET = 0
+TRUE_NET = 1
+NAND = "Nand"
+DFF = "DFF"
+PRIMITIVES = {
+    NAND: ChipDefinition(NAND, {"a": 1, "b": 1}, {"out": 1}, [], True),
+    DFF: ChipDefinition(DFF, {"in": 1}, {"out": 1}, [], True),
+}
+# Memories are built in as arrays of words, instead of thousands of DFFs.
+# ROM32K and Keyboard cannot be written by the chip.
+MEMORY_SIZES = {
+    "RAM8": 8, "RAM64": 64, "RAM512": 512, "RAM4K": 4096, "RAM16K": 16384,
+    "Screen": 8192, "ROM32K": 32768, "Keyboard": 1}
+READ_ONLY_MEMORIES = ("ROM32K", "Keyboard")
+# Built-in chips that behave exactly like a chip of the projects.
+ALIASES = {"ARegister": "Register", "DRegister": "Register"}
+PART_PATTERN = re.compile(r"^(\w+)(?:\[(\d*)\])?$")
+WORD_WIDTH = 16
+
+
+def memory_definition(name: str) -> ChipDefinition:
+    """Returns the interface of a built-in memory chip."""
+    address = {"address": (MEMORY_SIZES[name] - 1).bit_length()}
+    if name == "Keyboard":
+        inputs = {}
+    elif name in READ_ONLY_MEMORIES:
+        inputs = address
+    else:
+        inputs = {"in": WORD_WIDTH, "load": 1, **address}
+    return ChipDefinition(name, inputs, {"out": WORD_WIDTH}, [], True)
+
+
+class Memory:
+    """A built-in memory chip of a netlist: its words and the nets of its
+    pins. Writable memories store their input at the tick of the clock, and
+    all memories are read combinationally.
+    """
+
+    __slots__ = ("name", "words", "data", "load", "address", "out")
+
+    def __init__(self, name: str, pins: typing.Dict[str, typing.List[int]]) \
+            -> None:
+        self.name = name
+        self.words = array.array('H', bytes(2 * MEMORY_SIZES[name]))
+        self.data = pins.get("in", [])
+        self.load = pins["load"][0] if "load" in pins else None
+        self.address = pins.get("address", [])
+        self.out = pins["out"]
+
+
+class Instance:
+    """A part of the flattened chip, at any depth, with the nets of its pins
+    and its words if it is a built-in memory.
+    """
+
+    __slots__ = ("name", "pins", "memory")
+
+    def __init__(self, name: str, pins: typing.Dict[str, typing.List[int]]) \
+            -> None:
+        self.name = name
+        self.pins = pins
+        self.memory = None
+
+
+class ChipLibrary:
+    """Finds the definitions of chips by name: the primitives, the built-in
+    memories and .hdl files, which are parsed once.
+    """
+
+    def __init__(self, directories: typing.Sequence[str],
+                 builtin_memory: bool = True) -> None:
+        """
+        Args:
+            directories (typing.Sequence[str]): the directories to search for
+                .hdl files, in order.
+            builtin_memory (bool): use the built-in RAM8-RAM16K chips even
+                when their .hdl files are found.
+        """
+        self.directories = list(directories)
+        self.builtin_memory = builtin_memory
+        self.definitions = dict(PRIMITIVES)
+
+    def get(self, name: str) -> ChipDefinition:
+        """
+        Args:
+            name (str): the name of a chip.
+
+        Returns:
+            ChipDefinition: the definition of the chip.
+        """
+        definition = self.definitions.get(name)
+        if definition is not None:
+            return definition
+        path = None
+        if not (self.builtin_memory and name in MEMORY_SIZES):
+            path = self.find(name)
+        if path is not None:
+            definition = read_hdl(path)
+        elif name in MEMORY_SIZES:
+            definition = memory_definition(name)
+        elif name in ALIASES:
+            definition = self.get(ALIASES[name])
+        else:
+            raise HDLError(f"Chip {name} was not found")
+        self.definitions[name] = definition
+        return definition
+
+    def find(self, name: str) -> typing.Optional[str]:
+        """Returns the path of the .hdl file of a chip, if there is one."""
+        for directory in self.directories:
+            path = os.path.join(directory, name + HDL_EXTENSION)
+            if os.path.isfile(path):
+                return path
+        return None
+
+
+class Netlist:
+    """A chip flattened into Nand gates, DFFs and built-in memories, whose
+    pins are connected by single-bit nets.
+
+    Nets 0 and 1 are the constants false and true. The Nand gates and the
+    memory reads are levelized, so that compile() can evaluate all of them
+    in a single pass in dependency order. The outputs of DFFs only change on
+    the clock, so they break every loop of a well formed sequential chip.
+    """
+
+    def __init__(self, definition: ChipDefinition,
+                 library: ChipLibrary) -> None:
+        """Flattens and levelizes a chip.
+
+        Args:
+            definition (ChipDefinition): the chip to flatten.
+            library (ChipLibrary): the definitions of its parts.
+        """
+        self.definition = definition
+        self.nands = []
+        self.dffs = []
+        self.memories = []
+        self.instances = []
+        self.__parent = [FALSE_NET, TRUE_NET]
+        self.pins = {
+            pin: self.__new_nets(width)
+            for pin, width in {**definition.inputs,
+                               **definition.outputs}.items()}
+        self.__instantiate(definition, self.pins, library, ())
+        self.size = self.__canonicalize()
+        self.order, self.levels = self.__levelize()
+
+    def __new_nets(self, width: int) -> typing.List[int]:
+        first = len(self.__parent)
+        self.__parent.extend(range(first, first + width))
+        return list(range(first, first + width))
+
+    def __find(self, net: int) -> int:
+        parent = self.__parent
+        while parent[net] != net:
+            parent[net] = parent[parent[net]]
+            net = parent[net]
+        return net
+
+    def __union(self, net: int, other: int) -> None:
+        root, other_root = self.__find(net), self.__find(other)
+        if root != other_root:
+            self.__parent[root] = other_root
+
+    def __instantiate(self, definition: ChipDefinition,
+                      pins: typing.Dict[str, typing.List[int]],
+                      library: ChipLibrary,
+                      stack: typing.Tuple[str, ...]) \
+            -> typing.Optional[Memory]:
+        """Adds a chip to the netlist, with its pins connected to the given
+        nets. Returns the memory of a built-in memory chip.
+        """
+        if definition.builtin:
+            if definition.name == NAND:
+                self.nands.append((pins["a"][0], pins["b"][0],
+                                   pins["out"][0]))
+            elif definition.name == DFF:
+                self.dffs.append((pins["in"][0], pins["out"][0]))
+            else:
+                memory = Memory(definition.name, pins)
+                self.memories.append(memory)
+                return memory
+            return None
+        if definition.name in stack:
+            raise HDLError(f"Chip {definition.name} contains itself")
+        stack += (definition.name,)
+
+        # Internal wires get their width from the part output driving them,
+        # which may come after the parts reading them.
+        wires = dict(pins)
+        part_definitions = []
+        for part in definition.parts:
+            part_definition = library.get(part.chip)
+            part_definitions.append(part_definition)
+            for connection in part.connections:
+                if connection.pin not in part_definition.outputs:
+                    continue
+                wire = connection.wire
+                if wire in CONSTANTS or wire in definition.inputs:
+                    raise part_error(definition, part, f"{wire} cannot be "
+                                     "connected to an output pin")
+                if wire in wires:
+                    continue
+                if connection.wire_range is not None:
+                    raise part_error(definition, part, "internal pin "
+                                     f"{wire} cannot be sub-bused")
+                first, last = pin_bits(definition, part, part_definition,
+                                       connection.pin, connection.pin_range)
+                wires[wire] = self.__new_nets(last - first + 1)
+
+        for part, part_definition in zip(definition.parts, part_definitions):
+            part_pins = {pin: [FALSE_NET] * width
+                         for pin, width in part_definition.inputs.items()}
+            part_pins.update(
+                (pin, self.__new_nets(width))
+                for pin, width in part_definition.outputs.items())
+            for connection in part.connections:
+                first, last = pin_bits(definition, part, part_definition,
+                                       connection.pin, connection.pin_range)
+                wire = connection.wire
+                if wire in CONSTANTS:
+                    nets = [TRUE_NET if wire == TRUE else FALSE_NET] * \
+                        (last - first + 1)
+                elif wire not in wires:
+                    raise part_error(definition, part, f"{wire} is not "
+                                     "connected to any part output")
+                else:
+                    nets = wires[wire]
+                    wire_first, wire_last = connection.wire_range or \
+                        (0, len(nets) - 1)
+                    if wire_last >= len(nets):
+                        raise part_error(definition, part, f"sub-bus of "
+                                         f"{wire} out of range")
+                    nets = nets[wire_first:wire_last + 1]
+                if len(nets) != last - first + 1:
+                    raise part_error(definition, part, f"width of "
+                                     f"{connection.pin} and {wire} differ")
+                if connection.pin in part_definition.inputs:
+                    part_pins[connection.pin][first:last + 1] = nets
+                else:
+                    for own, net in zip(
+                            part_pins[connection.pin][first:last + 1], nets):
+                        self.__union(own, net)
+            instance = Instance(part.chip, part_pins)
+            self.instances.append(instance)
+            instance.memory = self.__instantiate(
+                part_definition, part_pins, library, stack)
+        return None
+
+    def __canonicalize(self) -> int:
+        """Renumbers the nets so that connected nets become one, and returns
+        the number of distinct nets.
+        """
+        numbers = {FALSE_NET: FALSE_NET, TRUE_NET: TRUE_NET}
+        def number(net: int) -> int:
+            return numbers.setdefault(self.__find(net), len(numbers))
+        def numbered(nets: typing.List[int]) -> typing.List[int]:
+            return [number(net) for net in nets]
+
+        for pins in [self.pins] + [
+                instance.pins for instance in self.instances]:
+            for pin, nets in pins.items():
+                pins[pin] = numbered(nets)
+        self.nands = [tuple(numbered(gate)) for gate in self.nands]
+        self.dffs = [tuple(numbered(dff)) for dff in self.dffs]
+        for memory in self.memories:
+            memory.data = numbered(memory.data)
+            memory.address = numbered(memory.address)
+            memory.out = numbered(memory.out)
+            if memory.load is not None:
+                memory.load = number(memory.load)
+
+        driven = {FALSE_NET, TRUE_NET}
+        for pin in self.definition.inputs:
+            driven.update(self.pins[pin])
+        outputs = [gate[2] for gate in self.nands] + \
+            [dff[1] for dff in self.dffs] + \
+            [net for memory in self.memories for net in memory.out]
+        for net in outputs:
+            if net in driven:
+                raise HDLError(f"Chip {self.definition.name} connects "
+                               "several outputs to the same pin")
+            driven.add(net)
+        return len(numbers)
+
+    def __levelize(self) -> typing.Tuple[typing.List[int], int]:
+        """Orders the Nand gates and the memories so that every one of them
+        comes after the ones driving its inputs.
+
+        Returns:
+            typing.Tuple[typing.List[int], int]: the order, where indices
+            from len(self.nands) on are memories, and the number of levels.
+        """
+        inputs = [gate[:2] for gate in self.nands] + \
+            [memory.address for memory in self.memories]
+        outputs = [(gate[2],) for gate in self.nands] + \
+            [memory.out for memory in self.memories]
+        driver = {net: node for node, nets in enumerate(outputs)
+                  for net in nets}
+        dependents = [[] for _ in inputs]
+        pending = [0] * len(inputs)
+        for node, nets in enumerate(inputs):
+            for source in set(driver.get(net) for net in nets):
+                if source is not None:
+                    dependents[source].append(node)
+                    pending[node] += 1
+        level = [0] * len(inputs)
+        order = [node for node in range(len(inputs)) if not pending[node]]
+        for node in order:
+            for dependent in dependents[node]:
+                level[dependent] = max(level[dependent], level[node] + 1)
+                pending[dependent] -= 1
+                if not pending[dependent]:
+                    order.append(dependent)
+        if len(order) != len(inputs):
+            raise HDLError(f"Chip {self.definition.name} has a loop that "
+                           "does not go through a DFF")
+        return order, max(level, default=-1) + 1
+
+    def compile(self) -> typing.Callable[[typing.List[int], int],
+                                         typing.List[int]]:
+        """Translates the levelized netlist into a Python function.
+
+        The function takes the values of all the nets and a mask, and
+        returns the values after evaluating every gate once. Each value is an
+        int whose bits are independent lanes, so one call evaluates as many
+        input vectors as the mask has bits. Memories are read with the value
+        of their address, so they are only meaningful with a mask of 1.
+
+        Returns:
+            typing.Callable[[typing.List[int], int], typing.List[int]]: the
+            evaluation function.
+        """
+        names = [f"n{net}" for net in range(self.size)]
+        lines = ["def evaluate(v, mask):",
+                 f"    {', '.join(names)}, = v"]
+        namespace = {}
+        for node in self.order:
+            if node < len(self.nands):
+                a, b, out = self.nands[node]
+                if FALSE_NET in (a, b):
+                    expression = "mask"
+                elif a == b == TRUE_NET:
+                    expression = "0"
+                elif a == TRUE_NET or a == b:
+                    expression = f"mask ^ n{b}"
+                elif b == TRUE_NET:
+                    expression = f"mask ^ n{a}"
+                else:
+                    expression = f"mask ^ (n{a} & n{b})"
+                lines.append(f"    n{out} = {expression}")
+                continue
+            index = node - len(self.nands)
+            memory = self.memories[index]
+            namespace[f"m{index}"] = memory.words
+            address = " | ".join(
+                f"n{net} << {bit}" for bit, net in enumerate(memory.address))
+            lines.append(f"    word = m{index}[{address or 0}]")
+            for bit, net in enumerate(memory.out):
+                lines.append(f"    n{net} = word >> {bit} & 1")
+        lines.append(f"    return [{', '.join(names)}]")
+        exec(compile("\n".join(lines), f"<netlist {self.definition.name}>",
+                     "exec"), namespace)
+        return namespace["evaluate"]
+
+
+def load_netlist(path: str, builtin_memory: bool = True) -> Netlist:
+    """Flattens the chip of an .hdl file. Its parts are searched for next to
+    it, and then in the directories of the projects.
+
+    Args:
+        path (str): the .hdl file.
+        builtin_memory (bool): see ChipLibrary.
+
+    Returns:
+        Netlist: the flattened chip.
+    """
+    library = ChipLibrary(
+        (os.path.dirname(os.path.abspath(path)),) + LIBRARY_DIRECTORIES,
+        builtin_memory)
+    return Netlist(read_hdl(path), library)
+
+
+def part_error(definition: ChipDefinition, part, message: str) -> HDLError:
+    return HDLError(f"Chip {definition.name}, part {part.chip} (line "
+                    f"{part.line_number}): {message}")
+
+
+def pin_bits(definition: ChipDefinition, part,
+             part_definition: ChipDefinition, pin: str,
+             pin_range: typing.Optional[typing.Tuple[int, int]]) \
+        -> typing.Tuple[int, int]:
+    """Returns the first and last bit of a pin of a part, as connected."""
+    if pin not in part_definition.inputs and \
+            pin not in part_definition.outputs:
+        raise part_error(definition, part, f"no pin named {pin}")
+    width = part_definition.width(pin)
+    first, last = pin_range or (0, width - 1)
+    if last >= width:
+        raise part_error(definition, part, f"sub-bus of {pin} out of range")
+    return first, last
+
+
+def bits_value(nets: typing.List[int], values: typing.List[int]) -> int:
+    """Combines the single-bit values of some nets into an int, the first net
+    being the least significant bit.
+    """
+    value = 0
+    for bit, net in enumerate(nets):
+        value |= values[net] << bit
+    return value
+
+
+class HardwareSimulator:
+    """Simulates a chip built from HDL, one clock phase at a time.
+
+    Combinational logic is evaluated by the compiled netlist. The DFFs and
+    the writable memories sample their inputs at the tick of the clock, and
+    the DFFs show the sampled values on their outputs from the tock, like
+    the hardware simulator of the course.
+    """
+
+    def __init__(self, netlist: Netlist) -> None:
+        """Resets the chip: all the DFFs and memories hold 0.
+
+        Args:
+            netlist (Netlist): the flattened chip.
+        """
+        self.netlist = netlist
+        self.evaluate = netlist.compile()
+        self.values = [0] * netlist.size
+        self.values[TRUE_NET] = 1
+        self.state = [0] * len(netlist.dffs)
+        self.clock = 0
+        self.ticked = False
+        self.dff_inputs = [dff[0] for dff in netlist.dffs]
+        self.dff_outputs = [dff[1] for dff in netlist.dffs]
+        self.registers = {
+            out: index for index, out in enumerate(self.dff_outputs)}
+        self.writable = [memory for memory in netlist.memories
+                         if memory.load is not None]
+        self.parts = {}
+        for instance in netlist.instances:
+            self.parts.setdefault(instance.name, instance)
+
+    @classmethod
+    def load(cls, path: str, builtin_memory: bool = True) \
+            -> "HardwareSimulator":
+        """Builds a simulator for an .hdl file, see load_netlist.
+
+        Args:
+            path (str): the .hdl file.
+            builtin_memory (bool): see ChipLibrary.
+
+        Returns:
+            HardwareSimulator: the simulator.
+        """
+        return cls(load_netlist(path, builtin_memory))
+
+    @property
+    def time(self) -> str:
+        """The clock as shown by the hardware simulator, e.g. 3 or 3+."""
+        return f"{self.clock}{'+' if self.ticked else ''}"
+
+    def eval(self) -> None:
+        """Evaluates the combinational logic of the chip."""
+        self.values = self.evaluate(self.values, 1)
+
+    def tick(self) -> None:
+        """Evaluates the chip and lets the DFFs and memories sample their
+        inputs.
+        """
+        self.eval()
+        values = self.values
+        self.state = [values[net] for net in self.dff_inputs]
+        for memory in self.writable:
+            if values[memory.load]:
+                memory.words[bits_value(memory.address, values)] = \
+                    bits_value(memory.data, values)
+        self.ticked = True
+
+    def tock(self) -> None:
+        """Shows the sampled values on the outputs of the DFFs and evaluates
+        the chip.
+        """
+        values = self.values
+        for net, value in zip(self.dff_outputs, self.state):
+            values[net] = value
+        self.eval()
+        self.clock += 1
+        self.ticked = False
+
+    def load_memory(self, part: str, path: str) -> None:
+        """Loads a program (or any .hack file) into a built-in memory."""
+        memory = self.__part(part).memory
+        if memory is None:
+            raise HDLError(f"{part} is not a built-in memory")
+        words = load_program(path)
+        if len(words) > len(memory.words):
+            raise HDLError(f"{path} does not fit in {part}")
+        memory.words[:] = array.array(
+            'H', words + [0] * (len(memory.words) - len(words)))
+
+    def __part(self, name: str) -> Instance:
+        instance = self.parts.get(name)
+        if instance is None:
+            raise HDLError(f"The chip has no part {name}")
+        return instance
+
+    def __getitem__(self, name: str) -> int:
+        """
+        Args:
+            name (str): a pin of the chip, e.g. out or out[3], a register
+                part, e.g. DRegister[], or a word of a memory part, e.g.
+                RAM16K[5].
+
+        Returns:
+            int: the value, signed if it is 16 bits wide.
+        """
+        name, index = parse_part(name)
+        if name in self.netlist.pins:
+            nets = self.netlist.pins[name]
+            if index is not None:
+                return self.values[nets[index]]
+            value = bits_value(nets, self.values)
+            return wrap(value) if len(nets) == WORD_WIDTH else value
+        instance = self.__part(name)
+        if instance.memory is not None:
+            return wrap(instance.memory.words[index or 0])
+        # Registers show the value they sampled, before it reaches their
+        # outputs.
+        value = 0
+        for bit, net in enumerate(instance.pins["out"]):
+            register = self.registers.get(net)
+            bit_value = self.values[net] if register is None \
+                else self.state[register]
+            value |= bit_value << bit
+        return wrap(value) if len(instance.pins["out"]) == WORD_WIDTH \
+            else value
+
+    def __setitem__(self, name: str, value: int) -> None:
+        """
+        Args:
+            name (str): an input pin of the chip, a register part or a word
+                of a memory part, see __getitem__.
+            value (int): the value to set.
+        """
+        name, index = parse_part(name)
+        if name in self.netlist.definition.inputs:
+            nets = self.netlist.pins[name]
+            if index is not None:
+                nets = nets[index:index + 1]
+            for bit, net in enumerate(nets):
+                self.values[net] = (value >> bit) & 1
+            return
+        if name in self.netlist.pins:
+            raise HDLError(f"Output pin {name} cannot be set")
+        instance = self.__part(name)
+        if instance.memory is not None:
+            instance.memory.words[index or 0] = value & 0xFFFF
+            return
+        for bit, net in enumerate(instance.pins["out"]):
+            register = self.registers.get(net)
+            if register is not None:
+                self.state[register] = self.values[net] = (value >> bit) & 1
+
+
+def parse_part(name: str) -> typing.Tuple[str, typing.Optional[int]]:
+    """Parses a pin or part name, e.g. out, out[3], PC[] or RAM16K[5]."""
+    match = PART_PATTERN.match(name)
+    if match is None:
+        raise HDLError(f"Malformed name {name}")
+    index = match.group(2)
+    return match.group(1), int(index) if index else None
+
+
+if "__main__" == __name__:
+    # Flattens a chip, prints the size of its netlist and measures how many
+    # evaluations of it run per second.
+    arg_parser = argparse.ArgumentParser(prog="HardwareSimulator")
+    arg_parser.add_argument("chip", help=f"an {HDL_EXTENSION} file")
+    arg_parser.add_argument(
+        "--gate-level-memory", action="store_true",
+        help="build RAM8-RAM16K parts from their .hdl files instead of using "
+             "the built-in memories")
+    arg_parser.add_argument(
+        "--evals", type=int, default=1000,
+        help="the number of evaluations to time")
+    args = arg_parser.parse_args()
+    start = time.perf_counter()
+    simulator = HardwareSimulator.load(
+        os.path.abspath(args.chip), not args.gate_level_memory)
+    built = time.perf_counter() - start
+    netlist = simulator.netlist
+    print(f"{netlist.definition.name}: {len(netlist.nands)} Nand gates, "
+          f"{len(netlist.dffs)} DFFs, {len(netlist.memories)} built-in "
+          f"memories, {netlist.size} nets, {netlist.levels} levels, "
+          f"built in {built:.3f}s")
+    start = time.perf_counter()
+    for _ in range(args.evals):
+        simulator.eval()
+    elapsed = time.perf_counter() - start
+    print(f"{args.evals} evaluations in {elapsed:.3f}s "
+          f"({args.evals / max(elapsed, 1e-9):.0f} evaluations/sec)")
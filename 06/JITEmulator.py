@@ -0,0 +1,198 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Code import ALU_COMP, SHIFT_COMP, C_PREFIX, SHIFT_PREFIX
+from CPUEmulator import CPUEmulator, DEFAULT_MAX_CYCLES, ADDRESS_MASK, alu
+
+
+def wrapped(expression: str) -> str:
+    """Wraps the source of an expression into the signed 16-bit range."""
+    return f"((({expression}) + 32768) & 65535) - 32768"
+
+
+# The computations of the ALU as Python expressions of d (the D register)
+# and y (the A register or M).
+COMP_EXPRESSIONS = {
+    "0": "0",
+    "1": "1",
+    "-1": "-1",
+    "D": "d",
+    "A": "y",
+    "!D": "~d",
+    "!A": "~y",
+    "-D": wrapped("-d"),
+    "-A": wrapped("-y"),
+    "D+1": wrapped("d + 1"),
+    "A+1": wrapped("y + 1"),
+    "D-1": wrapped("d - 1"),
+    "A-1": wrapped("y - 1"),
+    "D+A": wrapped("d + y"),
+    "D-A": wrapped("d - y"),
+    "A-D": wrapped("y - d"),
+    "D&A": "d & y",
+    "D|A": "d | y",
+    "A<<": wrapped("y << 1"),
+    "D<<": wrapped("d << 1"),
+    "A>>": "y >> 1",
+    "D>>": "d >> 1",
+}
+ALU_EXPRESSIONS = {}
+for _prefix, _table in ((C_PREFIX, ALU_COMP), (SHIFT_PREFIX, SHIFT_COMP)):
+    for _mnemonic, _bits in _table.items():
+        ALU_EXPRESSIONS[(int(_prefix, 2), int(_bits, 2))] = \
+            COMP_EXPRESSIONS[_mnemonic]
+
+# Blocks longer than this are split, to bound the size of generated code.
+MAX_BLOCK_LENGTH = 256
+# Which sign of the ALU output makes each jump taken.
+JUMP_CONDITIONS = {
+    1: "out > 0", 2: "out == 0", 3: "out >= 0", 4: "out < 0",
+    5: "out != 0", 6: "out <= 0", 7: "True"}
+
+
+class JITEmulator(CPUEmulator):
+    """A CPUEmulator that translates the basic blocks of the program into
+    Python functions and runs those instead of single instructions.
+
+    A block starts at a leader: address 0, the target of a jump whose
+    address is loaded by the A-command just before it, or the instruction
+    following a jump. It ends with a jump or just before the next leader.
+    Each block is compiled the first time it is entered and cached by its
+    start address. Addresses that are only reached by computed jumps (e.g.
+    A=M, 0;JMP) are not leaders, and are interpreted one instruction at a
+    time until execution reaches a leader again.
+    """
+
+    def __init__(self, rom: typing.Sequence[int]) -> None:
+        """Loads a program into the ROM, finds its leaders and resets the
+        computer.
+
+        Args:
+            rom (typing.Sequence[int]): the machine words of the program.
+        """
+        super().__init__(rom)
+        self.leaders = self.__find_leaders()
+        self.blocks = {}
+
+    def __find_leaders(self) -> typing.FrozenSet[int]:
+        leaders = {0}
+        for address, word in enumerate(self.rom):
+            if word >= 0x8000 and word & 0b111:
+                leaders.add(address + 1)
+                if address > 0 and self.rom[address - 1] < 0x8000:
+                    leaders.add(self.rom[address - 1])
+        return frozenset(
+            leader for leader in leaders if leader < len(self.rom))
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES) -> int:
+        """Runs the program like CPUEmulator.run, block by block.
+
+        Args:
+            max_cycles (int): the maximal number of instructions to execute.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        blocks, leaders, halts = self.blocks, self.leaders, self.halts
+        ram = self.ram
+        size = len(self.rom)
+        executed = compiled = 0
+        self.halted = False
+        while executed < max_cycles and self.pc < size:
+            pc = self.pc
+            entry = blocks.get(pc)
+            if entry is None and pc in leaders:
+                entry = blocks[pc] = self.__compile_block(pc)
+            if entry is None or entry[1] > max_cycles - executed:
+                # Not a leader, or not enough cycles left for the block.
+                executed += super().run(1)
+                if self.halted:
+                    break
+                continue
+            block, length = entry
+            self.pc, self.a, self.d, jumped = block(ram, self.a, self.d)
+            executed += length
+            compiled += length
+            if jumped and self.pc in halts:
+                # Like CPUEmulator.run, only a jump into the halt loop halts,
+                # so falling through into it runs the loop once.
+                self.halted = True
+                break
+        self.cycles += compiled
+        return executed
+
+    def __compile_block(self, start: int) -> typing.Tuple[
+            typing.Callable, int]:
+        """Translates the block starting at the given address into a Python
+        function of (ram, a, d) returning the next (pc, a, d) and whether the
+        block ended with a taken jump.
+
+        Returns:
+            typing.Tuple[typing.Callable, int]: the function, and the number
+            of instructions in the block.
+        """
+        lines = ["def block(ram, a, d):"]
+        namespace = {}
+        known_a = None
+        address = start
+        while True:
+            word = self.rom[address]
+            lines.append(f"    # {address}: {word:016b}")
+            next_address = address + 1
+            if word < 0x8000:
+                lines.append(f"    a = {word}")
+                known_a = word
+            else:
+                known_a = self.__emit_c_command(
+                    word, known_a, lines, namespace)
+                if word & 0b111:
+                    address = next_address
+                    break
+            address = next_address
+            if address >= len(self.rom) or address in self.leaders or \
+                    address - start >= MAX_BLOCK_LENGTH:
+                break
+        lines.append(f"    return {address}, a, d, False")
+        exec(compile("\n".join(lines), f"<block {start}>", "exec"), namespace)
+        return namespace["block"], address - start
+
+    def __emit_c_command(
+            self, word: int, known_a: typing.Optional[int],
+            lines: typing.List[str], namespace: dict) -> typing.Optional[int]:
+        """Appends the source of a C-command to lines, and returns the value
+        of A after it, if it is known at compile time.
+        """
+        m_address = str(known_a & ADDRESS_MASK) if known_a is not None \
+            else "a & 32767"
+        prefix, comp = word >> 13, (word >> 6) & 0b111111
+        y = f"ram[{m_address}]" if word & 0x1000 else "a"
+        expression = ALU_EXPRESSIONS.get((prefix, comp))
+        if expression is None:
+            name = f"alu_{prefix}_{comp}"
+            namespace[name] = alu(prefix, comp)
+            expression = f"{name}(d, y)"
+        lines.append(f"    out = {expression.replace('y', y)}")
+        if word & 0b1000:
+            lines.append(f"    ram[{m_address}] = out")
+        if word & 0b10000:
+            lines.append("    d = out")
+        jump = word & 0b111
+        if jump:
+            target = str(known_a & ADDRESS_MASK) if known_a is not None \
+                else "a & 32767"
+            if word & 0b100000:
+                lines.append(f"    target = {target}")
+                target = "target"
+                lines.append("    a = out")
+            lines.append(f"    if {JUMP_CONDITIONS[jump]}:")
+            lines.append(f"        return {target}, a, d, True")
+            return None
+        if word & 0b100000:
+            lines.append("    a = out")
+            return None
+        return known_a
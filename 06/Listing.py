@@ -0,0 +1,56 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+LISTING_EXTENSION = ".lst"
+SYMBOLS_EXTENSION = ".sym"
+LABEL = "ROM"
+VARIABLE = "RAM"
+
+
+class Listing:
+    """Collects what the assembler learns about a program while assembling
+    it, and writes it out as a listing and a symbol map. These map ROM
+    addresses, e.g. hot spots found by profiling in an emulator, back to the
+    assembly source.
+    """
+
+    def __init__(self) -> None:
+        """Creates an empty listing, to be filled in by the assembler."""
+        self.sources = []
+        self.labels = {}
+        self.variables = {}
+
+    def write_listing(self, words: typing.Sequence[int],
+                      output_file: typing.TextIO) -> None:
+        """Writes one line per ROM address: the address, the machine word in
+        binary and the source line it was assembled from.
+
+        Args:
+            words (typing.Sequence[int]): the assembled machine words.
+            output_file (typing.TextIO): the .lst file.
+        """
+        output_file.write("".join([
+            f"{address:5d}  {word:016b}  {source}\n"
+            for address, (word, source) in enumerate(zip(words, self.sources))
+        ]))
+
+    def write_symbols(self, output_file: typing.TextIO) -> None:
+        """Writes one line per label and variable of the program: "ROM" for
+        labels or "RAM" for variables, the address and the symbol, sorted by
+        address.
+
+        Args:
+            output_file (typing.TextIO): the .sym file.
+        """
+        lines = []
+        for kind, symbols in ((LABEL, self.labels),
+                              (VARIABLE, self.variables)):
+            for symbol, address in sorted(
+                    symbols.items(), key=lambda item: (item[1], item[0])):
+                lines.append(f"{kind} {address:5d} {symbol}\n")
+        output_file.write("".join(lines))
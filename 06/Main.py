@@ -4,124 +4,252 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import concurrent.futures
+import contextlib
+import io
 import os
 import sys
+import time
 import typing
 
 from SymbolTable import SymbolTable
-from Parser import Parser, L_COMMAND, A_COMMAND, C_COMMAND
+from Parser import parse, A_COMMAND, L_COMMAND
 from Code import Code
+from HackBinary import write_words, BYTE_ORDERS, BINARY_EXTENSIONS, \
+    LITTLE_ENDIAN, BIG_ENDIAN
+from AssemblyCache import AssemblyCache, DEFAULT_MAX_BYTES
+from Listing import Listing, LISTING_EXTENSION, SYMBOLS_EXTENSION
+from Optimizer import PeepholeOptimizer
+
+# Part of the cache key of every output, change it whenever a change to the
+# assembler changes its output.
+ASSEMBLER_VERSION = "2"
+
+FIRST_VARIABLE_ADDRESS = 16
+TEXT_FORMAT = "text"
+OUTPUT_FORMATS = (TEXT_FORMAT,) + BYTE_ORDERS
 
 
 def assemble_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
-    """Assembles a single file.
+        input_file: typing.TextIO, output_file: typing.IO,
+        output_format: str = TEXT_FORMAT,
+        listing_file: typing.Optional[typing.TextIO] = None,
+        symbols_file: typing.Optional[typing.TextIO] = None,
+        optimizer: typing.Optional[PeepholeOptimizer] = None) -> int:
+    """Assembles a single file in one pass with assemble(), which backpatches
+    the labels that are used before they are defined, and writes the machine
+    words in the requested format.
 
     Args:
         input_file (typing.TextIO): the file to assemble.
-        output_file (typing.TextIO): writes all output to this file.
+        output_file (typing.IO): writes all output to this file. Must be
+            opened in binary mode unless output_format is "text".
+        output_format (str): "text" writes a .hack file with one binary
+            string per line, "little" and "big" write a ROM image of packed
+            16-bit words in that byte order.
+        listing_file (typing.Optional[typing.TextIO]): if given, a listing
+            of the ROM address, binary and source line of every instruction
+            is written to this file.
+        symbols_file (typing.Optional[typing.TextIO]): if given, the address
+            of every label and variable is written to this file.
+        optimizer (typing.Optional[PeepholeOptimizer]): if given, redundant
+            instructions are removed by it before encoding.
+
+    Returns:
+        int: the number of instructions assembled.
     """
+    listing = None
+    if listing_file is not None or symbols_file is not None:
+        listing = Listing()
+    words = assemble(input_file, listing, optimizer)
+    if output_format == TEXT_FORMAT:
+        output_file.write("".join([int2bin(word) + "\n" for word in words]))
+    else:
+        write_words(words, output_file, output_format)
+    if listing_file is not None:
+        listing.write_listing(words, listing_file)
+    if symbols_file is not None:
+        listing.write_symbols(symbols_file)
+    return len(words)
+
+
+def assemble_path(
+        input_path: str, output_format: str = TEXT_FORMAT,
+        cache: typing.Optional[AssemblyCache] = None,
+        listing: bool = False,
+        optimize: bool = False) -> typing.Tuple[int, int]:
+    """Assembles the file at input_path into a file next to it, named after
+    it with the extension of the given output format: .hack for text, .bin
+    for little-endian and .binbe for big-endian ROM images.
+
+    Args:
+        input_path (str): path of the .asm file to assemble.
+        output_format (str): see assemble_file.
+        cache (typing.Optional[AssemblyCache]): if given, a file whose
+            contents were already assembled by this version of the assembler
+            is not assembled again, and the cached output is written instead.
+        listing (bool): if True, a .lst listing and a .sym symbol map are
+            written next to the output as well. The cache is not used then.
+        optimize (bool): if True, the program is passed through the peephole
+            optimizer. The cache is not used then.
+
+    Returns:
+        typing.Tuple[int, int]: the number of instructions assembled, and the
+        number of instructions removed by the optimizer.
     """
-    You should use the two-pass implementation suggested in the book:
-    
-    *Initialization*
-    Initialize the symbol table with all the predefined symbols and their
-    pre-allocated RAM addresses, according to section 6.2.3 of the book.
-    
-    *First Pass*
-    Go through the entire assembly program, line by line, and build the symbol
-    table without generating any code. As you march through the program lines,
-    keep a running number recording the ROM address into which the current
-    command will be eventually loaded.
-    This number starts at 0 and is incremented by 1 whenever a C-instruction
-    or an A-instruction is encountered, but does not change when a label
-    pseudo-command or a comment is encountered. Each time a pseudo-command
-    (Xxx) is encountered, add a new entry to the symbol table, associating
-    Xxx with the ROM address that will eventually store the next command in
-    the program.
-    This pass results in entering all the program’s labels along with their
-    ROM addresses into the symbol table.
-    The program’s variables are handled in the second pass.
-    
-    *Second Pass*
-    Now go again through the entire program, and parse each line.
-    Each time a symbolic A-instruction is encountered, namely, @Xxx where Xxx
-    is a symbol and not a number, look up Xxx in the symbol table.
-    If the symbol is found in the table, replace it with its numeric meaning
-    and complete the command’s translation.
-    If the symbol is not found in the table, then it must represent a new
-    variable. To handle it, add the pair (Xxx,n) to the symbol table, where n
-    is the next available RAM address, and complete the command’s translation.
-    The allocated RAM addresses are consecutive numbers, starting at address
-    16 (just after the addresses allocated to the predefined symbols).
-    After the command is translated, write the translation to the output file.
-    
-    Tools:
-    Two useful tools are the supplied Assembler and the supplied CPU
-    Emulator, both available in your tools directory. These tools allow
-    experimenting with a working assembler before setting out to build one
-    yourself. In addition, the supplied assembler provides a visual
-    line-level translation GUI, and allows code comparisons with the outputs
-    that your assembler will generate. For more information, see the tutorial
-    in the lectures and in the submission page.
-    
-    Testing:
-    The supplied ("built-in") Hack Assembler is guaranteed to generate
-    correct binary code. This guaranteed performance can be used to test if
-    another assembler, say the one written by you, also generates correct code.
-    Let Prog.asm be some program written in the symbolic Hack assembly
-    language. Suppose we translate this program using the supplied assembler,
-    producing a binary file called Prog.hack. Next, we use another assembler
-    (e.g. the one that you wrote) to translate the same program into another
-    file, say MyProg.hack. Now, if the latter assembler is working correctly,
-    it follows that Prog.hack == MyProg.hack. Thus, one way to test a newly
-    written assembler is as follows: (i) load into the supplied visual
-    assembler Prog.asm as a source program and MyProg.hack as a compare file,
-    (ii) translate the source program, and (iii) compare the resulting binary
-    code with the compare file (see the figure above). If the comparison
-    fails, the assembler that generated MyProg.hack must be buggy; otherwise,
-    it may be OK.
+    binary = output_format != TEXT_FORMAT
+    filename = os.path.splitext(input_path)[0]
+    output_path = filename + (
+        BINARY_EXTENSIONS[output_format] if binary else ".hack")
+    if cache is None or listing or optimize:
+        optimizer = PeepholeOptimizer() if optimize else None
+        with contextlib.ExitStack() as stack:
+            input_file = stack.enter_context(open(input_path, 'r'))
+            output_file = stack.enter_context(
+                open(output_path, 'wb' if binary else 'w'))
+            listing_file = symbols_file = None
+            if listing:
+                listing_file = stack.enter_context(
+                    open(filename + LISTING_EXTENSION, 'w'))
+                symbols_file = stack.enter_context(
+                    open(filename + SYMBOLS_EXTENSION, 'w'))
+            instructions = assemble_file(
+                input_file, output_file, output_format, listing_file,
+                symbols_file, optimizer)
+        return instructions, optimizer.total_saved if optimize else 0
+
+    with open(input_path, 'rb') as input_file:
+        source = input_file.read()
+    key = AssemblyCache.key(source, ASSEMBLER_VERSION, output_format)
+    output = cache.get(key)
+    if output is None:
+        output_file = io.BytesIO() if binary else io.StringIO()
+        assemble_file(
+            io.StringIO(source.decode()), output_file, output_format)
+        output = output_file.getvalue()
+        if not binary:
+            output = output.encode()
+        cache.put(key, output)
+    with open(output_path, 'wb') as output_file:
+        output_file.write(output)
+    return len(output) // 2 if binary else output.count(b"\n"), 0
+
+
+def assemble_paths(
+        input_paths: typing.List[str], output_format: str = TEXT_FORMAT,
+        jobs: int = 1, cache: typing.Optional[AssemblyCache] = None,
+        listing: bool = False, optimize: bool = False) \
+        -> typing.List[typing.Tuple[str, int, int, str]]:
+    """Assembles several files, each one in isolation from the others.
+
+    With more than one job the files are spread across a pool of processes.
+    Either way, a file that fails to assemble does not stop the others, and
+    the results are returned in the order of input_paths.
+
+    Args:
+        input_paths (typing.List[str]): paths of the .asm files to assemble.
+        output_format (str): see assemble_file.
+        jobs (int): the number of worker processes to use.
+        cache (typing.Optional[AssemblyCache]): see assemble_path.
+        listing (bool): see assemble_path.
+        optimize (bool): see assemble_path.
+
+    Returns:
+        typing.List[typing.Tuple[str, int, int, str]]: for every input path,
+        the path, the number of instructions assembled, the number of
+        instructions removed by the optimizer and an error message, which is
+        empty if the file was assembled successfully.
     """
-    sym_table = SymbolTable()
+    results = []
+    if jobs == 1:
+        for input_path in input_paths:
+            try:
+                results.append((input_path, *assemble_path(
+                    input_path, output_format, cache, listing, optimize), ""))
+            except Exception as error:
+                results.append((input_path, 0, 0, describe_error(error)))
+        return results
 
-    # First pass
-    p = Parser(input_file)
-    command_num = 0
-    while True:
-        if p.command_type() == L_COMMAND:
-            sym_table.add_entry(p.symbol(), command_num)
-        else:
-            command_num += 1
-        if not p.has_more_commands(): break
-        p.advance()
-        
-    # Second pass
-    input_file.seek(0, 0)
-    p = Parser(input_file)
-    next_available_memory = 16
-    while True:
-        command_type = p.command_type()
-        if command_type == A_COMMAND:
-            sym = p.symbol()
-            addr = 0
-            if not sym.isdigit():
-                if not sym_table.contains(sym):
-                    sym_table.add_entry(sym, next_available_memory)
-                    next_available_memory += 1
-                addr = sym_table.get_address(sym)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(assemble_path, input_path, output_format, cache,
+                            listing, optimize)
+            for input_path in input_paths]
+        for input_path, future in zip(input_paths, futures):
+            try:
+                results.append((input_path, *future.result(), ""))
+            except Exception as error:
+                results.append((input_path, 0, 0, describe_error(error)))
+    return results
+
+
+def describe_error(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def assemble(input_file: typing.TextIO,
+             listing: typing.Optional[Listing] = None,
+             optimizer: typing.Optional[PeepholeOptimizer] = None) \
+        -> typing.List[int]:
+    """Translates the whole input into Hack machine words in a single pass.
+
+    The input is read once, line by line. Labels are entered into the
+    symbol table as they are met, A-commands whose symbol is not known yet
+    are emitted as placeholders and backpatched once the whole program has
+    been seen. Symbols that are still undefined at that point are variables,
+    and are allocated consecutive RAM addresses in order of first appearance,
+    exactly as the two-pass algorithm would.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        listing (typing.Optional[Listing]): if given, the source line of
+            every instruction and the address of every symbol are recorded
+            in it along the way.
+        optimizer (typing.Optional[PeepholeOptimizer]): if given, the whole
+            program is parsed first and passed through it before encoding.
+
+    Returns:
+        typing.List[int]: the machine words, one per ROM address.
+    """
+    sym_table = SymbolTable()
+    words = []
+    fixups = []
+    sources = listing.sources if listing is not None else None
+    instructions = parse(input_file)
+    if optimizer is not None:
+        instructions = optimizer.optimize(instructions)
+    for instruction in instructions:
+        kind = instruction.kind
+        if kind == A_COMMAND:
+            sym = instruction.symbol
+            if sym.isdigit():
+                words.append(int(sym))
+            elif sym_table.contains(sym):
+                words.append(sym_table.get_address(sym))
             else:
-                addr = int(sym)
-            output_file.write(int2bin(addr) + "\n")
-            
-        elif command_type == C_COMMAND:
-            dest = Code.dest(p.dest())
-            comp = Code.comp(p.comp())
-            jump = Code.jump(p.jump())
-            prefix = "111"
-            if ">>" in p.comp() or "<<" in p.comp(): prefix = "101"
-            output_file.write(prefix + comp + dest + jump + "\n")
-        if not p.has_more_commands(): break
-        p.advance()
+                fixups.append((len(words), sym))
+                words.append(0)
+        elif kind == L_COMMAND:
+            sym_table.add_entry(instruction.symbol, len(words))
+            if listing is not None:
+                listing.labels[instruction.symbol] = len(words)
+            continue
+        else:
+            words.append(Code.c_command(
+                instruction.dest, instruction.comp, instruction.jump))
+        if sources is not None:
+            sources.append(instruction.source)
+
+    next_available_memory = FIRST_VARIABLE_ADDRESS
+    for address, sym in fixups:
+        if not sym_table.contains(sym):
+            sym_table.add_entry(sym, next_available_memory)
+            if listing is not None:
+                listing.variables[sym] = next_available_memory
+            next_available_memory += 1
+        words[address] = sym_table.get_address(sym)
+    return words
 
 
 def int2bin(num):
@@ -134,20 +262,67 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(prog="Assembler")
+    arg_parser.add_argument("input_path")
+    arg_parser.add_argument(
+        "--format", choices=OUTPUT_FORMATS, default=TEXT_FORMAT,
+        help="write text .hack files, or packed 16-bit words to "
+             f"{BINARY_EXTENSIONS[LITTLE_ENDIAN]} (little-endian) or "
+             f"{BINARY_EXTENSIONS[BIG_ENDIAN]} (big-endian) files")
+    arg_parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="assemble the files of a directory in N worker processes and "
+             "report the aggregate throughput")
+    arg_parser.add_argument(
+        "--cache", metavar="DIR",
+        help="reuse the output of sources that were already assembled, "
+             "keeping outputs in the given directory")
+    arg_parser.add_argument(
+        "--cache-size", type=int, metavar="BYTES", default=DEFAULT_MAX_BYTES,
+        help="evict least recently used outputs beyond this total size")
+    arg_parser.add_argument(
+        "--listing", action="store_true",
+        help=f"also write a {LISTING_EXTENSION} listing and a "
+             f"{SYMBOLS_EXTENSION} symbol map next to every output")
+    arg_parser.add_argument(
+        "--optimize", action="store_true",
+        help="remove redundant instructions before encoding, and report "
+             "how many were removed. Programs that jump to literal ROM "
+             "addresses are refused")
+    args = arg_parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        arg_parser.error("--jobs must be at least 1")
+    argument_path = os.path.abspath(args.input_path)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
             for filename in os.listdir(argument_path)]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+    files_to_assemble = sorted(
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == ".asm")
+    start = time.perf_counter()
+    cache = None
+    if args.cache is not None:
+        cache = AssemblyCache(os.path.abspath(args.cache), args.cache_size)
+    results = assemble_paths(
+        files_to_assemble, args.format, args.jobs or 1, cache, args.listing,
+        args.optimize)
+    elapsed = time.perf_counter() - start
+    failures = [(path, error) for path, _, _, error in results if error]
+    for path, error in failures:
+        print(f"{path}: {error}", file=sys.stderr)
+    if args.optimize:
+        for path, count, saved, error in results:
+            if not error:
+                print(f"{path}: {count} instructions, {saved} saved "
+                      f"({saved / max(count + saved, 1):.1%})")
+    if args.jobs is not None:
+        instructions = sum(count for _, count, _, _ in results)
+        print(f"Assembled {len(results) - len(failures)}/{len(results)} "
+              f"files, {instructions} instructions in {elapsed:.3f}s "
+              f"({instructions / max(elapsed, 1e-9):.0f} instructions/sec) "
+              f"using {args.jobs} jobs")
+    if failures:
+        sys.exit(1)
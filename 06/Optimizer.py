@@ -0,0 +1,189 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Parser import Instruction, A_COMMAND, L_COMMAND
+
+REDUNDANT_A_LOAD = "redundant @X reload"
+REDUNDANT_DEREF = "redundant @X, A=M reload"
+OVERWRITTEN_A_LOAD = "@X overwritten by the next @Y"
+DEAD_D_WRITE = "dead D= write"
+RULES = (REDUNDANT_A_LOAD, REDUNDANT_DEREF, OVERWRITTEN_A_LOAD, DEAD_D_WRITE)
+
+# What is known about the A register: it holds the address X, it holds the
+# value RAM[X] had when it was loaded, or (None) nothing is known.
+CONST = "CONST"
+DEREF = "DEREF"
+
+
+class PeepholeOptimizer:
+    """Removes redundant instructions from parsed Hack assembly, typically
+    the output of the VM translator, before it is encoded.
+
+    Every label is treated as a point where control may come from anywhere,
+    so nothing known about the registers is carried across one. Programs
+    that jump to literal ROM addresses (e.g. @5, 0;JMP) instead of labels
+    are refused, since removing instructions moves the code.
+    """
+
+    def __init__(self) -> None:
+        """Creates an optimizer with an empty report."""
+        self.saved = dict.fromkeys(RULES, 0)
+
+    @property
+    def total_saved(self) -> int:
+        """
+        Returns:
+            int: the number of instructions removed by all optimize() calls.
+        """
+        return sum(self.saved.values())
+
+    def optimize(self, instructions: typing.Iterable[Instruction]) \
+            -> typing.List[Instruction]:
+        """Applies all the rules until none of them removes an instruction.
+
+        Args:
+            instructions (typing.Iterable[Instruction]): a parsed program.
+
+        Returns:
+            typing.List[Instruction]: the program without the removed
+            instructions. The counts of removed instructions are added to
+            self.saved, by rule.
+
+        Raises:
+            ValueError: if the program jumps to a literal ROM address.
+        """
+        instructions = list(instructions)
+        literal = find_literal_jump(instructions)
+        if literal is not None:
+            raise ValueError(
+                f"Cannot optimize a program that jumps to the literal ROM "
+                f"address @{literal.symbol} (line {literal.line_number})")
+        while True:
+            before = len(instructions)
+            instructions = self.__remove_redundant_loads(instructions)
+            instructions = self.__remove_overwritten_loads(instructions)
+            instructions = self.__remove_dead_d_writes(instructions)
+            if len(instructions) == before:
+                return instructions
+
+    def __remove_redundant_loads(
+            self, instructions: typing.List[Instruction]) \
+            -> typing.List[Instruction]:
+        """Drops @X when A already holds X, and @X, A=M when A already holds
+        RAM[X] and RAM was not written since.
+        """
+        result = []
+        state = None
+        i = 0
+        while i < len(instructions):
+            instruction = instructions[i]
+            kind = instruction.kind
+            if kind == L_COMMAND:
+                state = None
+            elif kind == A_COMMAND:
+                if state == (CONST, instruction.symbol):
+                    self.saved[REDUNDANT_A_LOAD] += 1
+                    i += 1
+                    continue
+                if state == (DEREF, instruction.symbol) and \
+                        i + 1 < len(instructions) and \
+                        is_deref(instructions[i + 1]):
+                    self.saved[REDUNDANT_DEREF] += 2
+                    i += 2
+                    continue
+                state = (CONST, instruction.symbol)
+            else:
+                if "A" in instruction.dest:
+                    if is_deref(instruction) and state is not None and \
+                            state[0] == CONST:
+                        state = (DEREF, state[1])
+                    else:
+                        state = None
+                elif "M" in instruction.dest and state is not None and \
+                        state[0] == DEREF:
+                    state = None
+            result.append(instruction)
+            i += 1
+        return result
+
+    def __remove_overwritten_loads(
+            self, instructions: typing.List[Instruction]) \
+            -> typing.List[Instruction]:
+        """Drops @X when it is immediately followed by @Y."""
+        result = []
+        for i, instruction in enumerate(instructions):
+            if instruction.kind == A_COMMAND and i + 1 < len(instructions) \
+                    and instructions[i + 1].kind == A_COMMAND:
+                self.saved[OVERWRITTEN_A_LOAD] += 1
+                continue
+            result.append(instruction)
+        return result
+
+    def __remove_dead_d_writes(
+            self, instructions: typing.List[Instruction]) \
+            -> typing.List[Instruction]:
+        """Drops D=comp when D is written again before being read, within the
+        same straight-line block.
+        """
+        result = []
+        for i, instruction in enumerate(instructions):
+            if instruction.kind not in (A_COMMAND, L_COMMAND) and \
+                    instruction.dest == "D" and not instruction.jump and \
+                    is_d_overwritten(instructions, i + 1):
+                self.saved[DEAD_D_WRITE] += 1
+                continue
+            result.append(instruction)
+        return result
+
+
+def find_literal_jump(instructions: typing.List[Instruction]) \
+        -> typing.Optional[Instruction]:
+    """Finds a numeric A-command (e.g. @5) that a later jump uses as its
+    target, before anything else is written to A.
+
+    Returns:
+        typing.Optional[Instruction]: the first such A-command, or None if
+        every jump of the program goes to a symbol.
+    """
+    target = None
+    for instruction in instructions:
+        if instruction.kind == L_COMMAND:
+            continue
+        if instruction.kind == A_COMMAND:
+            target = instruction if instruction.symbol.isdigit() else None
+            continue
+        if instruction.jump and target is not None:
+            return target
+        if "A" in instruction.dest:
+            target = None
+    return None
+
+
+def is_deref(instruction: Instruction) -> bool:
+    """Is the instruction exactly A=M?"""
+    return instruction.kind not in (A_COMMAND, L_COMMAND) and \
+        instruction.dest == "A" and instruction.comp == "M" and \
+        not instruction.jump
+
+
+def is_d_overwritten(instructions: typing.List[Instruction],
+                     start: int) -> bool:
+    """Is D written before it is read, starting at the given instruction?
+    Labels, jumps and the end of the program count as reads.
+    """
+    for index in range(start, len(instructions)):
+        instruction = instructions[index]
+        if instruction.kind == L_COMMAND:
+            return False
+        if instruction.kind == A_COMMAND:
+            continue
+        if "D" in instruction.comp or instruction.jump:
+            return False
+        if "D" in instruction.dest:
+            return True
+    return False
@@ -16,6 +16,72 @@ L_PREFIX = '('
 L_SUFFIX = ')'
 DEST_INDICATOR = '='
 JUMP_INDICATOR = ';'
+WHITESPACE = re.compile(r"\s+")
+STRIP_WHITESPACE = str.maketrans('', '', ' \t\n\r\x0b\x0c')
+
+
+class Instruction:
+    """A single parsed assembly command, as yielded by parse().
+
+    Attributes:
+        kind (str): "A_COMMAND", "C_COMMAND" or "L_COMMAND".
+        symbol (str): the symbol or decimal Xxx of @Xxx or (Xxx), empty for
+            C-commands.
+        dest (str): the dest mnemonic of a C-command, empty otherwise.
+        comp (str): the comp mnemonic of a C-command, empty otherwise.
+        jump (str): the jump mnemonic of a C-command, empty otherwise.
+        line_number (int): the 1-based line of the command in the input.
+        source (str): the input line the command was parsed from.
+    """
+
+    __slots__ = (
+        "kind", "symbol", "dest", "comp", "jump", "line_number", "source")
+
+    def __init__(self, kind: str, symbol: str, dest: str, comp: str,
+                 jump: str, line_number: int, source: str) -> None:
+        self.kind = kind
+        self.symbol = symbol
+        self.dest = dest
+        self.comp = comp
+        self.jump = jump
+        self.line_number = line_number
+        self.source = source
+
+    def __repr__(self) -> str:
+        return (f"Instruction({self.kind}, symbol={self.symbol!r}, "
+                f"dest={self.dest!r}, comp={self.comp!r}, "
+                f"jump={self.jump!r}, line_number={self.line_number})")
+
+
+def parse(input_file: typing.Iterable[str]) -> typing.Iterator[Instruction]:
+    """Lazily parses assembly code, one line at a time, so that consumers can
+    be chained over inputs of any size in constant memory. White space and
+    comments are removed, and empty lines are skipped.
+
+    Args:
+        input_file (typing.Iterable[str]): input file, or any other iterable
+            of lines.
+
+    Yields:
+        Instruction: the commands of the input, in order.
+    """
+    for line_number, line in enumerate(input_file, 1):
+        command = line.split(COMMENT, 1)[0].translate(STRIP_WHITESPACE)
+        if not command:
+            continue
+        source = line.rstrip("\r\n")
+        first = command[0]
+        if first == A_PREFIX:
+            yield Instruction(
+                A_COMMAND, command[1:], '', '', '', line_number, source)
+        elif first == L_PREFIX:
+            yield Instruction(
+                L_COMMAND, command[1:-1], '', '', '', line_number, source)
+        else:
+            dest, _, comp = command.rpartition(DEST_INDICATOR)
+            comp, _, jump = comp.partition(JUMP_INDICATOR)
+            yield Instruction(
+                C_COMMAND, '', dest, comp, jump, line_number, source)
 
 
 class Parser:
@@ -37,10 +103,9 @@ class Parser:
 
     def __find_next_command(self) -> str:
         next_line = self.__input_file.readline()
-        whitespace = re.compile(r"\s+")
         while next_line != '':
             line_without_comments = next_line.split(COMMENT)[0]
-            command = whitespace.sub("", line_without_comments)
+            command = WHITESPACE.sub("", line_without_comments)
             if command != '':
                 return command
             next_line = self.__input_file.readline()
@@ -4,8 +4,10 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import types
+import typing
 
-PREDEFINED_SYMBOLS = {
+PREDEFINED_SYMBOLS = types.MappingProxyType({
     "R0": 0,
     "R1": 1,
     "R2": 2,
@@ -29,20 +31,33 @@ PREDEFINED_SYMBOLS = {
     "ARG": 2,
     "THIS": 3,
     "THAT": 4
-}
+})
 
 class SymbolTable:
     """
     A symbol table that keeps a correspondence between symbolic labels and 
     numeric addresses.
+
+    The table is layered: an immutable base mapping, shared between tables,
+    and a per-table overlay that receives every added entry. Creating a table
+    therefore costs nothing regardless of the size of the base, and entries
+    added while assembling one file never leak into another.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+            self,
+            base: typing.Mapping[str, int] = PREDEFINED_SYMBOLS) -> None:
         """Creates a new symbol table initialized with all the predefined symbols
         and their pre-allocated RAM addresses, according to section 6.2.3 of the
         book.
+
+        Args:
+            base (typing.Mapping[str, int]): the symbols the table starts
+                with, which are never modified. Defaults to the predefined
+                symbols; a snapshot() of another table may be given instead.
         """
-        self.symbols = PREDEFINED_SYMBOLS
+        self.__base = base
+        self.__entries = {}
 
     def add_entry(self, symbol: str, address: int) -> None:
         """Adds the pair (symbol, address) to the table.
@@ -51,7 +66,7 @@ class SymbolTable:
             symbol (str): the symbol to add.
             address (int): the address corresponding to the symbol.
         """
-        self.symbols[symbol] = address
+        self.__entries[symbol] = address
 
     def contains(self, symbol: str) -> bool:
         """Does the symbol table contain the given symbol?
@@ -62,7 +77,7 @@ class SymbolTable:
         Returns:
             bool: True if the symbol is contained, False otherwise.
         """
-        return symbol in self.symbols
+        return symbol in self.__entries or symbol in self.__base
 
     def get_address(self, symbol: str) -> int:
         """Returns the address associated with the symbol.
@@ -73,4 +88,24 @@ class SymbolTable:
         Returns:
             int: the address associated with the symbol.
         """
-        return self.symbols[symbol]
+        address = self.__entries.get(symbol)
+        if address is None:
+            return self.__base[symbol]
+        return address
+
+    def entries(self) -> typing.Mapping[str, int]:
+        """
+        Returns:
+            typing.Mapping[str, int]: a read-only view of the entries added to
+            this table, without the ones it was created with.
+        """
+        return types.MappingProxyType(self.__entries)
+
+    def snapshot(self) -> typing.Mapping[str, int]:
+        """Freezes the current contents of the table, so that they can be
+        shared as the base of other tables, e.g. of every file in a batch.
+
+        Returns:
+            typing.Mapping[str, int]: an immutable copy of all the symbols.
+        """
+        return types.MappingProxyType({**self.__base, **self.__entries})
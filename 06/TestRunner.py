@@ -0,0 +1,459 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import concurrent.futures
+import os
+import re
+import sys
+import time
+import typing
+
+from CPUEmulator import CPUEmulator, load_program, wrap
+from HardwareSimulator import HardwareSimulator
+from HDLParser import HDL_EXTENSION
+from Main import describe_error
+
+SCRIPT_EXTENSION = ".tst"
+PROGRAM_EXTENSIONS = (".asm", ".hack")
+LOADABLE_EXTENSIONS = PROGRAM_EXTENSIONS + (HDL_EXTENSION,)
+CLOCK_COMMANDS = ("ticktock", "tick", "tock")
+COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+TOKEN = re.compile(r'"[^"]*"|[{},;!]|[^\s{},;!"]+')
+TERMINATORS = (",", ";", "!")
+COLUMN_PATTERN = re.compile(r"^([^%]+)(?:%([BDXS])(\d+)\.(\d+)\.(\d+))?$")
+DEFAULT_COLUMN_FORMAT = ("D", 1, 6, 1)
+VALUE_PATTERN = re.compile(r"^(?:%([BDX]))?(-?[0-9A-Fa-f]+)$")
+VALUE_BASES = {"B": 2, "D": 10, "X": 16}
+WILDCARD = "*"
+
+
+class ScriptError(Exception):
+    """A test script is malformed or uses an unsupported command."""
+
+
+class ComparisonError(Exception):
+    """An output line of a test script differs from its .cmp file."""
+
+
+def tokenize(text: str) -> typing.List[str]:
+    """Splits the text of a test script into words, quoted strings, braces
+    and command terminators, dropping the comments.
+    """
+    return TOKEN.findall(COMMENT.sub(" ", text))
+
+
+def parse_script(tokens: typing.List[str], start: int = 0,
+                 nested: bool = False) -> typing.Tuple[list, int]:
+    """Parses the tokens of a test script into a list of commands.
+
+    Every command is a list of words, except repeat blocks, which are
+    parsed into ("repeat", count, commands) tuples.
+
+    Args:
+        tokens (typing.List[str]): see tokenize.
+        start (int): the index of the first token to parse.
+        nested (bool): whether the commands are the body of a block, which
+            ends at the matching "}".
+
+    Returns:
+        typing.Tuple[list, int]: the commands, and the index of the token
+        following them.
+    """
+    commands = []
+    words = []
+    i = start
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if token in TERMINATORS:
+            if words:
+                commands.append(words)
+                words = []
+        elif token == "{":
+            if not words or words[0] != "repeat" or len(words) > 2:
+                raise ScriptError(f"Unsupported block: {' '.join(words)}")
+            count = int(words[1]) if len(words) == 2 else None
+            if count is None or count < 0:
+                raise ScriptError("repeat needs a non-negative count, "
+                                  "endless scripts are interactive")
+            body, i = parse_script(tokens, i, nested=True)
+            commands.append(("repeat", count, body))
+            words = []
+        elif token == "}":
+            if not nested:
+                raise ScriptError("Unbalanced }")
+            if words:
+                commands.append(words)
+            return commands, i
+        else:
+            words.append(token)
+    if nested:
+        raise ScriptError("Missing }")
+    if words:
+        commands.append(words)
+    return commands, i
+
+
+def parse_column(column: str) -> typing.Tuple[str, str, int, int, int]:
+    """Parses an output-list entry such as RAM[0]%D2.6.2 into the name of
+    the variable, its format (B, D, X or S), the left padding, the length of
+    the value and the right padding.
+    """
+    match = COLUMN_PATTERN.match(column)
+    if match is None:
+        raise ScriptError(f"Malformed output-list entry {column}")
+    if match.group(2) is None:
+        return (match.group(1), *DEFAULT_COLUMN_FORMAT)
+    return (match.group(1), match.group(2), int(match.group(3)),
+            int(match.group(4)), int(match.group(5)))
+
+
+def parse_value(value: str) -> int:
+    """Parses the value of a set command, e.g. -1, %B101 or %X7FFF."""
+    match = VALUE_PATTERN.match(value)
+    if match is None:
+        raise ScriptError(f"Malformed value {value}")
+    number = int(match.group(2), VALUE_BASES[match.group(1) or "D"])
+    return wrap(number)
+
+
+def format_header(columns: typing.List[tuple]) -> str:
+    """Formats the header line of the output, with the name of every
+    variable centered in its column.
+    """
+    cells = []
+    for name, _, pad_left, length, pad_right in columns:
+        width = pad_left + length + pad_right
+        name = name[:width]
+        left = (width - len(name)) // 2
+        cells.append(" " * left + name + " " * (width - left - len(name)))
+    return "|" + "|".join(cells) + "|"
+
+
+def format_value(value: typing.Union[int, str], value_format: str,
+                 length: int) -> str:
+    """Formats a 16-bit value, or the time of the hardware simulator, as it
+    appears in an output column.
+    """
+    if isinstance(value, str):
+        return value.ljust(length)
+    if value_format == "B":
+        text = f"{value & 0xFFFF:016b}"[-length:]
+    elif value_format == "X":
+        text = f"{value & 0xFFFF:04X}"[-length:]
+    else:
+        text = str(value)
+    return text.rjust(length)
+
+
+def matches(line: str, expected: str) -> bool:
+    """Does an output line match a line of a .cmp file, in which "*" matches
+    any character?
+    """
+    return len(line) == len(expected) and all(
+        wanted == WILDCARD or actual == wanted
+        for actual, wanted in zip(line, expected))
+
+
+class ScriptRunner:
+    """Runs a test script headless and compares its output to the .cmp file
+    of the script. Scripts that load a program run it on CPUEmulator or one
+    of its subclasses, and scripts that load an .hdl file run the chip on
+    HardwareSimulator.
+
+    The supported commands are load, output-file, compare-to, output-list,
+    set, eval, output, tick, tock, ticktock, repeat blocks, loading a
+    program into a memory part (e.g. ROM32K load Add.hack), echo and
+    clear-echo. On the CPU, a repeat block that only ticks the clock runs
+    its instructions in a single call to the emulator.
+    """
+
+    def __init__(self, script_path: str,
+                 emulator_class: typing.Type[CPUEmulator] = CPUEmulator) \
+            -> None:
+        """Reads and parses a test script.
+
+        Args:
+            script_path (str): the .tst file.
+            emulator_class (typing.Type[CPUEmulator]): the emulator to run
+                a loaded program on.
+        """
+        self.script_path = script_path
+        self.directory = os.path.dirname(script_path)
+        self.emulator_class = emulator_class
+        with open(script_path, 'r') as script_file:
+            self.commands, _ = parse_script(tokenize(script_file.read()))
+        self.machine = None
+        self.output_path = None
+        self.expected = None
+        self.columns = []
+        self.lines = []
+
+    def run(self) -> int:
+        """Runs the script and writes its output file, if it names one.
+
+        Returns:
+            int: the number of output lines, including the header.
+
+        Raises:
+            ComparisonError: when an output line differs from the .cmp file.
+        """
+        try:
+            self.__run_commands(self.commands)
+        finally:
+            if self.output_path is not None:
+                with open(self.output_path, 'w') as output_file:
+                    output_file.write("".join(
+                        f"{line}\n" for line in self.lines))
+        return len(self.lines)
+
+    def __run_commands(self, commands: list) -> None:
+        for command in commands:
+            if isinstance(command, tuple):
+                _, count, body = command
+                if isinstance(self.machine, CPUEmulator) and all(
+                        isinstance(inner, list) and
+                        inner[0] in CLOCK_COMMANDS for inner in body):
+                    self.__run_cycles(count * sum(
+                        inner[0] != "tick" for inner in body))
+                else:
+                    for _ in range(count):
+                        self.__run_commands(body)
+            else:
+                self.__run_command(command)
+
+    def __run_command(self, words: typing.List[str]) -> None:
+        name, arguments = words[0], words[1:]
+        if name == "load":
+            self.__load(arguments)
+        elif name == "output-file":
+            self.output_path = self.__path(arguments)
+        elif name == "compare-to":
+            with open(self.__path(arguments), 'r') as compare_file:
+                self.expected = compare_file.read().splitlines()
+        elif name == "output-list":
+            self.columns = [parse_column(column) for column in arguments]
+            self.__emit(format_header(self.columns))
+        elif name == "set":
+            if len(arguments) != 2:
+                raise ScriptError(f"Malformed command {' '.join(words)}")
+            self.__loaded()[arguments[0]] = parse_value(arguments[1])
+        elif name == "output":
+            self.__output()
+        elif name in ("echo", "clear-echo"):
+            # Echo only affects the interactive tools.
+            pass
+        elif isinstance(self.__loaded(), CPUEmulator):
+            if name in ("ticktock", "tock"):
+                self.__run_cycles(1)
+            elif name != "tick":
+                # An instruction is executed on tock.
+                raise ScriptError(f"Unsupported command {name}")
+        elif name in CLOCK_COMMANDS:
+            if name != "tock":
+                self.machine.tick()
+            if name != "tick":
+                self.machine.tock()
+        elif name == "eval":
+            self.machine.eval()
+        elif len(arguments) == 2 and arguments[0] == "load":
+            self.machine.load_memory(name, self.__path(arguments[1:]))
+        else:
+            raise ScriptError(f"Unsupported command {name}")
+
+    def __path(self, arguments: typing.List[str]) -> str:
+        if len(arguments) != 1:
+            raise ScriptError("Expected a single file name")
+        return os.path.join(self.directory, arguments[0])
+
+    def __load(self, arguments: typing.List[str]) -> None:
+        path = self.__path(arguments)
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in LOADABLE_EXTENSIONS:
+            raise ScriptError(f"Cannot load {arguments[0]}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"{path} does not exist, it may need to be built first")
+        if extension == HDL_EXTENSION:
+            self.machine = HardwareSimulator.load(path)
+        else:
+            self.machine = self.emulator_class(load_program(path))
+
+    def __loaded(self) -> typing.Union[CPUEmulator, HardwareSimulator]:
+        if self.machine is None:
+            raise ScriptError("Nothing was loaded")
+        return self.machine
+
+    def __run_cycles(self, cycles: int) -> None:
+        emulator = self.machine
+        while cycles > 0:
+            # A halted program keeps spinning in its final loop, which does
+            # not change the state of the computer.
+            executed = emulator.run(cycles)
+            cycles -= executed
+            if emulator.halted or executed == 0:
+                emulator.cycles += cycles
+                break
+
+    def __output(self) -> None:
+        machine = self.__loaded()
+        cells = []
+        for name, value_format, pad_left, length, pad_right in self.columns:
+            if name == "time":
+                value = machine.cycles if isinstance(machine, CPUEmulator) \
+                    else machine.time
+            else:
+                value = machine[name]
+            cells.append(" " * pad_left +
+                         format_value(value, value_format, length) +
+                         " " * pad_right)
+        self.__emit("|" + "|".join(cells) + "|")
+
+    def __emit(self, line: str) -> None:
+        self.lines.append(line)
+        if self.expected is None:
+            return
+        number = len(self.lines)
+        if number > len(self.expected) or \
+                not matches(line, self.expected[number - 1]):
+            expected = self.expected[number - 1] \
+                if number <= len(self.expected) else "<end of file>"
+            raise ComparisonError(
+                f"Comparison failure at line {number}: expected "
+                f"{expected!r}, got {line!r}")
+
+
+def is_batch_script(script_path: str) -> bool:
+    """Does the test script load a program into the CPU emulator or a chip
+    into the hardware simulator (and not, e.g., .vm files into the VM
+    emulator), and run without user interaction? Interactive scripts, such
+    as 04/fill/Fill.tst, repeat forever or wait in a while loop for a key.
+    """
+    with open(script_path, 'r') as script_file:
+        tokens = tokenize(script_file.read())
+    if "while" in tokens:
+        return False
+    for index, token in enumerate(tokens[:-1]):
+        if token == "repeat" and tokens[index + 1] == "{":
+            return False
+    for index, token in enumerate(tokens[:-1]):
+        if token == "load":
+            extension = os.path.splitext(tokens[index + 1])[1].lower()
+            return extension in LOADABLE_EXTENSIONS
+    return False
+
+
+def find_scripts(paths: typing.List[str]) -> typing.List[str]:
+    """Finds the batch test scripts among the given .tst files and,
+    recursively, in the given directories.
+    """
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in os.walk(path):
+                scripts.extend(
+                    os.path.join(directory, filename)
+                    for filename in filenames
+                    if filename.endswith(SCRIPT_EXTENSION))
+        else:
+            scripts.append(path)
+    return sorted(script for script in scripts if is_batch_script(script))
+
+
+def run_script(script_path: str, jit: bool = False) \
+        -> typing.Tuple[int, float]:
+    """Runs a test script.
+
+    Args:
+        script_path (str): the .tst file.
+        jit (bool): run programs on JITEmulator instead of CPUEmulator.
+
+    Returns:
+        typing.Tuple[int, float]: the number of output lines, and the number
+        of seconds the script ran.
+    """
+    emulator_class = CPUEmulator
+    if jit:
+        from JITEmulator import JITEmulator
+        emulator_class = JITEmulator
+    start = time.perf_counter()
+    lines = ScriptRunner(script_path, emulator_class).run()
+    return lines, time.perf_counter() - start
+
+
+def run_scripts(script_paths: typing.List[str], jobs: int = 1,
+                jit: bool = False) \
+        -> typing.List[typing.Tuple[str, int, float, str]]:
+    """Runs several test scripts, each one in isolation from the others.
+
+    With more than one job the scripts are spread across a pool of
+    processes. Either way, a failing script does not stop the others, and
+    the results are returned in the order of script_paths.
+
+    Args:
+        script_paths (typing.List[str]): the .tst files.
+        jobs (int): the number of worker processes to use.
+        jit (bool): see run_script.
+
+    Returns:
+        typing.List[typing.Tuple[str, int, float, str]]: for every script,
+        its path, the number of output lines, the seconds it ran and an error
+        message, which is empty if the script passed.
+    """
+    results = []
+    if jobs == 1:
+        for script_path in script_paths:
+            try:
+                results.append((script_path, *run_script(script_path, jit),
+                                ""))
+            except Exception as error:
+                results.append((script_path, 0, 0.0, describe_error(error)))
+        return results
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_script, script_path, jit)
+                   for script_path in script_paths]
+        for script_path, future in zip(script_paths, futures):
+            try:
+                results.append((script_path, *future.result(), ""))
+            except Exception as error:
+                results.append((script_path, 0, 0.0, describe_error(error)))
+    return results
+
+
+if "__main__" == __name__:
+    # Runs the test scripts found in the given files and directories,
+    # prints a line per script and exits with an error if any failed.
+    arg_parser = argparse.ArgumentParser(prog="TestRunner")
+    arg_parser.add_argument(
+        "paths", nargs="+",
+        help=f"{SCRIPT_EXTENSION} files, or directories to search for them")
+    arg_parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1, metavar="N",
+        help="run the scripts in N worker processes")
+    arg_parser.add_argument(
+        "--jit", action="store_true",
+        help="run programs on JITEmulator")
+    args = arg_parser.parse_args()
+    if args.jobs < 1:
+        arg_parser.error("--jobs must be at least 1")
+    start = time.perf_counter()
+    results = run_scripts(
+        find_scripts([os.path.abspath(path) for path in args.paths]),
+        args.jobs, args.jit)
+    elapsed = time.perf_counter() - start
+    failures = 0
+    for path, _, seconds, error in results:
+        if error:
+            failures += 1
+            print(f"FAIL {path}: {error}")
+        else:
+            print(f"PASS {path} ({seconds:.3f}s)")
+    print(f"{len(results) - failures}/{len(results)} scripts passed in "
+          f"{elapsed:.3f}s using {args.jobs} jobs")
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,32 @@
+"""Checks that the JIT leaves the same state as the interpreter."""
+import os
+
+import pytest
+
+from CPUEmulator import CPUEmulator, load_program
+from JITEmulator import JITEmulator
+
+PROJECTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAMS = [
+    ("05/Rect.hack", {"RAM[0]": 7}, 10 ** 5),
+    ("04/mult/Mult.asm", {"RAM[0]": 13, "RAM[1]": 27}, 10 ** 5),
+    ("06/pong/Pong.asm", {}, 50000),
+]
+
+
+def run(emulator_class, path: str, registers: dict,
+        max_cycles: int) -> CPUEmulator:
+    emulator = emulator_class(load_program(os.path.join(PROJECTS, path)))
+    for register, value in registers.items():
+        emulator[register] = value
+    emulator.run(max_cycles)
+    return emulator
+
+
+@pytest.mark.parametrize("path, registers, max_cycles", PROGRAMS)
+def test_jit_matches_interpreter(path, registers, max_cycles):
+    interpreted = run(CPUEmulator, path, registers, max_cycles)
+    compiled = run(JITEmulator, path, registers, max_cycles)
+    for name in ("a", "d", "pc", "cycles", "halted"):
+        assert getattr(compiled, name) == getattr(interpreted, name), name
+    assert compiled.ram == interpreted.ram
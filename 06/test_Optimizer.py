@@ -0,0 +1,46 @@
+"""Regression tests for the peephole optimizer, run on the CPU emulator."""
+import os
+
+import pytest
+
+from CPUEmulator import CPUEmulator, SCREEN
+from Main import assemble
+from Optimizer import PeepholeOptimizer
+
+RECT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rect")
+ROWS = 4
+MAX_CYCLES = 10 ** 5
+
+
+def run_rect(filename: str, optimizer=None) -> CPUEmulator:
+    with open(os.path.join(RECT, filename), 'r') as input_file:
+        emulator = CPUEmulator(assemble(input_file, optimizer=optimizer))
+    emulator["RAM[0]"] = ROWS
+    emulator.run(MAX_CYCLES)
+    return emulator
+
+
+def drawn_rows(emulator: CPUEmulator) -> int:
+    return sum(emulator.ram[SCREEN + 32 * row] == -1 for row in range(16))
+
+
+def test_rect_l_draws_every_row_without_optimization():
+    emulator = run_rect("RectL.asm")
+    assert emulator.halted
+    assert drawn_rows(emulator) == ROWS
+
+
+def test_rect_l_is_refused_by_the_optimizer():
+    # RectL jumps to literal ROM addresses (@10, D;JGT), which removing
+    # instructions would silently retarget.
+    with pytest.raises(ValueError, match="literal ROM address @23"):
+        run_rect("RectL.asm", PeepholeOptimizer())
+
+
+def test_optimized_rect_matches_the_plain_build():
+    plain = run_rect("Rect.asm")
+    optimizer = PeepholeOptimizer()
+    optimized = run_rect("Rect.asm", optimizer)
+    assert plain.halted and optimized.halted
+    assert drawn_rows(optimized) == drawn_rows(plain) == ROWS
+    assert list(optimized.ram) == list(plain.ram)
@@ -0,0 +1,172 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Benchmarks the VM translator, and reports the ROM size of a program in
+every translation mode. Large programs are made by compiling a Jack program
+together with the OS, e.g. 11/Pong and the files of 12, with
+11/JackCompiler.py.
+"""
+import io
+import os
+import sys
+import time
+import typing
+
+from Parser import Opcode, parse_commands
+from CodeWriter import CodeWriter, SHARED_COMPARE_LABELS, CALL_TEMPLATE, \
+    TRAMPOLINE_CALL_TEMPLATE, CALL_ROUTINE_TEMPLATE, \
+    TRAMPOLINE_RETURN_TEMPLATE, rom_size
+from Main import vm_paths, file_name
+
+DEFAULT_PROGRAM = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "FunctionCalls",
+    "StaticsTest")
+DEFAULT_REPEAT = 5
+
+def translate_current(
+        sources: typing.List[typing.Tuple[str, str]],
+        output_file: typing.TextIO, **options: bool) -> None:
+    """Translates like Main.translate_files, from in-memory sources.
+
+    Args:
+        sources (typing.List[typing.Tuple[str, str]]): the name and the
+            contents of every file to translate.
+        output_file (typing.TextIO): writes all output to this file.
+        options (bool): the translation modes of the CodeWriter.
+    """
+    cw = CodeWriter(output_file, **options)
+    for index, (name, source) in enumerate(sources):
+        commands = parse_commands(io.StringIO(source))
+        cw.set_file_name(name)
+        if index == 0:
+            cw.write_bootstrap()
+        cw.write_commands(commands)
+    cw.flush()
+
+
+def time_translator(
+        translator: typing.Callable[
+            [typing.List[typing.Tuple[str, str]], typing.TextIO], None],
+        sources: typing.List[typing.Tuple[str, str]],
+        repeat: int) -> typing.Tuple[float, str]:
+    """Runs a translator on in-memory streams and keeps the best time.
+
+    Args:
+        translator (typing.Callable): a translate_current-like function.
+        sources (typing.List[typing.Tuple[str, str]]): the files to
+            translate.
+        repeat (int): how many times to run the translator.
+
+    Returns:
+        typing.Tuple[float, str]: the best run time in seconds, and the
+        produced output.
+    """
+    best = float("inf")
+    output = ""
+    for _ in range(repeat):
+        output_file = io.StringIO()
+        start = time.perf_counter()
+        translator(sources, output_file)
+        best = min(best, time.perf_counter() - start)
+        output = output_file.getvalue()
+    return best, output
+
+
+def read_sources(path: str) -> typing.List[typing.Tuple[str, str]]:
+    """Returns the name and the contents of every .vm file of a path."""
+    paths, _ = vm_paths(path)
+    sources = []
+    for input_path in paths:
+        with open(input_path, 'r') as input_file:
+            sources.append((file_name(input_path), input_file.read()))
+    return sources
+
+
+def shared_compare_cycles(counts: typing.List[int]) -> str:
+    """Describes the cycles the shared comparison routines add, given the
+    number of commands of every opcode."""
+    comparisons = sum(counts[opcode] for opcode in SHARED_COMPARE_LABELS)
+    return f"{comparisons} comparisons, +9 cycles each"
+
+
+def trampolines_cycles(counts: typing.List[int]) -> str:
+    """Describes the cycles the call and return routines add, given the
+    number of commands of every opcode."""
+    call = rom_size(TRAMPOLINE_CALL_TEMPLATE) + \
+        rom_size(CALL_ROUTINE_TEMPLATE) - rom_size(CALL_TEMPLATE)
+    ret = rom_size(TRAMPOLINE_RETURN_TEMPLATE)
+    return f"{counts[Opcode.CALL]} calls, +{call} cycles each, " \
+           f"{counts[Opcode.RETURN]} returns, +{ret} cycles each"
+
+
+# The name, the CodeWriter options and a description of the cycles of every
+# translation mode.
+MODES = (
+    ("default", {}, lambda counts: ""),
+    ("shared-compare", {"shared_compare": True}, shared_compare_cycles),
+    ("trampolines", {"trampolines": True}, trampolines_cycles),
+    ("both", {"shared_compare": True, "trampolines": True},
+     lambda counts: "the sum of the above"),
+    ("stack-caching", {"stack_caching": True},
+     lambda counts: "fewer cycles for every command it changes"),
+    ("superinstructions", {"superinstructions": True},
+     lambda counts: "fewer cycles for every sequence it changes"),
+    ("all", {"shared_compare": True, "trampolines": True,
+             "stack_caching": True, "superinstructions": True},
+     lambda counts: ""),
+)
+
+
+def report_modes(path: str) -> None:
+    """Prints the ROM size of a program in every translation mode, and the
+    cycles each mode adds to or saves from the commands it changes.
+
+    Args:
+        path (str): the .vm file or directory of .vm files to translate.
+    """
+    sources = read_sources(path)
+    counts = [0] * len(Opcode)
+    for _, source in sources:
+        for opcode in parse_commands(io.StringIO(source)).opcodes:
+            counts[opcode] += 1
+    baseline = None
+    print(f"{os.path.basename(path)}: ROM size by translation mode")
+    for mode, options, cycles in MODES:
+        output_file = io.StringIO()
+        translate_current(sources, output_file, **options)
+        size = rom_size(output_file.getvalue())
+        baseline = size if baseline is None else baseline
+        print(f"  {mode:<18} {size:7} instructions {size - baseline:+7}  "
+              f"{cycles(counts)}".rstrip())
+
+
+def benchmark_translator(path: str, repeat: int) -> None:
+    """Times the translator on in-memory files.
+
+    Args:
+        path (str): the .vm file or directory of .vm files to benchmark on.
+        repeat (int): how many times to run the translator.
+    """
+    sources = read_sources(path)
+    seconds, output = time_translator(translate_current, sources, repeat)
+    commands = sum(len(parse_commands(io.StringIO(source)))
+                   for _, source in sources)
+    print(f"{os.path.basename(path)}: {len(sources)} files, {commands} "
+          f"commands, {output.count(chr(10))} lines, best of {repeat}")
+    print(f"  {seconds * 1000:9.2f} ms {commands / seconds:12.0f} "
+          f"commands/sec")
+
+
+if "__main__" == __name__:
+    # Usage: Benchmark.py [input path] [repeat]
+    if len(sys.argv) > 3:
+        sys.exit("Invalid usage, please use: Benchmark.py [<input path>] "
+                 "[<repeat>]")
+    path = os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 \
+        else DEFAULT_PROGRAM
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_REPEAT
+    benchmark_translator(path, repeat)
+    report_modes(path)
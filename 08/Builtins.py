@@ -0,0 +1,293 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import random
+import typing
+
+from Parser import Commands
+from VMEmulator import VMEmulator, NATIVES, Native, wrap, ADDRESS_MASK, \
+    SP, THAT, STATIC_BASE, STATIC_LIMIT
+
+HEAP_BASE = 2048
+KBD = 24576
+DEFAULT_CASES = 200
+# The OS functions Sys.init calls before Main.main, in order.
+OS_INIT = ("Memory.init", "Math.init", "Screen.init")
+# The RAM the OS functions may change: the pointers, the static variables,
+# the heap and the screen. The temp segment and R13-R15 are scratch, and the
+# stack above SP holds the frames of the calls the builtins skip.
+COMPARED_RAM = ((SP, THAT + 1), (STATIC_BASE, STATIC_LIMIT + 1),
+                (HEAP_BASE, KBD))
+EDGE_VALUES = (-32768, -32767, -2, -1, 0, 1, 2, 32766, 32767)
+
+# The static variables of 12/*.jack, indexed in declaration order.
+MATH_QY2 = ("Math", 0)
+MEMORY_RAM = ("Memory", 0)
+MEMORY_FREE_LIST = ("Memory", 1)
+SCREEN_COLOR = ("Screen", 0)
+SCREEN_BASE = ("Screen", 1)
+
+
+def static(vm: VMEmulator, variable: typing.Tuple[str, int]) -> int:
+    """Returns the address of a static variable of the OS."""
+    address = vm.statics.get(variable)
+    if address is None:
+        raise ValueError(f"{variable[0]}.vm is not part of the program")
+    return address
+
+
+def absolute(x: int) -> int:
+    """Math.abs, where -32768 is its own absolute value."""
+    return wrap(-x) if x < 0 else x
+
+
+def divide(vm: VMEmulator, x: int, y: int) -> typing.Optional[int]:
+    """Math.divide, including the value it leaves in Math.qy2. Division by
+    zero never returns in Jack, so it is left to the VM."""
+    if y == 0:
+        return None
+    flip_sign = False
+    if x < 0:
+        x = wrap(-x)
+        flip_sign = not flip_sign
+    if y < 0:
+        y = wrap(-y)
+        flip_sign = not flip_sign
+    result = divide_helper(vm.ram, static(vm, MATH_QY2), x, y)
+    return wrap(-result) if flip_sign else result
+
+
+def divide_helper(ram: array.array, qy2: int, x: int, y: int) -> int:
+    """Math.divide_helper, which keeps 2 * q * y in Math.qy2."""
+    if y > x or y < 0:
+        ram[qy2] = 0
+        return 0
+    q = divide_helper(ram, qy2, x, wrap(y << 1))
+    if wrap(x - ram[qy2]) < y:
+        return wrap(q << 1)
+    ram[qy2] = wrap(ram[qy2] + y)
+    return wrap(wrap(q << 1) + 1)
+
+
+def alloc(vm: VMEmulator, size: int) -> int:
+    """Memory.alloc: the first fit in the free list."""
+    ram = vm.ram
+    memory = ram[static(vm, MEMORY_RAM)]
+    free_list = static(vm, MEMORY_FREE_LIST)
+
+    def peek(address: int) -> int:
+        return ram[(memory + address) & ADDRESS_MASK]
+
+    def poke(address: int, value: int) -> None:
+        ram[(memory + address) & ADDRESS_MASK] = value
+
+    segment_base = ram[free_list]
+    segment_size = peek(segment_base)
+    prev = -1
+    while segment_base != 0:
+        if segment_size > size:
+            block = wrap(segment_base + 1)
+            new_segment_base = wrap(segment_base + size + 1)
+            remains = new_segment_base < wrap(segment_base + segment_size - 1)
+            if prev == -1:
+                ram[free_list] = new_segment_base if remains \
+                    else peek(wrap(segment_base + 1))
+            else:
+                poke(wrap(prev + 1), new_segment_base if remains
+                     else peek(wrap(segment_base + 1)))
+            poke(new_segment_base, wrap(segment_size - size - 1))
+            poke(wrap(new_segment_base + 1), peek(wrap(segment_base + 1)))
+            poke(wrap(block - 1), wrap(size + 1))
+            return block
+        prev = segment_base
+        segment_base = peek(wrap(segment_base + 1))
+        segment_size = peek(segment_base)
+    return -1
+
+
+class Screen:
+    """The drawing functions of 12/Screen.jack that Screen.drawLine calls.
+    The color and the base address of the screen are read from the static
+    variables of Screen, and the screen is written through Memory.ram.
+    """
+
+    __slots__ = ("ram", "memory", "color", "base")
+
+    def __init__(self, vm: VMEmulator) -> None:
+        self.ram = vm.ram
+        self.memory = self.ram[static(vm, MEMORY_RAM)]
+        self.color = static(vm, SCREEN_COLOR)
+        self.base = static(vm, SCREEN_BASE)
+
+    def draw_line(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        if x1 == x2:
+            self.draw_vertical_line(x1, y1, y2)
+        elif y1 == y2:
+            self.draw_horizontal_line(y1, x1, x2)
+        elif x1 > x2:
+            self.draw_diagonal_line(x2, y2, x1, y1)
+        else:
+            self.draw_diagonal_line(x1, y1, x2, y2)
+
+    def address(self, x: int, y: int) -> int:
+        return wrap(self.ram[self.base] + wrap(y << 5) + (x >> 4))
+
+    def draw_mask(self, address: int, mask: int) -> None:
+        address = (self.memory + address) & ADDRESS_MASK
+        if self.ram[self.color]:
+            self.ram[address] |= mask
+        else:
+            self.ram[address] &= ~mask
+
+    def draw_pixel(self, x: int, y: int) -> None:
+        self.draw_mask(self.address(x, y), wrap(1 << (x & 15)))
+
+    def draw_diagonal_line(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        a = b = diff = 0
+        dx = wrap(x2 - x1)
+        dy = wrap(y2 - y1)
+        sign_y = 1 if y2 > y1 else -1
+        while not (a > dx or absolute(b) > absolute(dy)):
+            self.draw_pixel(wrap(x1 + a), wrap(y1 + b))
+            if diff < 0:
+                a = wrap(a + 1)
+                diff = wrap(diff + absolute(dy))
+            else:
+                b = wrap(b + sign_y)
+                diff = wrap(diff - dx)
+
+    def draw_vertical_line(self, x: int, y1: int, y2: int) -> None:
+        y = min(y1, y2)
+        while not y > max(y1, y2):
+            self.draw_pixel(x, y)
+            y = wrap(y + 1)
+
+    def draw_horizontal_line(self, y: int, x1: int, x2: int) -> None:
+        left, right = min(x1, x2), max(x1, x2)
+        address1 = self.address(left, y)
+        address2 = self.address(right, y)
+        left_bits, right_bits = left & 15, right & 15
+        address = wrap(address1 + 1)
+        while address < address2:
+            self.ram[(self.memory + address) & ADDRESS_MASK] = \
+                self.ram[self.color]
+            address = wrap(address + 1)
+        if address1 == address2:
+            mask = 1
+            for i in range(right_bits):
+                mask = wrap(mask << 1)
+                if i < right_bits - left_bits:
+                    mask = wrap(mask + 1)
+            self.draw_mask(address1, mask)
+        else:
+            self.draw_mask(address1, ~wrap((1 << left_bits) - 1))
+            self.draw_mask(address2, wrap((2 << right_bits) - 1))
+
+
+def draw_line(vm: VMEmulator, x1: int, y1: int, x2: int, y2: int) -> int:
+    """Screen.drawLine."""
+    Screen(vm).draw_line(x1, y1, x2, y2)
+    return 0
+
+
+# Python implementations of OS functions with the same results and the same
+# changes to the RAM as 12/*.jack, including the functions of NATIVES.
+BUILTINS = dict(NATIVES, **{
+    "Math.divide": divide,
+    "Memory.alloc": alloc,
+    "Screen.drawLine": draw_line,
+})
+
+
+def any_value(generator: random.Random) -> int:
+    if generator.random() < 0.25:
+        return generator.choice(EDGE_VALUES)
+    return generator.randint(-32768, 32767)
+
+
+def line(generator: random.Random) -> typing.Tuple[int, int, int, int]:
+    x1, x2 = generator.randrange(512), generator.randrange(512)
+    y1, y2 = generator.randrange(256), generator.randrange(256)
+    kind = generator.randrange(3)
+    if kind == 0:
+        return x1, y1, x1, y2
+    if kind == 1:
+        return x1, y1, x2, y1
+    return x1, y1, x2, y2
+
+
+# Random arguments for every builtin, in the ranges the OS expects.
+ARGUMENTS = {
+    "Math.multiply": lambda generator: (any_value(generator),
+                                        any_value(generator)),
+    "Math.abs": lambda generator: (any_value(generator),),
+    "Math.min": lambda generator: (any_value(generator),
+                                   any_value(generator)),
+    "Math.max": lambda generator: (any_value(generator),
+                                   any_value(generator)),
+    "Math.divide": lambda generator: (any_value(generator),
+                                      any_value(generator) or 1),
+    "Memory.alloc": lambda generator: (
+        generator.choice((generator.randint(1, 64), 16384)),),
+    "Screen.drawLine": line,
+}
+
+
+def check_builtins(files: typing.List[typing.Tuple[str, Commands]],
+                   cases: int = DEFAULT_CASES, seed: int = 0) \
+        -> typing.List[typing.Tuple[str, int, str]]:
+    """Runs every builtin the program defines next to its VM commands on
+    random arguments, and compares the values they return and the RAM they
+    leave. The OS is initialized first, and every case starts from the RAM
+    the VM commands left after the previous one. Screen.drawLine is checked
+    with both colors.
+
+    Args:
+        files (typing.List[typing.Tuple[str, Commands]]): the name and the
+            commands of every file of the program, including the OS.
+        cases (int): the number of calls to check per builtin.
+        seed (int): the seed of the random arguments.
+
+    Returns:
+        typing.List[typing.Tuple[str, int, str]]: the name of the builtin,
+        the number of cases checked, and the first mismatch or "" for every
+        builtin the program defines.
+    """
+    vm = VMEmulator(files, entry_point=None)
+    defined = [name for name in BUILTINS if name in vm.function_numbers and
+               vm.starts[vm.function_numbers[name]] is not None]
+    for name in OS_INIT:
+        if name in vm.function_numbers:
+            vm.call(name, ())
+    generator = random.Random(seed)
+    results = []
+    for name in defined:
+        builtin: Native = BUILTINS[name]
+        mismatch = ""
+        for _ in range(cases):
+            if name == "Screen.drawLine":
+                vm.call("Screen.setColor", (generator.choice((0, -1)),))
+            arguments = tuple(wrap(argument)
+                              for argument in ARGUMENTS[name](generator))
+            before = array.array('h', vm.ram)
+            expected = vm.call(name, arguments)
+            after = vm.ram
+            vm.ram = array.array('h', before)
+            actual = builtin(vm, *arguments)
+            actual = expected if actual is None else wrap(actual)
+            different = [address for start, end in COMPARED_RAM
+                         for address in range(start, end)
+                         if vm.ram[address] != after[address]]
+            vm.ram = after
+            if actual != expected or different:
+                call = f"{name}({', '.join(map(str, arguments))})"
+                mismatch = (f"{call} returned {actual} instead of {expected}"
+                            if actual != expected else
+                            f"{call} changed RAM[{different[0]}]")
+                break
+        results.append((name, cases, mismatch))
+    return results
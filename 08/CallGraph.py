@@ -0,0 +1,122 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Parser import Commands, Opcode
+
+ENTRY_POINT = "Sys.init"
+
+
+class Function:
+    """A function of a program: its name, where it is defined, and the
+    functions it calls.
+
+    Attributes:
+        name (str): the name of the function, e.g. Math.multiply.
+        filename (str): the name of the file it is defined in.
+        start (int): the index of its function command in the file.
+        end (int): the index after its last command.
+        calls (typing.Set[str]): the names of the functions it calls.
+    """
+
+    __slots__ = ("name", "filename", "start", "end", "calls")
+
+    def __init__(self, name: str, filename: str, start: int, end: int,
+                 calls: typing.Set[str]) -> None:
+        self.name = name
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self.calls = calls
+
+
+def split_functions(filename: str, commands: Commands) \
+        -> typing.List[Function]:
+    """Splits the commands of a file into its functions. Every function
+    extends from its function command to the next one.
+
+    Args:
+        filename (str): the name of the file.
+        commands (Commands): the parsed file.
+
+    Returns:
+        typing.List[Function]: the functions of the file, in order.
+    """
+    functions = []
+    opcodes, arg1, symbols = commands.opcodes, commands.arg1, commands.symbols
+    for index, opcode in enumerate(opcodes):
+        if opcode == Opcode.FUNCTION:
+            if functions:
+                functions[-1].end = index
+            functions.append(Function(
+                symbols[arg1[index]], filename, index, len(opcodes), set()))
+        elif opcode == Opcode.CALL and functions:
+            functions[-1].calls.add(symbols[arg1[index]])
+    return functions
+
+
+def reachable_functions(functions: typing.Dict[str, Function],
+                        roots: typing.Iterable[str]) -> typing.Set[str]:
+    """Returns the names of the functions reachable from the roots in the
+    call graph, including the roots. Calls to functions that are not
+    defined are ignored.
+
+    Args:
+        functions (typing.Dict[str, Function]): the functions, by name.
+        roots (typing.Iterable[str]): the entry points of the program.
+    """
+    reachable = set()
+    pending = [root for root in roots if root in functions]
+    while pending:
+        name = pending.pop()
+        if name in reachable:
+            continue
+        reachable.add(name)
+        pending.extend(callee for callee in functions[name].calls
+                       if callee in functions and callee not in reachable)
+    return reachable
+
+
+def remove_dead_functions(
+        files: typing.List[typing.Tuple[str, Commands]],
+        entry_point: str = ENTRY_POINT) \
+        -> typing.Tuple[typing.List[typing.Tuple[str, Commands]],
+                        typing.List[typing.Tuple[Function, Commands]]]:
+    """Removes the functions that cannot be called from the entry point.
+    Programs without the entry point, e.g. single-file tests, are returned
+    as they are. Commands before the first function of a file are kept.
+
+    Args:
+        files (typing.List[typing.Tuple[str, Commands]]): the name and the
+            commands of every file of the program.
+        entry_point (str): the function the bootstrap code calls.
+
+    Returns:
+        typing.Tuple[typing.List[typing.Tuple[str, Commands]],
+        typing.List[typing.Tuple[Function, Commands]]]: the files without
+        the dead functions, and every dead function with its commands.
+    """
+    split = [(filename, commands, split_functions(filename, commands))
+             for filename, commands in files]
+    functions = {function.name: function
+                 for _, _, file_functions in split
+                 for function in file_functions}
+    if entry_point not in functions:
+        return files, []
+    reachable = reachable_functions(functions, (entry_point,))
+    live_files, dead = [], []
+    for filename, commands, file_functions in split:
+        ranges = [(0, file_functions[0].start if file_functions
+                   else len(commands))]
+        for function in file_functions:
+            if function.name in reachable:
+                ranges.append((function.start, function.end))
+            else:
+                dead.append((function, commands.extract(
+                    [(function.start, function.end)])))
+        live_files.append((filename, commands.extract(ranges)))
+    return live_files, dead
@@ -1,12 +1,14 @@
 """This file is part of nand2tetris, as taught in The Hebrew University,
-and was written by Aviv Yaish according to the specifications given in  
+and was written by Aviv Yaish according to the specifications given in
 https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
-and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
 
-from Parser import C_PUSH, C_POP, C_ARITHMETIC
+from Parser import C_PUSH, C_POP, Commands, Opcode, KEYWORDS, MNEMONICS, \
+    SEGMENTS, SEGMENT_NUMBERS
+from Superinstructions import SUPERINSTRUCTIONS, match
 CONST = 'constant'
 POINTER = 'pointer'
 STATIC = 'static'
@@ -21,49 +23,512 @@ REAL_SEGMENTS = {
 TRUE = -1
 FALSE = 0
 
-POP_2_AND_PUSH_D = [
-    "@SP",
-    "M=M-1",
-    "A=M-1",
-    "M=D"
-]
+# Precompiled templates of the translation of every command. Each one is a
+# string of whole lines, formatted with the arguments of the command.
+POP_2_AND_PUSH_D = (
+    "@SP\n"
+    "M=M-1\n"
+    "A=M-1\n"
+    "M=D\n")
+PUSH_D = (
+    "@SP\n"
+    "A=M\n"
+    "M=D\n"
+    "@SP\n"
+    "M=M+1\n")
+LOAD_CONSTANT = "@{0}\nD=A\n"
+LOAD_DYNAMIC = "@{0}\nD=A\n@{1}\nA=D+M\nD=M\n"
+LOAD_FIXED = "@{0}\nD=M\n"
+PUSH_CONSTANT = LOAD_CONSTANT + PUSH_D
+PUSH_DYNAMIC = LOAD_DYNAMIC + PUSH_D
+PUSH_FIXED = LOAD_FIXED + PUSH_D
+POP_DYNAMIC = (
+    "// Dynamic pop\n"
+    "@{0}\n"
+    "D=A\n"
+    "@{1}\n"
+    "D=D+M\n"
+    "@R13\n"
+    "M=D\n"
+    "@SP\n"
+    "A=M-1\n"
+    "D=M\n"
+    "@R13\n"
+    "A=M\n"
+    "M=D\n"
+    "@SP\n"
+    "M=M-1\n")
+POP_FIXED = (
+    "// Non Dynamic pop\n"
+    "@SP\n"
+    "A=M-1\n"
+    "D=M\n"
+    "@{0}\n"
+    "M=D\n"
+    "@SP\n"
+    "M=M-1\n")
+BINARY_TEMPLATE = "@SP\nA=M-1\nD=M\nA=A-1\nD={0}\n" + POP_2_AND_PUSH_D
+UNARY_TEMPLATE = "@SP\nA=M-1\nM={0}\n"
+# With stack caching, the top of the stack may be kept in D instead of
+# memory, in which case SP points at where it belongs. It is spilled to
+# memory before the commands that need the whole stack in memory: labels,
+# branches, comparisons, function, call and return.
+SPILL_TEMPLATE = "@SP\nAM=M+1\nA=A-1\nM=D\n"
+LOAD_TOP = "@SP\nAM=M-1\nD=M\n"
+LOAD_SMALL_CONSTANTS = {0: "D=0\n", 1: "D=1\n"}
+STORE_FIXED = "@{0}\nM=D\n"
+STORE_DYNAMIC = (
+    "@R13\n"
+    "M=D\n"
+    "@{0}\n"
+    "D=A\n"
+    "@{1}\n"
+    "D=D+M\n"
+    "@R14\n"
+    "M=D\n"
+    "@R13\n"
+    "D=M\n"
+    "@R14\n"
+    "A=M\n"
+    "M=D\n")
+# Dynamic variables up to this index are addressed by incrementing A, which
+# is shorter than computing their address in R14.
+STORE_NEAR_LIMIT = 8
+STORE_NEAR = "@{0}\nA=M\n{1}M=D\n"
+CACHED_BINARY_TEMPLATE = "@SP\nAM=M-1\nD={0}\n"
+CACHED_IF_TEMPLATE = "@{0}${1}\nD;JNE\n"
+# A comparison that is correct even when x - y overflows: operands of
+# different signs are decided by their signs alone. Formatted with the
+# unique name of the comparison.
+COMPARE_TEMPLATE = (
+    "// Comparison {0} start\n"
+    "// Check x >= 0\n"
+    "@SP\n"
+    "A=M-1\n"
+    "A=A-1\n"
+    "D=M\n"
+    "@CMP_{0}_X_NEG\n"
+    "D;JLT\n"
+    "// If here than x >= 0, check y >= 0\n"
+    "@SP\n"
+    "A=M-1\n"
+    "D=M\n"
+    "@CMP_{0}_Y_NEG_X_POS\n"
+    "D;JLT\n"
+    "// If here than x >= 0 and y >= 0, goto same sign\n"
+    "@CMP_{0}_SAME_SIGN\n"
+    "0;JMP\n"
+    "(CMP_{0}_X_NEG)\n"
+    "// If here than x < 0, check y < 0\n"
+    "@SP\n"
+    "A=M-1\n"
+    "D=M\n"
+    "@CMP_{0}_Y_POS_X_NEG\n"
+    "D;JGE\n"
+    "// If here than x < 0 and y < 0, goto same sign\n"
+    "@CMP_{0}_SAME_SIGN\n"
+    "0;JMP\n"
+    "(CMP_{0}_SAME_SIGN)\n"
+    "@SP\n"
+    "A=M-1\n"
+    "D=M\n"
+    "A=A-1\n"
+    "D=M-D\n"
+    "@CMP_{0}_TRUE\n"
+    "D;J{1}\n"
+    "// Comparison {0} same sign false\n"
+    "@CMP_{0}_FALSE\n"
+    "0;JMP\n"
+    "(CMP_{0}_Y_NEG_X_POS)\n"
+    "// Here x >= 0 and y < 0, which means x > y,  therefore TRUE iff "
+    "checking gt\n"
+    "@CMP_{0}_TRUE\n"
+    "{2};JEQ\n"
+    "@CMP_{0}_FALSE\n"
+    "0;JMP\n"
+    "(CMP_{0}_Y_POS_X_NEG)\n"
+    "// Here x < 0 and y >= 0, which means x < y,  therefore TRUE iff "
+    "checking lt\n"
+    "@CMP_{0}_TRUE\n"
+    "{3};JEQ\n"
+    "@CMP_{0}_FALSE\n"
+    "0;JMP\n"
+    f"(CMP_{{0}}_FALSE)\n"
+    f"D={FALSE}\n"
+    "@CMP_{0}_END\n"
+    "0;JMP\n"
+    "(CMP_{0}_TRUE)\n"
+    f"D={TRUE}\n"
+    "(CMP_{0}_END)\n") + POP_2_AND_PUSH_D
+ARITHMETIC_TEMPLATES = {
+    Opcode.ADD: BINARY_TEMPLATE.format("M+D"),
+    Opcode.SUB: BINARY_TEMPLATE.format("M-D"),
+    Opcode.AND: BINARY_TEMPLATE.format("M&D"),
+    Opcode.OR: BINARY_TEMPLATE.format("M|D"),
+    Opcode.NEG: UNARY_TEMPLATE.format("-M"),
+    Opcode.NOT: UNARY_TEMPLATE.format("!M"),
+    Opcode.SHIFTLEFT: UNARY_TEMPLATE.format("M<<"),
+    Opcode.SHIFTRIGHT: UNARY_TEMPLATE.format("M>>"),
+}
+# The translations of the arithmetic commands when the top of the stack is
+# in D, which leave the result in D.
+CACHED_ARITHMETIC_TEMPLATES = {
+    Opcode.ADD: CACHED_BINARY_TEMPLATE.format("M+D"),
+    Opcode.SUB: CACHED_BINARY_TEMPLATE.format("M-D"),
+    Opcode.AND: CACHED_BINARY_TEMPLATE.format("M&D"),
+    Opcode.OR: CACHED_BINARY_TEMPLATE.format("M|D"),
+    Opcode.NEG: "D=-D\n",
+    Opcode.NOT: "D=!D\n",
+    Opcode.SHIFTLEFT: "D=D<<\n",
+    Opcode.SHIFTRIGHT: "D=D>>\n",
+}
+# The same when the top of the stack is in memory.
+UNCACHED_ARITHMETIC_TEMPLATES = {
+    opcode: LOAD_TOP + template
+    for opcode, template in CACHED_ARITHMETIC_TEMPLATES.items()}
+UNCACHED_ARITHMETIC_TEMPLATES.update({
+    Opcode.NEG: "@SP\nAM=M-1\nD=-M\n",
+    Opcode.NOT: "@SP\nAM=M-1\nD=!M\n",
+    Opcode.SHIFTLEFT: "@SP\nAM=M-1\nD=M<<\n",
+    Opcode.SHIFTRIGHT: "@SP\nAM=M-1\nD=M>>\n",
+})
+for _opcode in (Opcode.EQ, Opcode.GT, Opcode.LT):
+    _comparison = MNEMONICS[_opcode].upper()
+    # The jumps taken when the operands have different signs: always for
+    # "0;JEQ", never for "1;JEQ".
+    ARITHMETIC_TEMPLATES[_opcode] = COMPARE_TEMPLATE.format(
+        "{0}", _comparison, "0" if _comparison == "GT" else "1",
+        "0" if _comparison == "LT" else "1")
+# Comparisons can instead jump to a single routine per kind, which returns
+# through a register: each comparison then takes 6 instructions of ROM
+# instead of 50, and 9 more cycles to run.
+COMPARE_RETURN = "R15"
+SHARED_COMPARE_TEMPLATE = (
+    "@{0}\n"
+    "D=A\n"
+    f"@{COMPARE_RETURN}\n"
+    "M=D\n"
+    "@{1}\n"
+    "0;JMP\n"
+    "({0})\n")
+SHARED_COMPARE_LABELS = {
+    opcode: f"$CMP_{MNEMONICS[opcode].upper()}"
+    for opcode in (Opcode.EQ, Opcode.GT, Opcode.LT)}
+LABEL_TEMPLATE = "({0}${1})\n"
+GOTO_TEMPLATE = "@{0}${1}\n0;JMP\n"
+IF_TEMPLATE = "@SP\nM=M-1\nA=M\nD=M\n@{0}${1}\nD;JNE\n"
+PUSH_POINTER_TEMPLATE = "// push {0}\n@{0}\nD=M\n" + PUSH_D
+CALL_TEMPLATE = (
+    "// push return_addr\n"
+    "@{0}\n"
+    "D=A\n" + PUSH_D +
+    "".join(PUSH_POINTER_TEMPLATE.format(pointer)
+            for pointer in ("LCL", "ARG", "THIS", "THAT")) +
+    "// ARG = SP - 5 - n_args\n"
+    "@{1}\n"
+    "D=A\n"
+    "@SP\n"
+    "D=M-D\n"
+    "@ARG\n"
+    "M=D\n"
+    "// LCL = SP\n"
+    "@SP\n"
+    "D=M\n"
+    "@LCL\n"
+    "M=D\n"
+    "// goto {2}\n"
+    "@{2}\n"
+    "0;JMP\n"
+    "({0})\n")
+ENDFRAME = "R13"
+RET_ADDR = "R14"
+RESTORE_TEMPLATE = (
+    "// {0} = *(ENDFRAME - {1})\n"
+    "@{1}\n"
+    "D=A\n"
+    f"@{ENDFRAME}\n"
+    "A=M-D\n"
+    "D=M\n"
+    "@{0}\n"
+    "M=D\n")
+RETURN_TEMPLATE = (
+    "// ENDFRAME = LCL\n"
+    "@LCL\n"
+    "D=M\n"
+    f"@{ENDFRAME}\n"
+    "M=D\n"
+    "// RET_ADDR = *(ENDFRAME - 5)\n"
+    "@5\n"
+    "D=A\n"
+    f"@{ENDFRAME}\n"
+    "A=M-D\n"
+    "D=M\n"
+    f"@{RET_ADDR}\n"
+    "M=D\n"
+    "// *ARG = pop()\n"
+    "@SP\n"
+    "A=M-1\n"
+    "D=M\n"
+    "@ARG\n"
+    "A=M\n"
+    "M=D\n"
+    "// SP = ARG + 1\n"
+    "@ARG\n"
+    "D=M\n"
+    "@SP\n"
+    "M=D+1\n" +
+    "".join(RESTORE_TEMPLATE.format(pointer, distance) for pointer, distance
+            in (("THAT", 1), ("THIS", 2), ("ARG", 3), ("LCL", 4))) +
+    "// goto *(RET_ADDR - 5)\n"
+    f"@{RET_ADDR}\n"
+    "A=M\n"
+    "0;JMP\n")
+# Calls and returns can instead jump to a single routine each, which saves
+# and restores the frame: a call then takes 12 instructions of ROM instead
+# of 47 and 15 more cycles, and a return 2 instructions instead of 52 and 2
+# more cycles. The call site passes the return address in R13, the address
+# of the function in R14, and 5 + n_args in D.
+CALL_ROUTINE = "$CALL"
+RETURN_ROUTINE = "$RETURN"
+CALL_RETURN_ADDRESS = "R13"
+CALL_FUNCTION_ADDRESS = "R14"
+CALL_ARG_OFFSET = "R15"
+TRAMPOLINE_CALL_TEMPLATE = (
+    "@{0}\n"
+    "D=A\n"
+    f"@{CALL_RETURN_ADDRESS}\n"
+    "M=D\n"
+    "@{2}\n"
+    "D=A\n"
+    f"@{CALL_FUNCTION_ADDRESS}\n"
+    "M=D\n"
+    "@{1}\n"
+    "D=A\n"
+    f"@{CALL_ROUTINE}\n"
+    "0;JMP\n"
+    "({0})\n")
+TRAMPOLINE_RETURN_TEMPLATE = f"@{RETURN_ROUTINE}\n0;JMP\n"
+CALL_ROUTINE_TEMPLATE = (
+    f"({CALL_ROUTINE})\n"
+    f"@{CALL_ARG_OFFSET}\n"
+    "M=D\n"
+    "// push return_addr\n"
+    f"@{CALL_RETURN_ADDRESS}\n"
+    "D=M\n" + PUSH_D +
+    "".join(PUSH_POINTER_TEMPLATE.format(pointer)
+            for pointer in ("LCL", "ARG", "THIS", "THAT")) +
+    "// ARG = SP - 5 - n_args\n"
+    f"@{CALL_ARG_OFFSET}\n"
+    "D=M\n"
+    "@SP\n"
+    "D=M-D\n"
+    "@ARG\n"
+    "M=D\n"
+    "// LCL = SP\n"
+    "@SP\n"
+    "D=M\n"
+    "@LCL\n"
+    "M=D\n"
+    "// goto function\n"
+    f"@{CALL_FUNCTION_ADDRESS}\n"
+    "A=M\n"
+    "0;JMP\n")
+# The shared routines, by label, in the order they are written.
+ROUTINES = {
+    **{label: f"({label})\n" +
+       ARITHMETIC_TEMPLATES[opcode].format(MNEMONICS[opcode].upper()) +
+       f"@{COMPARE_RETURN}\n"
+       "A=M\n"
+       "0;JMP\n"
+       for opcode, label in SHARED_COMPARE_LABELS.items()},
+    CALL_ROUTINE: CALL_ROUTINE_TEMPLATE,
+    RETURN_ROUTINE: f"({RETURN_ROUTINE})\n" + RETURN_TEMPLATE,
+}
+BOOTSTRAP_TEMPLATE = (
+    "// SP = 256\n"
+    "@256\n"
+    "D=A\n"
+    "@SP\n"
+    "M=D\n")
+PUSH_ZERO = PUSH_CONSTANT.format(0)
+CONSTANT_SEGMENT = SEGMENT_NUMBERS[CONST]
+POINTER_SEGMENT = SEGMENT_NUMBERS[POINTER]
+STATIC_SEGMENT = SEGMENT_NUMBERS[STATIC]
+TEMP_SEGMENT = SEGMENT_NUMBERS[TEMP]
+BASES = {SEGMENT_NUMBERS[segment]: base
+         for segment, base in REAL_SEGMENTS.items()}
+# Commands whose translation contains a new label every time.
+COUNTED_OPCODES = frozenset((Opcode.EQ, Opcode.GT, Opcode.LT, Opcode.CALL))
+
+
+def rom_size(program: str) -> int:
+    """Returns the number of instructions of an assembly program."""
+    return sum(1 for line in program.splitlines()
+               if line and not line.startswith(("//", "(")))
 
-class CodeWriter:
-    """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
-        """Initializes the CodeWriter.
+class CodeWriter:
+    """Translates VM commands into Hack assembly code.
+
+    The translation of every command is a precompiled template formatted
+    with its arguments. The output is kept in memory and written to the
+    output stream with a single write by flush(), which must be called once
+    everything was translated.
+    """
+
+    def __init__(self, output_stream: typing.TextIO,
+                 shared_compare: bool = False,
+                 trampolines: bool = False,
+                 stack_caching: bool = False,
+                 superinstructions: bool = False) -> None:
+        """Initializes the CodeWriter. The shared routines used by the modes
+        below are written by flush() after the program.
 
         Args:
             output_stream (typing.TextIO): output stream.
+            shared_compare (bool): translate eq, gt and lt to calls of a
+                shared routine per comparison, instead of inlining each one.
+            trampolines (bool): translate call and return to jumps to shared
+                routines that save and restore the frame.
+            stack_caching (bool): keep the top of the stack in D between
+                commands when possible, instead of in memory.
+            superinstructions (bool): translate the sequences of commands in
+                Superinstructions.SUPERINSTRUCTIONS together. How many times
+                each one was used is counted in self.superinstruction_hits.
         """
         self.__output_stream = output_stream
+        self.__output = []
+        self.__shared_compare = shared_compare
+        self.__trampolines = trampolines
+        self.__stack_caching = stack_caching
+        self.__cached = False
+        self.__superinstructions = superinstructions
+        self.superinstruction_hits = dict.fromkeys(
+            (superinstruction.name for superinstruction in SUPERINSTRUCTIONS),
+            0)
+        self.__routines_used = set()
+        self.__routines_written = set()
         self.__filename = ''
         self.__compare_num = 0
         self.__return_num = 1
 
     def set_file_name(self, filename: str) -> None:
-        """Informs the code writer that the translation of a new VM file is 
-        started.
+        """Informs the code writer that the translation of a new VM file is
+        started. The counters of comparisons and return labels, which are
+        prefixed by the name of the file, start over.
 
         Args:
             filename (str): The name of the VM file.
         """
-        # Your code goes here!
-        # This function is useful when translating code that handles the
-        # static segment.
-        # To avoid problems with Linux/Windows/MacOS differences with regards
-        # to filenames and paths, you are advised to parse the filename in
-        # the function "translate_file" in Main.py using python's os library,
-        # For example, using code similar to:
-        # input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
         self.__filename = filename
+        self.__compare_num = 0
+        self.__return_num = 1
 
-    def __write_lines_with_separator(self, lines):
-        self.__output_stream.writelines((l + '\n' for l in lines))
+    def flush(self, routines: bool = True) -> None:
+        """Writes everything translated so far to the output stream, followed
+        by the shared routines it uses that were not written yet.
+
+        Args:
+            routines (bool): whether to write the shared routines. They are
+                left out of translations that are later merged by
+                write_translation.
+        """
+        if routines:
+            for label, routine in ROUTINES.items():
+                if label in self.__routines_used and \
+                        label not in self.__routines_written:
+                    self.__output.append(routine)
+            self.__routines_written |= self.__routines_used
+        self.__output_stream.write("".join(self.__output))
+        self.__output.clear()
+
+    @property
+    def routines_used(self) -> typing.FrozenSet[str]:
+        """The labels of the shared routines the translation jumps to."""
+        return frozenset(self.__routines_used)
+
+    def write_translation(self, translation: str,
+                          routines_used: typing.Iterable[str]) -> None:
+        """Writes code that was translated by another CodeWriter and flushed
+        without its shared routines.
+
+        Args:
+            translation (str): the code.
+            routines_used (typing.Iterable[str]): the routines_used of the
+                other CodeWriter.
+        """
+        self.__output.append(translation)
+        self.__routines_used.update(routines_used)
+
+    def write_commands(self, commands: Commands) -> None:
+        """Writes the translation of all the commands of a file, each one
+        preceded by a comment with the command. Commands that do not use the
+        counters of labels are translated once per file and stack cache
+        state.
+
+        Args:
+            commands (Commands): the parsed file.
+        """
+        if self.__superinstructions:
+            self.__write_fused_commands(commands)
+            return
+        append = self.__output.append
+        symbols = commands.symbols
+        translations = {}
+        for command in zip(commands.opcodes, commands.arg1, commands.arg2):
+            key = command, self.__cached
+            known = translations.get(key)
+            if known is None:
+                translation = self.__translate(*command, symbols)
+                if command[0] not in COUNTED_OPCODES:
+                    translations[key] = translation, self.__cached
+            else:
+                translation, self.__cached = known
+            append(translation)
+
+    def __write_fused_commands(self, commands: Commands) -> None:
+        """Like write_commands, translating superinstructions together."""
+        append = self.__output.append
+        opcodes, arg1, arg2 = commands.opcodes, commands.arg1, commands.arg2
+        index = 0
+        while index < len(opcodes):
+            superinstruction = match(commands, index)
+            if superinstruction is None:
+                append(self.__translate(opcodes[index], arg1[index],
+                                        arg2[index], commands.symbols))
+                index += 1
+                continue
+            end = index + len(superinstruction.opcodes)
+            append("".join(f"//{commands.text(command)}\n"
+                           for command in range(index, end)))
+            append(self.__spill())
+            append(superinstruction.generate(
+                commands, index, self.__filename))
+            self.superinstruction_hits[superinstruction.name] += 1
+            index = end
+
+    def __translate(self, opcode: int, arg1: int, arg2: int,
+                    symbols: typing.List[str]) -> str:
+        """Returns the commented translation of a single command."""
+        if opcode == Opcode.PUSH:
+            return f"//push {SEGMENTS[arg1]} {arg2}\n" + \
+                self.__push(arg1, arg2)
+        if opcode == Opcode.POP:
+            return f"//pop {SEGMENTS[arg1]} {arg2}\n" + self.__pop(arg1, arg2)
+        if opcode <= Opcode.SHIFTRIGHT:
+            return f"//{MNEMONICS[opcode]}\n" + self.__arithmetic(opcode)
+        if opcode == Opcode.RETURN:
+            return "//return\n" + self.__return()
+        comment = f"//{MNEMONICS[opcode]} {symbols[arg1]}"
+        if opcode == Opcode.FUNCTION:
+            return f"{comment} {arg2}\n" + \
+                self.__function(symbols[arg1], arg2)
+        if opcode == Opcode.CALL:
+            return f"{comment} {arg2}\n" + self.__call(symbols[arg1], arg2)
+        return f"{comment}\n" + self.__branch(opcode, symbols[arg1])
 
     def write_arithmetic(self, command: str) -> None:
-        """Writes assembly code that is the translation of the given 
+        """Writes assembly code that is the translation of the given
         arithmetic command. For the commands eq, lt, gt, you should correctly
         compare between all numbers our computer supports, and we define the
         value "true" to be -1, and "false" to be 0.
@@ -71,134 +536,42 @@ class CodeWriter:
         Args:
             command (str): an arithmetic command.
         """
-        if command in ("add", "sub", "and", "or"):
-            self.__write_two_arg(command)
-        elif command in ("neg", "not"):
-            self.__write_one_arg(command)
-        else:
-            self.__write_compare(command)
-    
-    def __write_two_arg(self, operator):
-        op_line = {'add': 'M+D', 'sub': 'M-D', 'and': 'M&D', 'or': 'M|D'}
-        """Writes instructions for the add command
-        """        
-        lines = [
-            "@SP",
-            "A=M-1",
-            "D=M",
-            "A=A-1",
-            f"D={op_line[operator]}"
-        ] + POP_2_AND_PUSH_D
-        self.__write_lines_with_separator(lines)
-
-    def __write_one_arg(self, operator):
-        op_line = {'not': '!M', 'neg': '-M'}
-        lines = [
-            "@SP",
-            "A=M-1",
-            f"M={op_line[operator]}"
-        ]
-        self.__write_lines_with_separator(lines)
-
-    def __write_compare(self, comparison: str):
-        comparison = comparison.upper() # Return EQ, LT, GT
-        self.__write_compare_start()
-        self.__write_compare_same_sign(comparison)
-        self.__write_compare_different_sign(comparison)
-        self.__write_compare_end()
+        self.__output.append(self.__arithmetic(KEYWORDS[command]))
+
+    def __arithmetic(self, opcode: int) -> str:
+        template = ARITHMETIC_TEMPLATES[opcode]
+        if opcode not in (Opcode.EQ, Opcode.GT, Opcode.LT):
+            if not self.__stack_caching:
+                return template
+            templates = CACHED_ARITHMETIC_TEMPLATES if self.__cached \
+                else UNCACHED_ARITHMETIC_TEMPLATES
+            self.__cached = True
+            return templates[opcode]
+        spill = self.__spill()
+        number = self.__compare_num
         self.__compare_num += 1
-
-    def __write_compare_start(self):
-        lines = [
-            f"// Comparison {self.__filename}.{self.__compare_num} start",
-            "// Check x >= 0",
-            "@SP",
-            "A=M-1",
-            "A=A-1",
-            "D=M",
-            f"@CMP_{self.__filename}.{self.__compare_num}_X_NEG",
-            "D;JLT",
-            "// If here than x >= 0, check y >= 0",
-            "@SP",
-            "A=M-1",
-            "D=M",
-            f"@CMP_{self.__filename}.{self.__compare_num}_Y_NEG_X_POS",
-            "D;JLT",
-            "// If here than x >= 0 and y >= 0, goto same sign",
-            f"@CMP_{self.__filename}.{self.__compare_num}_SAME_SIGN",
-            "0;JMP",
-            f"(CMP_{self.__filename}.{self.__compare_num}_X_NEG)",
-            "// If here than x < 0, check y < 0",
-            "@SP",
-            "A=M-1",
-            "D=M",
-            f"@CMP_{self.__filename}.{self.__compare_num}_Y_POS_X_NEG",
-            "D;JGE",
-            "// If here than x < 0 and y < 0, goto same sign",
-            f"@CMP_{self.__filename}.{self.__compare_num}_SAME_SIGN",
-            "0;JMP",   
-        ]
-        self.__write_lines_with_separator(lines)
-
-    def __write_compare_end(self):
-        lines = [
-            f"(CMP_{self.__filename}.{self.__compare_num}_FALSE)",
-            f"D={FALSE}",
-            f"@CMP_{self.__filename}.{self.__compare_num}_END",
-            "0;JMP",
-            f"(CMP_{self.__filename}.{self.__compare_num}_TRUE)",
-            f"D={TRUE}",
-            f"(CMP_{self.__filename}.{self.__compare_num}_END)"
-        ] + POP_2_AND_PUSH_D
-        self.__write_lines_with_separator(lines)
-        
-
-    def __write_compare_same_sign(self, comparison: str):
-        lines = [
-            f"(CMP_{self.__filename}.{self.__compare_num}_SAME_SIGN)",
-            "@SP",
-            "A=M-1",
-            "D=M",
-            "A=A-1",
-            "D=M-D",
-            f"@CMP_{self.__filename}.{self.__compare_num}_TRUE",
-            f"D;J{comparison}",
-            f"// Comparison {self.__filename}.{self.__compare_num} same sign false",
-            f"@CMP_{self.__filename}.{self.__compare_num}_FALSE",
-            "0;JMP"
-        ]
-        self.__write_lines_with_separator(lines)
-    
-    def __write_compare_different_sign(self, comparison: str):
-        lines = [
-            f"(CMP_{self.__filename}.{self.__compare_num}_Y_NEG_X_POS)",
-            "// Here x >= 0 and y < 0, which means x > y,  therefore TRUE iff checking gt",
-            f"@CMP_{self.__filename}.{self.__compare_num}_TRUE",
-            f"{'0' if comparison == 'GT' else '1'};JEQ",
-            f"@CMP_{self.__filename}.{self.__compare_num}_FALSE",
-            "0;JMP",
-            f"(CMP_{self.__filename}.{self.__compare_num}_Y_POS_X_NEG)",
-            "// Here x < 0 and y >= 0, which means x < y,  therefore TRUE iff checking lt",
-            f"@CMP_{self.__filename}.{self.__compare_num}_TRUE",
-            f"{'0' if comparison == 'LT' else '1'};JEQ",
-            f"@CMP_{self.__filename}.{self.__compare_num}_FALSE",
-            "0;JMP",
-            
-        ]
-        self.__write_lines_with_separator(lines)
+        if self.__shared_compare:
+            self.__routines_used.add(SHARED_COMPARE_LABELS[opcode])
+            return spill + SHARED_COMPARE_TEMPLATE.format(
+                f"{self.__filename}$cmp.{number}",
+                SHARED_COMPARE_LABELS[opcode])
+        return spill + template.format(f"{self.__filename}.{number}")
+
+    def __spill(self) -> str:
+        """Returns the code that moves the top of the stack from D to memory
+        if it is cached in D."""
+        if not self.__cached:
+            return ""
+        self.__cached = False
+        return SPILL_TEMPLATE
 
     def write_bootstrap(self):
-        self.__write_lines_with_separator([
-            "// SP = 256",
-            "@256",
-            "D=A",
-            "@SP",
-            "M=D"
-        ])
+        """Writes the code that sets SP to 256 and calls Sys.init."""
+        self.__output.append(BOOTSTRAP_TEMPLATE)
         self.write_call("Sys.init", 0)
 
     def write_push_pop(self, command: str, segment: str, index: int) -> None:
-        """Writes assembly code that is the translation of the given 
+        """Writes assembly code that is the translation of the given
         command, where command is either C_PUSH or C_POP.
 
         Args:
@@ -206,104 +579,60 @@ class CodeWriter:
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
         """
-        # Your code goes here!
-        # Note: each reference to static i appearing in the file Xxx.vm should
-        # be translated to the assembly symbol "Xxx.i". In the subsequent
-        # assembly process, the Hack assembler will allocate these symbolic
-        # variables to the RAM, starting at address 16.
         if command == C_PUSH:
-            self.__write_push(segment, index)
+            self.__output.append(self.__push(SEGMENT_NUMBERS[segment], index))
         elif command == C_POP:
-            self.__write_pop(segment, index)
-
-    def __write_push(self, segment: str, index: int):
-        lines = []
-        if segment == CONST:
-            lines = [
-                f"@{index}",
-                "D=A"
-                ]
-        elif segment == POINTER:
-            ptr = "THIS" if index == 0 else "THAT"
-            lines = [
-                f"@{ptr}",
-                "D=M"
-            ]
-        elif segment == STATIC:
-            lines = [
-                f"@{self.__filename}.{index}",
-                "D=M"
-            ]
-        elif segment == TEMP:
-            lines = [
-                f"@{5 + index}",
-                "D=M"
-            ]
-        else:
-            lines = [
-                f"@{index}",
-                "D=A",
-                f"@{REAL_SEGMENTS[segment]}",
-                "A=D+M",
-                "D=M"
-            ]
-        lines.extend([
-            "@SP",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M+1"
-        ])
-        self.__write_lines_with_separator(lines)
-
-    def __write_pop(self, segment: str, index: int):
-        if segment in REAL_SEGMENTS:
-            self.__write_pop_dynamic_segments(segment, index)
-        else:
-            self.__write_pop_non_dynamic_segments(segment, index)
-
-    def __write_pop_non_dynamic_segments(self, segment: str, index: int):
-        lines = [
-            "// Non Dynamic pop",
-            "@SP",
-            "A=M-1",
-            "D=M",
-        ]
-        if segment == POINTER:
-            ptr = "THIS" if index == 0 else "THAT"
-            lines.append(f"@{ptr}")
-        elif segment == STATIC:
-            lines.append(f"@{self.__filename}.{index}")
-        elif segment == TEMP:
-            lines.append(f"@{5 + index}")
-        lines.extend([
-            "M=D",
-            "@SP",
-            "M=M-1"])
-        self.__write_lines_with_separator(lines)
-
-    def __write_pop_dynamic_segments(self, segment: str, index: int):
-        lines = [
-            "// Dynamic pop",
-            f"@{index}",
-            "D=A",
-            f"@{REAL_SEGMENTS[segment]}",
-            "D=D+M",
-            "@R13", # Temporarily store requested address
-            "M=D",
-            "@SP",
-            "A=M-1",
-            "D=M",
-            "@R13",
-            "A=M",
-            "M=D",
-            "@SP",
-            "M=M-1"
-        ]
-        self.__write_lines_with_separator(lines)
+            self.__output.append(self.__pop(SEGMENT_NUMBERS[segment], index))
+
+    def __push(self, segment: int, index: int) -> str:
+        if self.__stack_caching:
+            spill = self.__spill()
+            self.__cached = True
+            return spill + self.__load(segment, index)
+        if segment == CONSTANT_SEGMENT:
+            return PUSH_CONSTANT.format(index)
+        base = BASES.get(segment)
+        if base is not None:
+            return PUSH_DYNAMIC.format(index, base)
+        return PUSH_FIXED.format(self.__address(segment, index))
+
+    def __load(self, segment: int, index: int) -> str:
+        """Returns the code that loads a variable or a constant into D."""
+        if segment == CONSTANT_SEGMENT:
+            return LOAD_SMALL_CONSTANTS.get(index) or \
+                LOAD_CONSTANT.format(index)
+        base = BASES.get(segment)
+        if base is not None:
+            return LOAD_DYNAMIC.format(index, base)
+        return LOAD_FIXED.format(self.__address(segment, index))
+
+    def __pop(self, segment: int, index: int) -> str:
+        if segment == CONSTANT_SEGMENT:
+            raise ValueError("Cannot pop into the constant segment")
+        base = BASES.get(segment)
+        if self.__stack_caching:
+            load = "" if self.__cached else LOAD_TOP
+            self.__cached = False
+            if base is None:
+                return load + STORE_FIXED.format(
+                    self.__address(segment, index))
+            if index <= STORE_NEAR_LIMIT:
+                return load + STORE_NEAR.format(base, "A=A+1\n" * index)
+            return load + STORE_DYNAMIC.format(index, base)
+        if base is not None:
+            return POP_DYNAMIC.format(index, base)
+        return POP_FIXED.format(self.__address(segment, index))
+
+    def __address(self, segment: int, index: int) -> str:
+        """The symbol or address of a pointer, static or temp variable."""
+        if segment == POINTER_SEGMENT:
+            return "THIS" if index == 0 else "THAT"
+        if segment == STATIC_SEGMENT:
+            return f"{self.__filename}.{index}"
+        return str(5 + index)
 
     def write_label(self, label: str) -> None:
-        """Writes assembly code that affects the label command. 
+        """Writes assembly code that affects the label command.
         Let "foo" be a function within the file Xxx.vm. The handling of
         each "label bar" command within "foo" generates and injects the symbol
         "Xxx.foo$bar" into the assembly code stream.
@@ -313,60 +642,62 @@ class CodeWriter:
         Args:
             label (str): the label to write.
         """
-        self.__write_lines_with_separator([f"({self.__filename}${label})"])
-    
+        self.__output.append(self.__branch(Opcode.LABEL, label))
+
     def write_goto(self, label: str) -> None:
         """Writes assembly code that affects the goto command.
 
         Args:
             label (str): the label to go to.
         """
-        self.__write_lines_with_separator([
-            f"@{self.__filename}${label}",
-            "0;JMP"
-        ])
-    
+        self.__output.append(self.__branch(Opcode.GOTO, label))
+
     def write_if(self, label: str) -> None:
-        """Writes assembly code that affects the if-goto command. 
+        """Writes assembly code that affects the if-goto command.
 
         Args:
             label (str): the label to go to.
         """
-        self.__write_lines_with_separator([
-            "@SP",
-            "M=M-1",
-            "A=M",
-            "D=M",
-            f"@{self.__filename}${label}",
-            "D;JNE"
-        ])
-    
+        self.__output.append(self.__branch(Opcode.IF_GOTO, label))
+
+    def __branch(self, opcode: int, label: str) -> str:
+        if opcode == Opcode.IF_GOTO and self.__stack_caching:
+            load = "" if self.__cached else LOAD_TOP
+            self.__cached = False
+            return load + CACHED_IF_TEMPLATE.format(self.__filename, label)
+        template = LABEL_TEMPLATE if opcode == Opcode.LABEL else \
+            GOTO_TEMPLATE if opcode == Opcode.GOTO else IF_TEMPLATE
+        return self.__spill() + template.format(self.__filename, label)
+
     def write_function(self, function_name: str, n_vars: int) -> None:
-        """Writes assembly code that affects the function command. 
+        """Writes assembly code that affects the function command.
         The handling of each "function foo" command within the file Xxx.vm
         generates and injects a symbol "Xxx.foo" into the assembly code stream,
         that labels the entry-point to the function's code.
-        In the subsequent assembly process, the assembler translates this 
+        In the subsequent assembly process, the assembler translates this
         symbol into the physical address where the function code starts.
 
         Args:
             function_name (str): the name of the function.
             n_vars (int): the number of local variables of the function.
         """
-        label = f"({function_name})" if function_name.startswith(f"{self.__filename}.") else f"({self.__filename}.{function_name})"
-        self.__write_lines_with_separator([label])
-        for _ in range(n_vars):
-            self.__write_push("constant", 0)
+        self.__output.append(self.__function(function_name, n_vars))
+
+    def __function(self, function_name: str, n_vars: int) -> str:
+        if function_name.startswith(f"{self.__filename}."):
+            label = f"({function_name})\n"
+        else:
+            label = f"({self.__filename}.{function_name})\n"
+        return self.__spill() + label + PUSH_ZERO * n_vars
 
-    
     def write_call(self, function_name: str, n_args: int) -> None:
-        """Writes assembly code that affects the call command. 
+        """Writes assembly code that affects the call command.
         Let "foo" be a function within the file Xxx.vm.
         The handling of each "call" command within foo's code generates and
         injects a symbol "Xxx.foo$ret.i" into the assembly code stream, where
         "i" is a running integer (one such symbol is generated for each "call"
         command within "foo").
-        This symbol is used to mark the return address within the caller's 
+        This symbol is used to mark the return address within the caller's
         code. In the subsequent assembly process, the assembler translates this
         symbol into the physical memory address of the command immediately
         following the "call" command.
@@ -375,105 +706,26 @@ class CodeWriter:
             function_name (str): the name of the function to call.
             n_args (int): the number of arguments of the function.
         """
+        self.__output.append(self.__call(function_name, n_args))
+
+    def __call(self, function_name: str, n_args: int) -> str:
+        spill = self.__spill()
         return_label = f"{self.__filename}$ret.{self.__return_num}"
         self.__return_num += 1
-        
-        def __push_label(ptr: str):
-            self.__write_lines_with_separator([
-                f"// push {ptr}",
-                f"@{ptr}",
-                "D=M",
-                "@SP",
-                "A=M",
-                "M=D",
-                "@SP",
-                "M=M+1"
-            ])
-        
-        self.__write_lines_with_separator([
-                f"// push return_addr",
-                f"@{return_label}",
-                "D=A",
-                "@SP",
-                "A=M",
-                "M=D",
-                "@SP",
-                "M=M+1"
-        ])
-        __push_label("LCL")
-        __push_label("ARG")
-        __push_label("THIS")
-        __push_label("THAT")
-        self.__write_lines_with_separator([
-                "// ARG = SP - 5 - n_args",
-                f"@{5 + n_args}",
-                "D=A",
-                "@SP",
-                "D=M-D",
-                "@ARG",
-                "M=D",
-                "// LCL = SP",
-                "@SP",
-                "D=M",
-                "@LCL",
-                "M=D",
-                f"// goto {function_name}",
-                f"@{function_name}",
-                "0;JMP",
-                f"({return_label})"
-            ])
-
-    
+        if self.__trampolines:
+            self.__routines_used.add(CALL_ROUTINE)
+            return spill + TRAMPOLINE_CALL_TEMPLATE.format(
+                return_label, 5 + n_args, function_name)
+        return spill + CALL_TEMPLATE.format(
+            return_label, 5 + n_args, function_name)
+
     def write_return(self) -> None:
         """Writes assembly code that affects the return command."""
-        ENDFRAME = "R13"
-        RET_ADDR = "R14"
-        def __restore_label_from_endframe(label: str, distance: int):
-            self.__write_lines_with_separator([
-                f"// {label} = *(ENDFRAME - {distance})",
-                f"@{distance}",
-                "D=A",
-                f"@{ENDFRAME}",
-                "A=M-D",
-                "D=M",
-                f"@{label}",
-                "M=D"
-            ])
-
-        self.__write_lines_with_separator([
-            "// ENDFRAME = LCL",
-            "@LCL",
-            "D=M",
-            f"@{ENDFRAME}",
-            "M=D",
-            "// RET_ADDR = *(ENDFRAME - 5)",
-            f"@5",
-            "D=A",
-            f"@{ENDFRAME}",
-            "A=M-D",
-            "D=M",
-            f"@{RET_ADDR}",
-            "M=D",
-            "// *ARG = pop()",
-            "@SP",
-            "A=M-1",
-            "D=M",
-            "@ARG",
-            "A=M",
-            "M=D",
-            "// SP = ARG + 1",
-            "@ARG",
-            "D=M",
-            "@SP",
-            "M=D+1",
-        ])
-        __restore_label_from_endframe("THAT", 1)
-        __restore_label_from_endframe("THIS", 2)
-        __restore_label_from_endframe("ARG", 3)
-        __restore_label_from_endframe("LCL", 4)
-        self.__write_lines_with_separator([
-            "// goto *(RET_ADDR - 5)",
-            f"@{RET_ADDR}",
-            "A=M",
-            "0;JMP"
-        ])
\ No newline at end of file
+        self.__output.append(self.__return())
+
+    def __return(self) -> str:
+        spill = self.__spill()
+        if self.__trampolines:
+            self.__routines_used.add(RETURN_ROUTINE)
+            return spill + TRAMPOLINE_RETURN_TEMPLATE
+        return spill + RETURN_TEMPLATE
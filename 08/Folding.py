@@ -0,0 +1,234 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Parser import Commands, Opcode, NO_ARGUMENT, SEGMENT_NUMBERS
+from CallGraph import Function, split_functions
+
+CONSTANT_SEGMENT = SEGMENT_NUMBERS["constant"]
+MAX_CONSTANT = 32767
+MIN_CONSTANT = -MAX_CONSTANT - 1
+MULTIPLY = "Math.multiply"
+DIVIDE = "Math.divide"
+
+
+def wrap(value: int) -> int:
+    """Wraps an integer into the signed 16-bit range."""
+    return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+
+def divide(x: int, y: int) -> typing.Optional[int]:
+    """The integer part of x / y, as Math.divide computes it, or None when
+    it is not folded: Math.divide never returns for y = 0, and it negates
+    its operands, which leaves -32768 as it is.
+    """
+    if y == 0 or MIN_CONSTANT in (x, y):
+        return None
+    quotient = abs(x) // abs(y)
+    return wrap(-quotient if (x < 0) != (y < 0) else quotient)
+
+
+# The values of the commands that take their operands from the stack, as
+# functions of the operands, and of the calls to Math that can be folded.
+BINARY_FUNCTIONS = {
+    Opcode.ADD: lambda x, y: wrap(x + y),
+    Opcode.SUB: lambda x, y: wrap(x - y),
+    Opcode.AND: lambda x, y: x & y,
+    Opcode.OR: lambda x, y: x | y,
+    Opcode.EQ: lambda x, y: -(x == y),
+    Opcode.GT: lambda x, y: -(x > y),
+    Opcode.LT: lambda x, y: -(x < y),
+}
+UNARY_FUNCTIONS = {
+    Opcode.NEG: lambda x: wrap(-x),
+    Opcode.NOT: lambda x: ~x,
+    Opcode.SHIFTLEFT: lambda x: wrap(x << 1),
+    Opcode.SHIFTRIGHT: lambda x: x >> 1,
+}
+CALL_FUNCTIONS = {
+    MULTIPLY: lambda x, y: wrap(x * y),
+    DIVIDE: divide,
+}
+# x op c == x for these constants c.
+IDENTITIES = {Opcode.ADD: 0, Opcode.SUB: 0, Opcode.OR: 0, Opcode.AND: -1}
+
+Command = typing.Tuple[int, int, int]
+
+
+def constant_commands(value: int) -> typing.List[Command]:
+    """Returns the commands that push a constant, which may be negative."""
+    if 0 <= value <= MAX_CONSTANT:
+        return [(Opcode.PUSH, CONSTANT_SEGMENT, value)]
+    if value == MIN_CONSTANT:
+        return [(Opcode.PUSH, CONSTANT_SEGMENT, MAX_CONSTANT),
+                (Opcode.NOT, NO_ARGUMENT, NO_ARGUMENT)]
+    return [(Opcode.PUSH, CONSTANT_SEGMENT, -value),
+            (Opcode.NEG, NO_ARGUMENT, NO_ARGUMENT)]
+
+
+def power_of_two(value: typing.Optional[int]) -> typing.Optional[int]:
+    """Returns k if value is 2 ** k, None otherwise."""
+    if value is None or value <= 0 or value & (value - 1):
+        return None
+    return value.bit_length() - 1
+
+
+def fold_binary(items: typing.List[Command],
+                values: typing.List[typing.Optional[int]],
+                opcode: int) -> bool:
+    """Folds a binary command into the items, if possible."""
+    if len(values) < 2 or values[-1] is None:
+        return False
+    if values[-2] is not None:
+        y = values.pop()
+        items.pop()
+        values[-1] = BINARY_FUNCTIONS[opcode](values[-1], y)
+        return True
+    if IDENTITIES.get(opcode, None) == values[-1]:
+        items.pop()
+        values.pop()
+        return True
+    return False
+
+
+def fold_call(items: typing.List[Command],
+              values: typing.List[typing.Optional[int]],
+              function: str) -> bool:
+    """Folds a call to Math.multiply or Math.divide into the items, if
+    possible."""
+    if function not in CALL_FUNCTIONS or len(values) < 2:
+        return False
+    x, y = values[-2], values[-1]
+    if x is not None and y is not None:
+        value = CALL_FUNCTIONS[function](x, y)
+        if value is None:
+            return False
+        items.pop()
+        values.pop()
+        values[-1] = value
+        return True
+    if function != MULTIPLY:
+        return False
+    if y is None:
+        # 2 ** k * x is x * 2 ** k, if x can be moved before the constant.
+        if x is None or items[-1][0] != Opcode.PUSH or \
+                (x != 0 and power_of_two(x) is None):
+            return False
+        items[-2], items[-1] = items[-1], items[-2]
+        values[-2], values[-1] = values[-1], values[-2]
+        y = x
+    if y == 0 and items[-2][0] == Opcode.PUSH:
+        items.pop()
+        values.pop()
+        values[-1] = 0
+        return True
+    shifts = power_of_two(y)
+    if shifts is None:
+        return False
+    items.pop()
+    values.pop()
+    items.extend([(Opcode.SHIFTLEFT, NO_ARGUMENT, NO_ARGUMENT)] * shifts)
+    values.extend([None] * shifts)
+    return True
+
+
+def fold(commands: Commands) -> Commands:
+    """Folds constant expressions in the commands of a file, and replaces
+    multiplications by powers of two with shifts.
+
+    The commands are simulated at translation time: every output item is
+    either a command or a constant pushed on the stack. Since a label is an
+    item that is not a constant, nothing is folded across a label. The rules
+    are:
+    - unary and binary commands, and calls to Math.multiply and Math.divide,
+      whose operands are constants become a constant;
+    - x + 0, x - 0, x | 0 and x & -1 become x;
+    - x * 2 ** k and 2 ** k * x become x followed by k shiftleft commands,
+      and x * 0 becomes 0 when x is a push;
+    - not, not is removed;
+    - if-goto after a constant becomes goto, or nothing.
+    Division by powers of two is left to Math.divide: it truncates towards
+    zero, while shiftright rounds towards minus infinity.
+
+    Args:
+        commands (Commands): the parsed file.
+
+    Returns:
+        Commands: the folded commands, which share the symbols of the
+        parsed file.
+    """
+    symbols = commands.symbols
+    items = []
+    values = []
+    for command in zip(commands.opcodes, commands.arg1, commands.arg2):
+        opcode, arg1, arg2 = command
+        if opcode == Opcode.PUSH and arg1 == CONSTANT_SEGMENT:
+            items.append(command)
+            values.append(arg2)
+        elif opcode in UNARY_FUNCTIONS and values and \
+                values[-1] is not None:
+            values[-1] = UNARY_FUNCTIONS[opcode](values[-1])
+        elif opcode == Opcode.NOT and items and values[-1] is None and \
+                items[-1][0] == Opcode.NOT:
+            items.pop()
+            values.pop()
+        elif opcode in BINARY_FUNCTIONS and \
+                fold_binary(items, values, opcode):
+            pass
+        elif opcode == Opcode.CALL and arg2 == 2 and \
+                fold_call(items, values, symbols[arg1]):
+            pass
+        elif opcode == Opcode.IF_GOTO and values and \
+                values[-1] is not None:
+            condition = values.pop()
+            items.pop()
+            if condition:
+                items.append((Opcode.GOTO, arg1, NO_ARGUMENT))
+                values.append(None)
+        else:
+            items.append(command)
+            values.append(None)
+
+    folded = Commands()
+    folded.symbols = symbols
+    for command, value in zip(items, values):
+        for opcode, arg1, arg2 in (
+                [command] if value is None else constant_commands(value)):
+            folded.opcodes.append(opcode)
+            folded.arg1.append(arg1)
+            folded.arg2.append(arg2)
+    return folded
+
+
+def fold_constants(files: typing.List[typing.Tuple[str, Commands]]) \
+        -> typing.Tuple[typing.List[typing.Tuple[str, Commands]],
+                        typing.List[typing.Tuple[Function, Commands,
+                                                 Commands]]]:
+    """Folds the constant expressions of every file of a program.
+
+    Args:
+        files (typing.List[typing.Tuple[str, Commands]]): the name and the
+            commands of every file of the program.
+
+    Returns:
+        typing.Tuple[typing.List[typing.Tuple[str, Commands]],
+        typing.List[typing.Tuple[Function, Commands, Commands]]]: the folded
+        files, and every function that changed with its commands before and
+        after folding.
+    """
+    folded_files, changed = [], []
+    for filename, commands in files:
+        folded = fold(commands)
+        folded_files.append((filename, folded))
+        # Function commands are never folded, so the functions match.
+        for before, after in zip(split_functions(filename, commands),
+                                 split_functions(filename, folded)):
+            if before.end - before.start != after.end - after.start:
+                changed.append((before, commands.extract(
+                    [(before.start, before.end)]), folded.extract(
+                    [(after.start, after.end)])))
+    return folded_files, changed
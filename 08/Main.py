@@ -4,14 +4,25 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import concurrent.futures
+import io
 import os
-import sys
 import typing
 
 
-from Parser import C_POP, C_PUSH, C_ARITHMETIC, C_LABEL, C_GOTO, C_IF, C_FUNCTION, C_RETURN, C_CALL
-from Parser import Parser
-from CodeWriter import CodeWriter
+from Parser import Commands, parse_commands
+from CodeWriter import CodeWriter, rom_size
+from CallGraph import remove_dead_functions
+from Folding import fold_constants
+
+VM_EXTENSION = ".vm"
+
+
+def file_name(path: str) -> str:
+    """Returns the name of a .vm file without its directory and extension,
+    which prefixes its static variables and labels."""
+    return os.path.splitext(os.path.basename(path))[0]
 
 
 def translate_file(
@@ -25,47 +36,159 @@ def translate_file(
         bootstrap (bool): if this is True, the current file is the 
             first file we are translating.
     """
-    p = Parser(input_file)
     cw = CodeWriter(output_file)
-    cw.set_file_name(os.path.splitext(os.path.basename(input_file.name))[0])
+    cw.set_file_name(file_name(input_file.name))
+    if bootstrap:
+        cw.write_bootstrap()
+    cw.write_commands(parse_commands(input_file))
+    cw.flush()
+
+
+def translate_files(
+        input_paths: typing.List[str], output_file: typing.TextIO,
+        **options: bool) -> CodeWriter:
+    """Translates the given .vm files into a single program, which starts
+    with the bootstrap code. Every file is parsed once, and the whole
+    program is written to the output file at once.
+
+    Args:
+        input_paths (typing.List[str]): the files to translate.
+        output_file (typing.TextIO): writes all output to this file.
+        options (bool): the translation modes of the CodeWriter.
+
+    Returns:
+        CodeWriter: the writer, with the statistics of the translation.
+    """
+    return write_program(parse_files(input_paths), output_file, **options)
+
+
+def parse_files(input_paths: typing.List[str]) \
+        -> typing.List[typing.Tuple[str, Commands]]:
+    """Parses the given .vm files.
+
+    Args:
+        input_paths (typing.List[str]): the files to parse.
+
+    Returns:
+        typing.List[typing.Tuple[str, Commands]]: the name and the commands
+        of every file.
+    """
+    files = []
+    for input_path in input_paths:
+        with open(input_path, 'r') as input_file:
+            files.append((file_name(input_path), parse_commands(input_file)))
+    return files
+
+
+def write_program(files: typing.List[typing.Tuple[str, Commands]],
+                  output_file: typing.TextIO, **options: bool) -> CodeWriter:
+    """Translates parsed files into a single program, which starts with the
+    bootstrap code.
+
+    Args:
+        files (typing.List[typing.Tuple[str, Commands]]): the name and the
+            commands of every file.
+        output_file (typing.TextIO): writes all output to this file.
+        options (bool): the translation modes of the CodeWriter.
+
+    Returns:
+        CodeWriter: the writer, with the statistics of the translation.
+    """
+    cw = CodeWriter(output_file, **options)
+    for index, (name, commands) in enumerate(files):
+        cw.set_file_name(name)
+        if index == 0:
+            cw.write_bootstrap()
+        cw.write_commands(commands)
+    cw.flush()
+    return cw
+
+
+def code_size(name: str, commands: Commands, **options: bool) -> int:
+    """Returns the number of instructions commands of a file translate to,
+    without the shared routines they use.
 
+    Args:
+        name (str): the name of the file.
+        commands (Commands): the commands.
+        options (bool): the translation modes of the CodeWriter.
+    """
+    output_file = io.StringIO()
+    cw = CodeWriter(output_file, **options)
+    cw.set_file_name(name)
+    cw.write_commands(commands)
+    cw.flush(routines=False)
+    return rom_size(output_file.getvalue())
+
+
+def translate_path(input_path: str, bootstrap: bool, options: typing.Dict[
+        str, bool]) -> typing.Tuple[str, typing.FrozenSet[str],
+                                    typing.Dict[str, int]]:
+    """Translates a single file in isolation, e.g. in a worker process.
+
+    Args:
+        input_path (str): the file to translate.
+        bootstrap (bool): whether to start with the bootstrap code.
+        options (typing.Dict[str, bool]): the translation modes of the
+            CodeWriter.
+
+    Returns:
+        typing.Tuple[str, typing.FrozenSet[str], typing.Dict[str, int]]: the
+        code, without the shared routines, the labels of the routines it
+        uses, and the superinstruction_hits of the translation.
+    """
+    output_file = io.StringIO()
+    cw = CodeWriter(output_file, **options)
+    with open(input_path, 'r') as input_file:
+        commands = parse_commands(input_file)
+    cw.set_file_name(file_name(input_path))
     if bootstrap:
-        pass
         cw.write_bootstrap()
+    cw.write_commands(commands)
+    cw.flush(routines=False)
+    return output_file.getvalue(), cw.routines_used, \
+        cw.superinstruction_hits
 
-    while True:
-        output_file.write(f"//{p.get_current_command()}\n")
-        command_type = p.command_type()
-        if command_type in (C_POP, C_PUSH):
-            cw.write_push_pop(command_type, p.arg1(), p.arg2())
-        elif command_type == C_ARITHMETIC:
-            cw.write_arithmetic(p.arg1())
-        elif command_type == C_LABEL:
-            cw.write_label(p.arg1())
-        elif command_type == C_GOTO:
-            cw.write_goto(p.arg1())
-        elif command_type == C_IF:
-            cw.write_if(p.arg1())
-        elif command_type == C_FUNCTION:
-            cw.write_function(p.arg1(), p.arg2())
-        elif command_type == C_RETURN:
-            cw.write_return()
-        elif command_type == C_CALL:
-            cw.write_call(p.arg1(), p.arg2())
-
-        if not p.has_more_commands(): break
-        p.advance()
 
+def translate_files_parallel(
+        input_paths: typing.List[str], output_file: typing.TextIO,
+        jobs: int, **options: bool) -> CodeWriter:
+    """Like translate_files, with every file translated in a pool of worker
+    processes into its own buffer.
 
-if "__main__" == __name__:
-    # Parses the input path and calls translate_file on each input file.
-    # This opens both the input and the output files!
-    # Both are closed automatically when the code finishes running.
-    # If the output file does not exist, it is created automatically in the
-    # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    The buffers are merged in the order of input_paths, so the output is the
+    same as the output of translate_files. This is safe because the labels
+    of every file are prefixed by its name, and its counters start over.
+
+    Args:
+        input_paths (typing.List[str]): the files to translate.
+        output_file (typing.TextIO): writes all output to this file.
+        jobs (int): the number of worker processes to use.
+        options (bool): the translation modes of the CodeWriter.
+
+    Returns:
+        CodeWriter: the writer of the merged program, with the statistics
+        of all the files.
+    """
+    cw = CodeWriter(output_file, **options)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(translate_path, input_path, index == 0, options)
+            for index, input_path in enumerate(input_paths)]
+        for future in futures:
+            translation, routines_used, hits = future.result()
+            cw.write_translation(translation, routines_used)
+            for name, count in hits.items():
+                cw.superinstruction_hits[name] += count
+    cw.flush()
+    return cw
+
+
+def vm_paths(argument_path: str) -> typing.Tuple[typing.List[str], str]:
+    """Returns the .vm files to translate for a file or directory argument,
+    and the path of the .asm file to write. The files of a directory are
+    sorted by name, so that the output does not depend on the order in which
+    the file system lists them."""
     if os.path.isdir(argument_path):
         files_to_translate = [
             os.path.join(argument_path, filename)
@@ -75,13 +198,99 @@ if "__main__" == __name__:
     else:
         files_to_translate = [argument_path]
         output_path, extension = os.path.splitext(argument_path)
-    output_path += ".asm"
-    bootstrap = True
+    files_to_translate = sorted(
+        path for path in files_to_translate
+        if os.path.splitext(path)[1].lower() == VM_EXTENSION)
+    return files_to_translate, output_path + ".asm"
+
+
+if "__main__" == __name__:
+    # Parses the input path and calls translate_files on the input files.
+    # This opens both the input and the output files!
+    # Both are closed automatically when the code finishes running.
+    # If the output file does not exist, it is created automatically in the
+    # correct path, using the correct filename.
+    arg_parser = argparse.ArgumentParser(prog="VMtranslator")
+    arg_parser.add_argument("input_path")
+    arg_parser.add_argument(
+        "--shared-compare", action="store_true",
+        help="translate eq, gt and lt to calls of one shared routine per "
+             "comparison, trading 9 cycles per comparison for ROM")
+    arg_parser.add_argument(
+        "--trampolines", action="store_true",
+        help="translate call and return to jumps to shared routines that "
+             "save and restore the frame, trading cycles for ROM")
+    arg_parser.add_argument(
+        "--stack-caching", action="store_true",
+        help="keep the top of the stack in D between commands when "
+             "possible, saving memory round trips")
+    arg_parser.add_argument(
+        "--superinstructions", action="store_true",
+        help="translate common sequences of commands together, and report "
+             "how many times each one was used")
+    arg_parser.add_argument(
+        "--remove-dead-functions", action="store_true",
+        help="leave out the functions that cannot be called from Sys.init, "
+             "and report the ROM each one saved")
+    arg_parser.add_argument(
+        "--fold-constants", action="store_true",
+        help="fold constant expressions and replace multiplications by "
+             "powers of two with shifts, and report the ROM each function "
+             "saved")
+    arg_parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="translate the files of a directory in N worker processes and "
+             "merge their output in order")
+    args = arg_parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        arg_parser.error("--jobs must be at least 1")
+    if args.jobs is not None and args.remove_dead_functions:
+        arg_parser.error("--remove-dead-functions needs the whole program, "
+                         "and cannot be used with --jobs")
+    if args.jobs is not None and args.fold_constants:
+        arg_parser.error("--fold-constants reports on the whole program, "
+                         "and cannot be used with --jobs")
+    files_to_translate, output_path = vm_paths(
+        os.path.abspath(args.input_path))
+    options = dict(shared_compare=args.shared_compare,
+                   trampolines=args.trampolines,
+                   stack_caching=args.stack_caching,
+                   superinstructions=args.superinstructions)
+    dead_functions, folded_functions = [], []
     with open(output_path, 'w') as output_file:
-        for input_path in files_to_translate:
-            filename, extension = os.path.splitext(input_path)
-            if extension.lower() != ".vm":
-                continue
-            with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file, bootstrap)
-            bootstrap = False
+        if args.jobs is not None:
+            writer = translate_files_parallel(
+                files_to_translate, output_file, args.jobs, **options)
+        else:
+            files = parse_files(files_to_translate)
+            # Folding comes first, since it may remove the only calls to
+            # Math.multiply.
+            if args.fold_constants:
+                files, folded_functions = fold_constants(files)
+            if args.remove_dead_functions:
+                files, dead_functions = remove_dead_functions(files)
+            writer = write_program(files, output_file, **options)
+    if args.fold_constants:
+        saved = sorted(
+            ((code_size(function.filename, before, **options) -
+              code_size(function.filename, after, **options),
+              len(before) - len(after), function.name)
+             for function, before, after in folded_functions),
+            reverse=True)
+        for size, commands, name in saved:
+            print(f"{name}: {commands} commands, {size} instructions")
+        print(f"Folded {len(saved)} functions, "
+              f"{sum(commands for _, commands, _ in saved)} commands, "
+              f"{sum(size for size, _, _ in saved)} instructions")
+    if args.remove_dead_functions:
+        saved = sorted(
+            ((code_size(function.filename, commands, **options),
+              function.name) for function, commands in dead_functions),
+            reverse=True)
+        for size, name in saved:
+            print(f"{name}: {size} instructions")
+        print(f"Removed {len(saved)} functions, "
+              f"{sum(size for size, _ in saved)} instructions")
+    if args.superinstructions:
+        for name, hits in writer.superinstruction_hits.items():
+            print(f"{name}: {hits}")
@@ -4,6 +4,8 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import array
+import enum
 import typing
 import re
 
@@ -120,3 +122,187 @@ class Parser:
             "C_FUNCTION" or "C_CALL".
         """
         return int(self.__current_command[2])
+
+
+class Opcode(enum.IntEnum):
+    """The opcodes of the compact representation built by parse_commands."""
+    ADD = 0
+    SUB = 1
+    NEG = 2
+    EQ = 3
+    GT = 4
+    LT = 5
+    AND = 6
+    OR = 7
+    NOT = 8
+    SHIFTLEFT = 9
+    SHIFTRIGHT = 10
+    PUSH = 11
+    POP = 12
+    LABEL = 13
+    GOTO = 14
+    IF_GOTO = 15
+    FUNCTION = 16
+    CALL = 17
+    RETURN = 18
+
+
+# The VM keyword of every opcode, and its command type as in Parser.
+KEYWORDS = {
+    "add": Opcode.ADD, "sub": Opcode.SUB, "neg": Opcode.NEG,
+    "eq": Opcode.EQ, "gt": Opcode.GT, "lt": Opcode.LT, "and": Opcode.AND,
+    "or": Opcode.OR, "not": Opcode.NOT, "shiftleft": Opcode.SHIFTLEFT,
+    "shiftright": Opcode.SHIFTRIGHT, "push": Opcode.PUSH,
+    "pop": Opcode.POP, "label": Opcode.LABEL, "goto": Opcode.GOTO,
+    "if-goto": Opcode.IF_GOTO, "function": Opcode.FUNCTION,
+    "call": Opcode.CALL, "return": Opcode.RETURN,
+}
+MNEMONICS = {opcode: keyword for keyword, opcode in KEYWORDS.items()}
+COMMAND_TYPES = tuple(
+    C_ARITHMETIC if opcode <= Opcode.SHIFTRIGHT else
+    {Opcode.PUSH: C_PUSH, Opcode.POP: C_POP, Opcode.LABEL: C_LABEL,
+     Opcode.GOTO: C_GOTO, Opcode.IF_GOTO: C_IF, Opcode.FUNCTION: C_FUNCTION,
+     Opcode.CALL: C_CALL, Opcode.RETURN: C_RETURN}[opcode]
+    for opcode in Opcode)
+SEGMENTS = (
+    "constant", "local", "argument", "this", "that", "pointer", "static",
+    "temp")
+SEGMENT_NUMBERS = {segment: number for number, segment in enumerate(SEGMENTS)}
+# How many arguments follow the keyword of every opcode.
+ARGUMENT_COUNTS = tuple(
+    2 if opcode in (Opcode.PUSH, Opcode.POP, Opcode.FUNCTION, Opcode.CALL)
+    else 1 if opcode in (Opcode.LABEL, Opcode.GOTO, Opcode.IF_GOTO)
+    else 0 for opcode in Opcode)
+NO_ARGUMENT = -1
+
+
+class Commands:
+    """The commands of a .vm file, parsed once into parallel arrays.
+
+    Attributes:
+        opcodes (array.array): the Opcode of every command.
+        arg1 (array.array): the index of the segment in SEGMENTS for push
+            and pop, the index of the label or function name in symbols for
+            label, goto, if-goto, function and call, and -1 otherwise.
+        arg2 (array.array): the index of push/pop, the number of locals of
+            function and the number of arguments of call, -1 otherwise.
+        symbols (typing.List[str]): the labels and function names, each one
+            stored once.
+    """
+
+    __slots__ = ("opcodes", "arg1", "arg2", "symbols")
+
+    def __init__(self) -> None:
+        self.opcodes = array.array('B')
+        self.arg1 = array.array('i')
+        self.arg2 = array.array('i')
+        self.symbols = []
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def command_type(self, index: int) -> str:
+        """Returns the type of a command, as Parser.command_type does."""
+        return COMMAND_TYPES[self.opcodes[index]]
+
+    def text(self, index: int) -> str:
+        """Returns a command as it would be written in a .vm file."""
+        opcode = self.opcodes[index]
+        words = [MNEMONICS[opcode]]
+        if opcode in (Opcode.PUSH, Opcode.POP):
+            words.append(SEGMENTS[self.arg1[index]])
+        elif ARGUMENT_COUNTS[opcode]:
+            words.append(self.symbols[self.arg1[index]])
+        if ARGUMENT_COUNTS[opcode] == 2:
+            words.append(str(self.arg2[index]))
+        return " ".join(words)
+
+    def extract(self, ranges: typing.Iterable[typing.Tuple[int, int]]) \
+            -> "Commands":
+        """Returns the commands in the given [start, end) ranges, in order.
+        The symbols are shared with this object.
+
+        Args:
+            ranges (typing.Iterable[typing.Tuple[int, int]]): the ranges.
+
+        Returns:
+            Commands: the extracted commands.
+        """
+        commands = Commands()
+        commands.symbols = self.symbols
+        for start, end in ranges:
+            commands.opcodes.extend(self.opcodes[start:end])
+            commands.arg1.extend(self.arg1[start:end])
+            commands.arg2.extend(self.arg2[start:end])
+        return commands
+
+
+def parse_commands(input_file: typing.TextIO) -> Commands:
+    """Parses a whole .vm file into its compact representation. Every
+    distinct line is parsed once, as compiled code repeats most lines.
+
+    Args:
+        input_file (typing.TextIO): input file.
+
+    Returns:
+        Commands: the commands of the file.
+    """
+    commands = Commands()
+    symbols = commands.symbols
+    symbol_numbers = {}
+    parsed = {}
+    rows = []
+    for line_number, line in enumerate(input_file.read().splitlines(), 1):
+        row = parsed.get(line)
+        if row is None:
+            if line in parsed:
+                continue
+            row = parsed[line] = parse_line(
+                line, line_number, symbols, symbol_numbers)
+            if row is None:
+                continue
+        rows.append(row)
+    if rows:
+        opcodes, arg1, arg2 = zip(*rows)
+        commands.opcodes.fromlist(list(opcodes))
+        commands.arg1.fromlist(list(arg1))
+        commands.arg2.fromlist(list(arg2))
+    return commands
+
+
+def parse_line(line: str, line_number: int, symbols: typing.List[str],
+               symbol_numbers: typing.Dict[str, int]) \
+        -> typing.Optional[typing.Tuple[int, int, int]]:
+    """Parses a single line of a .vm file.
+
+    Args:
+        line (str): the line.
+        line_number (int): its number, for error messages.
+        symbols (typing.List[str]): the symbols of the file so far, new
+            symbols are added to it.
+        symbol_numbers (typing.Dict[str, int]): the index of every symbol.
+
+    Returns:
+        typing.Optional[typing.Tuple[int, int, int]]: the opcode and the two
+        arguments of the command, None for a blank line.
+    """
+    words = line.split(COMMENT, 1)[0].split()
+    if not words:
+        return None
+    opcode = KEYWORDS.get(words[0])
+    if opcode is None or len(words) != ARGUMENT_COUNTS[opcode] + 1:
+        raise ValueError(f"Line {line_number}: invalid command {line!r}")
+    arg1 = arg2 = NO_ARGUMENT
+    if opcode in (Opcode.PUSH, Opcode.POP):
+        if words[1] not in SEGMENT_NUMBERS:
+            raise ValueError(
+                f"Line {line_number}: invalid segment {words[1]!r}")
+        arg1 = SEGMENT_NUMBERS[words[1]]
+    elif len(words) > 1:
+        arg1 = symbol_numbers.get(words[1])
+        if arg1 is None:
+            arg1 = symbol_numbers[words[1]] = len(symbols)
+            symbols.append(words[1])
+    if len(words) == 3:
+        arg2 = int(words[2])
+    return int(opcode), arg1, arg2
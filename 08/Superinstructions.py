@@ -0,0 +1,194 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Parser import Commands, Opcode, SEGMENT_NUMBERS
+
+CONSTANT_SEGMENT = SEGMENT_NUMBERS["constant"]
+POINTER_SEGMENT = SEGMENT_NUMBERS["pointer"]
+STATIC_SEGMENT = SEGMENT_NUMBERS["static"]
+THAT_SEGMENT = SEGMENT_NUMBERS["that"]
+BASES = {SEGMENT_NUMBERS["local"]: "LCL", SEGMENT_NUMBERS["argument"]: "ARG",
+         SEGMENT_NUMBERS["this"]: "THIS", SEGMENT_NUMBERS["that"]: "THAT"}
+# Dynamic variables up to this index are addressed by incrementing A, so
+# that D is left untouched.
+NEAR_LIMIT = 8
+
+
+class Superinstruction:
+    """A sequence of VM commands translated together, without the stack
+    round trips between them.
+
+    Attributes:
+        name (str): the name of the sequence, for reports.
+        opcodes (typing.Tuple[int, ...]): the opcodes of the sequence.
+        condition (typing.Callable[[Commands, int], bool]): whether the
+            commands starting at an index, which have these opcodes, can be
+            translated together.
+        generate (typing.Callable[[Commands, int, str], str]): returns the
+            translation of the commands starting at an index, given the name
+            of the file.
+    """
+
+    __slots__ = ("name", "opcodes", "condition", "generate")
+
+    def __init__(self, name: str, opcodes: typing.Tuple[int, ...],
+                 condition: typing.Callable[[Commands, int], bool],
+                 generate: typing.Callable[[Commands, int, str], str]) \
+            -> None:
+        self.name = name
+        self.opcodes = opcodes
+        self.condition = condition
+        self.generate = generate
+
+
+def address(segment: int, index: int, filename: str) -> typing.Optional[str]:
+    """Returns code that sets A to the address of a variable and leaves D
+    untouched, or None if there is no such code.
+
+    Args:
+        segment (int): the index of the segment in SEGMENTS.
+        index (int): the index of the variable in the segment.
+        filename (str): the name of the file, for static variables.
+    """
+    if segment in BASES:
+        if index > NEAR_LIMIT:
+            return None
+        return f"@{BASES[segment]}\nA=M\n" + "A=A+1\n" * index
+    if segment == POINTER_SEGMENT:
+        return "@THIS\n" if index == 0 else "@THAT\n"
+    if segment == STATIC_SEGMENT:
+        return f"@{filename}.{index}\n"
+    if segment == CONSTANT_SEGMENT:
+        return None
+    return f"@{5 + index}\n"
+
+
+def load(segment: int, index: int, filename: str) -> str:
+    """Returns code that sets D to a variable or a constant."""
+    if segment == CONSTANT_SEGMENT:
+        return f"@{index}\nD=A\n"
+    variable = address(segment, index, filename)
+    if variable is None:
+        return f"@{index}\nD=A\n@{BASES[segment]}\nA=D+M\nD=M\n"
+    return variable + "D=M\n"
+
+
+def is_constant(commands: Commands, index: int) -> bool:
+    return commands.arg1[index] == CONSTANT_SEGMENT
+
+
+def apply_constant(commands: Commands, index: int, filename: str) -> str:
+    """push constant N, add/sub: changes the top of the stack in place."""
+    value = commands.arg2[index]
+    sign = "+" if commands.opcodes[index + 1] == Opcode.ADD else "-"
+    if value == 1:
+        return f"@SP\nA=M-1\nM=M{sign}1\n"
+    return f"@{value}\nD=A\n@SP\nA=M-1\nM=M{sign}D\n"
+
+
+def is_increment(commands: Commands, index: int) -> bool:
+    arg1, arg2 = commands.arg1, commands.arg2
+    return arg1[index] == arg1[index + 3] and \
+        arg2[index] == arg2[index + 3] and \
+        arg1[index + 1] == CONSTANT_SEGMENT and \
+        address(arg1[index], arg2[index], "") is not None
+
+
+def increment(commands: Commands, index: int, filename: str) -> str:
+    """push x, push constant N, add/sub, pop x: changes x in place."""
+    value = commands.arg2[index + 1]
+    sign = "+" if commands.opcodes[index + 2] == Opcode.ADD else "-"
+    variable = address(commands.arg1[index], commands.arg2[index], filename)
+    if value == 1:
+        return f"{variable}M=M{sign}1\n"
+    return f"@{value}\nD=A\n{variable}M=M{sign}D\n"
+
+
+def is_array_read(commands: Commands, index: int) -> bool:
+    return commands.arg1[index] == POINTER_SEGMENT and \
+        commands.arg2[index] == 1 and \
+        commands.arg1[index + 1] == THAT_SEGMENT and \
+        commands.arg2[index + 1] == 0
+
+
+def array_read(commands: Commands, index: int, filename: str) -> str:
+    """pop pointer 1, push that 0: replaces an address on the stack with
+    the value it points at."""
+    return "@SP\nA=M-1\nD=M\n@THAT\nM=D\nA=D\nD=M\n@SP\nA=M-1\nM=D\n"
+
+
+def is_move(commands: Commands, index: int) -> bool:
+    return address(commands.arg1[index + 1], commands.arg2[index + 1], "") \
+        is not None
+
+
+def move(commands: Commands, index: int, filename: str) -> str:
+    """push x, pop y: copies x to y through D."""
+    return load(commands.arg1[index], commands.arg2[index], filename) + \
+        address(commands.arg1[index + 1], commands.arg2[index + 1],
+                filename) + "M=D\n"
+
+
+def negated_branch(commands: Commands, index: int, filename: str) -> str:
+    """not, if-goto: jumps unless the top of the stack is -1, which is when
+    its negation is not 0. For Jack booleans, this is when it is false."""
+    label = commands.symbols[commands.arg1[index + 1]]
+    return f"@SP\nAM=M-1\nD=M+1\n@{filename}${label}\nD;JNE\n"
+
+
+def always(commands: Commands, index: int) -> bool:
+    return True
+
+
+# The superinstructions, in the order they are tried: where several match
+# at the same command, the first one is used.
+SUPERINSTRUCTIONS = (
+    Superinstruction(
+        "increment", (Opcode.PUSH, Opcode.PUSH, Opcode.ADD, Opcode.POP),
+        is_increment, increment),
+    Superinstruction(
+        "decrement", (Opcode.PUSH, Opcode.PUSH, Opcode.SUB, Opcode.POP),
+        is_increment, increment),
+    Superinstruction(
+        "add constant", (Opcode.PUSH, Opcode.ADD), is_constant,
+        apply_constant),
+    Superinstruction(
+        "subtract constant", (Opcode.PUSH, Opcode.SUB), is_constant,
+        apply_constant),
+    Superinstruction(
+        "array read", (Opcode.POP, Opcode.PUSH), is_array_read, array_read),
+    Superinstruction(
+        "move", (Opcode.PUSH, Opcode.POP), is_move, move),
+    Superinstruction(
+        "branch if false", (Opcode.NOT, Opcode.IF_GOTO), always,
+        negated_branch),
+)
+# The superinstructions that start with every opcode.
+BY_FIRST_OPCODE = {
+    opcode: tuple(superinstruction for superinstruction in SUPERINSTRUCTIONS
+                  if superinstruction.opcodes[0] == opcode)
+    for opcode in Opcode}
+
+
+def match(commands: Commands, index: int) \
+        -> typing.Optional[Superinstruction]:
+    """Returns the superinstruction that translates the commands starting
+    at an index, or None if there is none.
+
+    Args:
+        commands (Commands): the parsed file.
+        index (int): the index of the first command.
+    """
+    opcodes = commands.opcodes
+    for superinstruction in BY_FIRST_OPCODE[opcodes[index]]:
+        length = len(superinstruction.opcodes)
+        if tuple(opcodes[index:index + length]) == \
+                superinstruction.opcodes and \
+                superinstruction.condition(commands, index):
+            return superinstruction
+    return None
@@ -0,0 +1,480 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import os
+import sys
+import time
+import typing
+
+from Parser import Commands, Opcode, SEGMENT_NUMBERS
+from Main import parse_files, vm_paths
+
+RAM_SIZE = 32768
+ADDRESS_MASK = 0x7FFF
+STACK_BASE = 256
+STATIC_BASE = 16
+STATIC_LIMIT = 255
+SP, LCL, ARG, THIS, THAT = range(5)
+FRAME_SIZE = 5
+ENTRY_POINT = "Sys.init"
+HALT_FUNCTION = "Sys.halt"
+TOP_LEVEL = "(top level)"
+DEFAULT_MAX_COMMANDS = 10 ** 7
+
+# The operations of a decoded program. The opcodes of the parser are kept
+# for the other commands, and push and pop are split by the way their
+# address is found, so that the interpreter loop does not look at segments.
+PUSH_CONSTANT, PUSH_FIXED, PUSH_DYNAMIC, POP_FIXED, POP_DYNAMIC, \
+    CALL_NATIVE, HALT = range(len(Opcode), len(Opcode) + 7)
+BASES = {SEGMENT_NUMBERS["local"]: LCL, SEGMENT_NUMBERS["argument"]: ARG,
+         SEGMENT_NUMBERS["this"]: THIS, SEGMENT_NUMBERS["that"]: THAT}
+FIXED_BASES = {SEGMENT_NUMBERS["pointer"]: THIS, SEGMENT_NUMBERS["temp"]: 5}
+CONSTANT_SEGMENT = SEGMENT_NUMBERS["constant"]
+STATIC_SEGMENT = SEGMENT_NUMBERS["static"]
+
+# A native implementation of a function: it gets the emulator and the
+# arguments of a call, and returns the value the call pushes, or None to run
+# the VM commands of the function instead.
+Native = typing.Callable[..., typing.Optional[int]]
+
+
+def wrap(value: int) -> int:
+    """Wraps an integer into the signed 16-bit range."""
+    return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+
+# Python implementations of hot OS functions that neither read nor write
+# the RAM, used when the emulator is created with natives=NATIVES. See
+# Builtins.py for the functions that do.
+NATIVES = {
+    "Math.multiply": lambda vm, x, y: x * y,
+    "Math.abs": lambda vm, x: -x if x < 0 else x,
+    "Math.min": lambda vm, a, b: a if a < b else b,
+    "Math.max": lambda vm, a, b: a if a > b else b,
+}
+
+
+class Profile:
+    """The profile of one function.
+
+    Attributes:
+        name (str): the name of the function.
+        calls (int): the number of times it was called.
+        inclusive (int): the number of commands executed from its calls to
+            their returns, including the functions it called.
+        exclusive (int): the number of its own commands executed.
+        native (bool): whether its calls ran a native implementation.
+    """
+
+    __slots__ = ("name", "calls", "inclusive", "exclusive", "native")
+
+    def __init__(self, name: str, calls: int, inclusive: int,
+                 exclusive: int, native: bool) -> None:
+        self.name = name
+        self.calls = calls
+        self.inclusive = inclusive
+        self.exclusive = exclusive
+        self.native = native
+
+
+class VMEmulator:
+    """Runs the commands of a VM program directly, on a 32K RAM with the
+    memory layout of the Hack platform.
+
+    The parsed files are decoded once into a single program: labels and
+    functions are resolved to indices, static variables to addresses, and
+    push and pop to the kind of address they use, and run() is a tight loop
+    over the decoded commands. The stack, the frames and the segments live in
+    the RAM as they do in translated code, except that return addresses are
+    indices of commands. Static variables get addresses in the order the
+    assembler would give them. Every call and return also updates the
+    per-function command counts of the profile.
+    """
+
+    def __init__(self, files: typing.List[typing.Tuple[str, Commands]],
+                 natives: typing.Optional[typing.Dict[str, Native]] = None,
+                 entry_point: typing.Optional[str] = ENTRY_POINT) -> None:
+        """Decodes a program and resets the computer. If the program
+        defines the entry point, the bootstrap code is emulated: SP is set to
+        256 and the entry point is called. Otherwise, the program starts at
+        its first command.
+
+        Args:
+            files (typing.List[typing.Tuple[str, Commands]]): the name and the
+                commands of every file of the program.
+            natives (typing.Optional[typing.Dict[str, Native]]): functions to
+                run in Python instead of their VM commands, by name.
+            entry_point (typing.Optional[str]): the function the bootstrap
+                code calls, or None to start at the first command.
+        """
+        self.natives = dict(natives or {})
+        self.__decode(files)
+        self.ram = array.array('h', bytes(2 * RAM_SIZE))
+        self.ram[SP] = STACK_BASE
+        self.pc = 0
+        self.commands = 0
+        self.halted = False
+        top_level = self.function_numbers[TOP_LEVEL]
+        self.calls = [0] * len(self.function_names)
+        self.inclusive = [0] * len(self.function_names)
+        self.exclusive = [0] * len(self.function_names)
+        self.active = [0] * len(self.function_names)
+        self.active[top_level] = 1
+        # The function and the entry count of every activation below the
+        # current one.
+        self.frames = []
+        self.function, self.entry, self.mark = top_level, 0, 0
+        if entry_point in self.function_numbers and \
+                self.starts[self.function_numbers[entry_point]] is not None:
+            self.__call(self.function_numbers[entry_point], 0, self.halt)
+
+    def __decode(self, files: typing.List[typing.Tuple[str, Commands]]) \
+            -> None:
+        """Decodes the files into self.code, self.arg1 and self.arg2."""
+        self.function_names = [TOP_LEVEL]
+        self.function_numbers = {TOP_LEVEL: 0}
+
+        def function_number(name: str) -> int:
+            if name not in self.function_numbers:
+                self.function_numbers[name] = len(self.function_names)
+                self.function_names.append(name)
+            return self.function_numbers[name]
+
+        labels = {}
+        self.statics = statics = {}
+        offset = 0
+        for filename, commands in files:
+            symbols = commands.symbols
+            for index, opcode in enumerate(commands.opcodes):
+                if opcode == Opcode.LABEL:
+                    labels[(filename, symbols[commands.arg1[index]])] = \
+                        offset + index
+                elif commands.arg1[index] == STATIC_SEGMENT and \
+                        opcode in (Opcode.PUSH, Opcode.POP) and \
+                        (filename, commands.arg2[index]) not in statics:
+                    address = STATIC_BASE + len(statics)
+                    if address > STATIC_LIMIT:
+                        raise ValueError(
+                            f"Too many static variables in {filename}")
+                    statics[(filename, commands.arg2[index])] = address
+            offset += len(commands)
+
+        code, arg1, arg2 = [], [], []
+        starts = {}
+        for filename, commands in files:
+            symbols = commands.symbols
+            for opcode, first, second in zip(
+                    commands.opcodes, commands.arg1, commands.arg2):
+                if opcode in (Opcode.PUSH, Opcode.POP):
+                    push = opcode == Opcode.PUSH
+                    if first == CONSTANT_SEGMENT:
+                        if not push:
+                            raise ValueError("Cannot pop into constant")
+                        opcode, first, second = PUSH_CONSTANT, second, 0
+                    elif first in BASES:
+                        opcode, first, second = (
+                            PUSH_DYNAMIC if push else POP_DYNAMIC,
+                            second, BASES[first])
+                    elif first == STATIC_SEGMENT:
+                        opcode, first, second = (
+                            PUSH_FIXED if push else POP_FIXED,
+                            statics[(filename, second)], 0)
+                    else:
+                        opcode, first, second = (
+                            PUSH_FIXED if push else POP_FIXED,
+                            FIXED_BASES[first] + second, 0)
+                elif opcode in (Opcode.GOTO, Opcode.IF_GOTO):
+                    label = (filename, symbols[first])
+                    if label not in labels:
+                        raise ValueError(
+                            f"Undefined label {symbols[first]} in {filename}")
+                    first = labels[label]
+                elif opcode == Opcode.FUNCTION:
+                    first = function_number(symbols[first])
+                    starts[first] = len(code)
+                elif opcode == Opcode.CALL:
+                    if symbols[first] == HALT_FUNCTION:
+                        opcode = HALT
+                    elif symbols[first] in self.natives:
+                        opcode = CALL_NATIVE
+                    first = function_number(symbols[first])
+                code.append(opcode)
+                arg1.append(first)
+                arg2.append(second)
+        # Running off the end of the program, or returning from the entry
+        # point, halts.
+        self.halt = len(code)
+        code.append(HALT)
+        arg1.append(0)
+        arg2.append(0)
+
+        self.starts = [starts.get(number)
+                       for number in range(len(self.function_names))]
+        for opcode, number in zip(code, arg1):
+            if opcode == Opcode.CALL and self.starts[number] is None:
+                raise ValueError(f"Call to undefined function "
+                                 f"{self.function_names[number]}")
+        self.native_functions = {
+            self.function_numbers[name]: native
+            for name, native in self.natives.items()
+            if name in self.function_numbers}
+        self.code, self.arg1, self.arg2 = code, arg1, arg2
+
+    def __call(self, function: int, arguments: int, return_address: int) \
+            -> None:
+        """Pushes a frame and enters a function, like a call command."""
+        ram = self.ram
+        sp = ram[SP]
+        ram[sp] = return_address
+        ram[sp + 1:sp + FRAME_SIZE] = ram[LCL:THAT + 1]
+        sp += FRAME_SIZE
+        ram[ARG] = sp - FRAME_SIZE - arguments
+        ram[LCL] = ram[SP] = sp
+        self.exclusive[self.function] += self.commands - self.mark
+        self.mark = self.commands
+        self.frames.append((self.function, self.entry))
+        self.function, self.entry = function, self.commands
+        self.calls[function] += 1
+        self.active[function] += 1
+        self.pc = self.starts[function]
+
+    def call(self, name: str, arguments: typing.Sequence[int],
+             max_commands: int = DEFAULT_MAX_COMMANDS) -> int:
+        """Calls a function of the program on top of the current stack, runs
+        it until it returns and pops its value, e.g. to initialize the OS
+        or to test a function.
+
+        Args:
+            name (str): the name of the function.
+            arguments (typing.Sequence[int]): the arguments of the call.
+            max_commands (int): the maximal number of commands to execute.
+
+        Returns:
+            int: the value the function returned.
+        """
+        number = self.function_numbers.get(name)
+        if number is None or self.starts[number] is None:
+            raise ValueError(f"Call to undefined function {name}")
+        ram = self.ram
+        for argument in arguments:
+            ram[ram[SP]] = wrap(argument)
+            ram[SP] += 1
+        depth = len(self.frames)
+        pc, halted = self.pc, self.halted
+        self.__call(number, len(arguments), self.halt)
+        self.halted = False
+        self.run(max_commands)
+        if len(self.frames) != depth:
+            raise ValueError(f"{name} did not return after {max_commands} "
+                             f"commands")
+        self.pc, self.halted = pc, halted
+        ram[SP] -= 1
+        return ram[ram[SP]]
+
+    def run(self, max_commands: int = DEFAULT_MAX_COMMANDS) -> int:
+        """Runs the program until it halts or max_commands commands were
+        executed. The program halts when it calls Sys.halt, returns from the
+        entry point or runs off its end.
+
+        Args:
+            max_commands (int): the maximal number of commands to execute.
+
+        Returns:
+            int: the number of commands executed.
+        """
+        if self.halted:
+            return 0
+        code, arg1, arg2, ram = self.code, self.arg1, self.arg2, self.ram
+        starts, natives = self.starts, self.native_functions
+        calls, inclusive, exclusive, active, frames = \
+            self.calls, self.inclusive, self.exclusive, self.active, \
+            self.frames
+        function, entry, mark = self.function, self.entry, self.mark
+        pc, sp = self.pc, ram[SP]
+        executed = self.commands
+        limit = executed + max_commands
+        while executed < limit:
+            opcode = code[pc]
+            a = arg1[pc]
+            if opcode == HALT:
+                self.halted = True
+                break
+            executed += 1
+            pc += 1
+            if opcode == PUSH_CONSTANT:
+                ram[sp] = a
+                sp += 1
+            elif opcode == PUSH_DYNAMIC:
+                ram[sp] = ram[(ram[arg2[pc - 1]] + a) & ADDRESS_MASK]
+                sp += 1
+            elif opcode == PUSH_FIXED:
+                ram[sp] = ram[a]
+                sp += 1
+            elif opcode == POP_DYNAMIC:
+                sp -= 1
+                ram[(ram[arg2[pc - 1]] + a) & ADDRESS_MASK] = ram[sp]
+            elif opcode == POP_FIXED:
+                sp -= 1
+                ram[a] = ram[sp]
+            elif opcode == Opcode.ADD:
+                sp -= 1
+                ram[sp - 1] = wrap(ram[sp - 1] + ram[sp])
+            elif opcode == Opcode.SUB:
+                sp -= 1
+                ram[sp - 1] = wrap(ram[sp - 1] - ram[sp])
+            elif opcode == Opcode.IF_GOTO:
+                sp -= 1
+                if ram[sp]:
+                    pc = a
+            elif opcode == Opcode.GOTO:
+                pc = a
+            elif opcode == Opcode.LABEL:
+                pass
+            elif opcode == Opcode.NOT:
+                ram[sp - 1] = ~ram[sp - 1]
+            elif opcode == Opcode.EQ:
+                sp -= 1
+                ram[sp - 1] = -(ram[sp - 1] == ram[sp])
+            elif opcode == Opcode.LT:
+                sp -= 1
+                ram[sp - 1] = -(ram[sp - 1] < ram[sp])
+            elif opcode == Opcode.GT:
+                sp -= 1
+                ram[sp - 1] = -(ram[sp - 1] > ram[sp])
+            elif opcode == Opcode.AND:
+                sp -= 1
+                ram[sp - 1] = ram[sp - 1] & ram[sp]
+            elif opcode == Opcode.OR:
+                sp -= 1
+                ram[sp - 1] = ram[sp - 1] | ram[sp]
+            elif opcode == Opcode.NEG:
+                ram[sp - 1] = wrap(-ram[sp - 1])
+            elif opcode == Opcode.SHIFTLEFT:
+                ram[sp - 1] = wrap(ram[sp - 1] << 1)
+            elif opcode == Opcode.SHIFTRIGHT:
+                ram[sp - 1] = ram[sp - 1] >> 1
+            elif opcode == Opcode.CALL or opcode == CALL_NATIVE:
+                arguments = arg2[pc - 1]
+                if opcode == CALL_NATIVE:
+                    ram[SP] = sp
+                    result = natives[a](self, *ram[sp - arguments:sp])
+                    if result is not None:
+                        sp -= arguments
+                        ram[sp] = wrap(result)
+                        sp += 1
+                        calls[a] += 1
+                        continue
+                ram[sp] = pc
+                ram[sp + 1:sp + FRAME_SIZE] = ram[LCL:THAT + 1]
+                sp += FRAME_SIZE
+                ram[ARG] = sp - FRAME_SIZE - arguments
+                ram[LCL] = sp
+                exclusive[function] += executed - mark
+                mark = executed
+                frames.append((function, entry))
+                function, entry = a, executed
+                calls[a] += 1
+                active[a] += 1
+                pc = starts[a]
+            elif opcode == Opcode.FUNCTION:
+                for _ in range(arg2[pc - 1]):
+                    ram[sp] = 0
+                    sp += 1
+            elif opcode == Opcode.RETURN:
+                frame = ram[LCL]
+                return_address = ram[frame - 5]
+                ram[ram[ARG]] = ram[sp - 1]
+                sp = ram[ARG] + 1
+                ram[THAT] = ram[frame - 1]
+                ram[THIS] = ram[frame - 2]
+                ram[ARG] = ram[frame - 3]
+                ram[LCL] = ram[frame - 4]
+                pc = return_address
+                exclusive[function] += executed - mark
+                mark = executed
+                active[function] -= 1
+                if not active[function]:
+                    inclusive[function] += executed - entry
+                function, entry = frames.pop()
+        ram[SP] = sp
+        self.pc = pc
+        self.function, self.entry = function, entry
+        exclusive[function] += executed - mark
+        self.mark = executed
+        executed, self.commands = executed - self.commands, executed
+        return executed
+
+    def profile(self) -> typing.List[Profile]:
+        """Returns the profile of every function that was called, sorted by
+        the number of its own commands executed. Functions that did not
+        return yet are counted up to the current command.
+        """
+        inclusive = list(self.inclusive)
+        counted = set()
+        for function, entry in self.frames + [(self.function, self.entry)]:
+            if function not in counted:
+                counted.add(function)
+                inclusive[function] += self.commands - entry
+        profiles = [
+            Profile(name, self.calls[number], inclusive[number],
+                    self.exclusive[number], number in self.native_functions)
+            for number, name in enumerate(self.function_names)
+            if self.calls[number] or self.exclusive[number]]
+        profiles.sort(key=lambda profile: profile.exclusive, reverse=True)
+        return profiles
+
+
+if "__main__" == __name__:
+    # Runs a VM program and prints the profile of its functions: how many
+    # times each one was called, and how many commands it executed with and
+    # without the functions it called.
+    arg_parser = argparse.ArgumentParser(prog="VMEmulator")
+    arg_parser.add_argument(
+        "input_path", help="a .vm file, or a directory of .vm files that "
+                           "includes the OS")
+    arg_parser.add_argument(
+        "--commands", type=int, default=DEFAULT_MAX_COMMANDS,
+        help="stop after this many commands if the program did not halt")
+    arg_parser.add_argument(
+        "--natives", action="store_true",
+        help="run hot OS functions such as Math.multiply, Memory.alloc and "
+             "Screen.drawLine in Python")
+    arg_parser.add_argument(
+        "--check-natives", type=int, nargs="?", const=200, metavar="CASES",
+        help="instead of running the program, compare every native OS "
+             "function it defines with its VM commands on random arguments")
+    arg_parser.add_argument(
+        "--top", type=int, default=20, metavar="N",
+        help="print the N functions that executed the most commands")
+    args = arg_parser.parse_args()
+    input_paths, _ = vm_paths(os.path.abspath(args.input_path))
+    files = parse_files(input_paths)
+    if args.natives or args.check_natives is not None:
+        from Builtins import BUILTINS, check_builtins
+    if args.check_natives is not None:
+        failed = False
+        for name, cases, mismatch in check_builtins(
+                files, args.check_natives):
+            print(f"{name}: {mismatch or f'{cases} cases passed'}")
+            failed = failed or bool(mismatch)
+        if failed:
+            sys.exit(1)
+        sys.exit(0)
+    emulator = VMEmulator(files, BUILTINS if args.natives else None)
+    start = time.perf_counter()
+    executed = emulator.run(args.commands)
+    elapsed = time.perf_counter() - start
+    print(f"{'Halted' if emulator.halted else 'Stopped'} after {executed} "
+          f"commands in {elapsed:.3f}s "
+          f"({executed / max(elapsed, 1e-9):.0f} commands/sec)")
+    print(f"{'function':32} {'calls':>9} {'inclusive':>11} "
+          f"{'exclusive':>11}")
+    for profile in emulator.profile()[:args.top]:
+        name = profile.name + (" (native)" if profile.native else "")
+        print(f"{name:32} {profile.calls:9} {profile.inclusive:11} "
+              f"{profile.exclusive:11}")
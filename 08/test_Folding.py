@@ -0,0 +1,31 @@
+"""Tests for constant folding of Math.divide."""
+import io
+
+from Folding import fold
+from Parser import parse_commands
+
+
+def folded(source: str) -> list:
+    commands = fold(parse_commands(io.StringIO(source)))
+    return [commands.text(index) for index in range(len(commands))]
+
+
+def test_divide_truncates_towards_zero():
+    assert folded("push constant 7\nneg\npush constant 2\n"
+                  "call Math.divide 2\n") == ["push constant 3", "neg"]
+
+
+def test_divide_of_minus_32768_is_not_folded():
+    # Math.divide negates x, which leaves -32768 as it is, and then returns
+    # 0 instead of -16384.
+    assert folded("push constant 32767\nneg\npush constant 1\nsub\n"
+                  "push constant 2\ncall Math.divide 2\n") == [
+        "push constant 32767", "not", "push constant 2",
+        "call Math.divide 2"]
+
+
+def test_divide_by_minus_32768_is_not_folded():
+    assert folded("push constant 5\npush constant 32767\nnot\n"
+                  "call Math.divide 2\n") == [
+        "push constant 5", "push constant 32767", "not",
+        "call Math.divide 2"]